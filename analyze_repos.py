@@ -8,12 +8,20 @@ import os
 import json
 import glob
 from pathlib import Path
-from collections import defaultdict, Counter
+from collections import defaultdict
 import re
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from feature_matrix import FeatureMatrix
+from pattern_scanner import KeywordScanner
+from repo_inventory import RepoInventory
+from scan_cache import ScanCache
 
 class AEARepositoryAnalyzer:
-    def __init__(self, base_path):
+    def __init__(self, base_path, cache=None):
         self.base_path = Path(base_path)
+        self.cache = cache
         self.repos = list(self.base_path.glob("*/"))
         self.analysis_results = {
             'total_repos': len(self.repos),
@@ -25,53 +33,148 @@ class AEARepositoryAnalyzer:
             'statistical_methods': {},
             'reproducibility_features': {}
         }
+        
+        # Keywords for different methods
+        self.method_keywords = {
+            'OLS': ['regress', 'lm(', 'ols', 'regression'],
+            'IV': ['ivregress', 'ivreg', 'instrument', '2sls', 'tsls'],
+            'Panel': ['xtreg', 'plm', 'panel', 'fixed effect', 'random effect'],
+            'DID': ['diff-in-diff', 'difference-in-difference', 'did', 'event study'],
+            'RDD': ['rdrobust', 'rdd', 'regression discontinuity', 'fuzzy rd'],
+            'ML': ['random forest', 'neural', 'lasso', 'ridge', 'elastic net',
+                  'machine learning', 'cross-validation', 'sklearn'],
+            'Structural': ['gmm', 'maximum likelihood', 'mle', 'structural model'],
+            'Time Series': ['arima', 'var', 'vecm', 'cointegration', 'unit root'],
+            'Causal': ['causal', 'treatment effect', 'ate', 'att', 'propensity'],
+            'Bayesian': ['bayes', 'mcmc', 'prior', 'posterior', 'gibbs']
+        }
+        
+        # Key README sections
+        self.readme_sections = {
+            'requirements': ['requirement', 'dependencies', 'software', 'version'],
+            'data': ['data', 'dataset', 'source'],
+            'instructions': ['instruction', 'how to', 'steps', 'run', 'execute'],
+            'files': ['file', 'structure', 'organization'],
+            'output': ['output', 'results', 'tables', 'figures'],
+            'authors': ['author', 'contact'],
+            'license': ['license', 'copyright'],
+            'citation': ['citation', 'cite', 'reference']
+        }
+        
+        self.scanner = KeywordScanner({
+            'methods': self.method_keywords,
+            'readme': self.readme_sections
+        })
+        self._inventory = None
+        # Repo × feature matrix of the last reduce, from which the aggregates are computed
+        self.matrix = None
     
-    def analyze_all(self):
+    def analyze_all(self, workers=1):
         """Run complete analysis suite"""
         print(f"Analyzing {len(self.repos)} repositories...")
         
-        # Initialize counters
-        language_files = defaultdict(int)
-        readme_quality = []
-        folder_structures = []
-        master_scripts = []
-        data_statements = []
-        dependencies_docs = []
-        
-        for i, repo in enumerate(self.repos, 1):
+        repo_analyses = self.iter_analyses(self.repos, workers)
+        return self.reduce(self.report_progress(repo_analyses, len(self.repos)))
+    
+    def analyze_stream(self, stream_path, workers=1):
+        """Analyze repositories, appending one JSON line per repo as it completes
+        
+        Repositories already recorded in an existing stream are skipped, so an
+        interrupted run resumes where it stopped. Aggregates are then computed
+        by a reducer pass over the stream.
+        """
+        recorded = recorded_repo_names(stream_path)
+        pending = [repo for repo in self.repos if repo.name not in recorded]
+        print(f"Analyzing {len(pending)} repositories ({len(recorded)} already recorded)...")
+        
+        with open(stream_path, 'a', encoding='utf-8') as f:
+            repo_analyses = self.iter_analyses(pending, workers)
+            for repo_analysis in self.report_progress(repo_analyses, len(pending)):
+                f.write(json.dumps(repo_analysis, default=str) + "\n")
+                f.flush()
+        
+        return self.reduce_stream(stream_path)
+    
+    def reduce_stream(self, stream_path):
+        """Compute the corpus aggregates from an NDJSON stream of repo records"""
+        self.repos = []
+        
+        def records():
+            seen = set()
+            for repo_analysis in read_ndjson(stream_path):
+                if repo_analysis['name'] in seen:
+                    continue
+                seen.add(repo_analysis['name'])
+                self.repos.append(self.base_path / repo_analysis['name'])
+                yield repo_analysis
+        
+        self.reduce(records())
+        self.analysis_results['total_repos'] = len(self.repos)
+        return self.analysis_results
+    
+    def iter_analyses(self, repos, workers=1):
+        """Yield per-repo analysis records in repository order"""
+        if workers > 1:
+            return self.analyze_parallel(repos, workers)
+        return map(self.analyze_single_repo, repos)
+    
+    def report_progress(self, repo_analyses, total):
+        """Pass records through, printing progress every 20 repositories"""
+        for i, repo_analysis in enumerate(repo_analyses, 1):
             if i % 20 == 0:
-                print(f"Progress: {i}/{len(self.repos)} repositories analyzed")
-            
-            repo_analysis = self.analyze_single_repo(repo)
-            
-            # Aggregate results
-            for lang, count in repo_analysis['languages'].items():
-                language_files[lang] += count
-            
-            readme_quality.append(repo_analysis['readme_score'])
-            folder_structures.append(repo_analysis['structure_type'])
-            
-            if repo_analysis['has_master_script']:
-                master_scripts.append(repo.name)
-            
-            if repo_analysis['has_data_statement']:
-                data_statements.append(repo.name)
-            
-            if repo_analysis['has_dependencies']:
-                dependencies_docs.append(repo.name)
+                print(f"Progress: {i}/{total} repositories analyzed")
+            yield repo_analysis
+    
+    def reduce(self, repo_analyses):
+        """Merge per-repo analysis records, in repository order, into the feature matrix and aggregates"""
+        self.matrix = FeatureMatrix()
+        for repo_analysis in repo_analyses:
+            self.add_to_matrix(repo_analysis)
         
         # Compile final statistics
-        self.compile_statistics(language_files, readme_quality, 
-                              folder_structures, master_scripts,
-                              data_statements, dependencies_docs)
+        self.compile_statistics(self.matrix)
         
         return self.analysis_results
     
+    def add_to_matrix(self, repo_analysis):
+        """Record a repo's analysis as a row of the feature matrix"""
+        name = repo_analysis['name']
+        self.matrix.row(name)
+        
+        for lang, count in repo_analysis['languages'].items():
+            self.matrix.add(name, f"language:{lang}", count)
+        
+        self.matrix.set(name, 'readme:score', repo_analysis['readme_score'])
+        self.matrix.set(name, f"structure:{repo_analysis['structure_type']}", 1)
+        self.matrix.set(name, f"organization:{repo_analysis['code_organization']}", 1)
+        
+        for feature in ['master_script', 'data_statement', 'dependencies']:
+            if repo_analysis[f'has_{feature}']:
+                self.matrix.set(name, f"has:{feature}", 1)
+        
+        for method in repo_analysis['statistical_methods']:
+            self.matrix.set(name, f"method:{method}", 1)
+    
+    def analyze_parallel(self, repos, workers):
+        """Analyze repositories in a process pool, yielding results in repository order"""
+        cache_dir = self.cache.cache_dir if self.cache else None
+        chunksize = max(1, len(repos) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self.base_path, cache_dir)) as executor:
+            yield from executor.map(_analyze_repo_worker, repos, chunksize=chunksize)
+    
+    def get_inventory(self, repo_path):
+        """Return the file inventory of a repository, walking it only once"""
+        if self._inventory is None or self._inventory.root != Path(repo_path):
+            self._inventory = RepoInventory(repo_path)
+        return self._inventory
+    
     def analyze_single_repo(self, repo_path):
         """Analyze individual repository"""
+        self._inventory = RepoInventory(repo_path)
         analysis = {
             'name': repo_path.name,
-            'languages': self.detect_languages(repo_path),
+            'languages': dict(self.detect_languages(repo_path)),
             'structure_type': self.classify_structure(repo_path),
             'readme_score': self.assess_readme(repo_path),
             'has_master_script': self.check_master_script(repo_path),
@@ -95,17 +198,17 @@ class AEARepositoryAnalyzer:
             '.f90': 'Fortran'
         }
         
+        inventory = self.get_inventory(repo_path)
         counts = defaultdict(int)
         for ext, lang in extensions.items():
-            files = list(repo_path.rglob(f"*{ext}"))
-            if files:
-                counts[lang] = len(files)
+            if inventory.count(ext):
+                counts[lang] = inventory.count(ext)
         
         return counts
     
     def classify_structure(self, repo_path):
         """Classify repository structure pattern"""
-        subdirs = [d.name.lower() for d in repo_path.iterdir() if d.is_dir()]
+        subdirs = [d.lower() for d in self.get_inventory(repo_path).subdirs]
         
         # Check for standard patterns
         if all(d in subdirs for d in ['data', 'code', 'output']):
@@ -125,44 +228,28 @@ class AEARepositoryAnalyzer:
     
     def assess_readme(self, repo_path):
         """Score README comprehensiveness"""
-        readme_files = list(repo_path.glob("README*"))
+        readme_files = self.get_inventory(repo_path).top_level_files("README*")
         if not readme_files:
             return 0
         
-        score = 0
-        readme_content = ""
-        
+        keywords = set()
         for readme in readme_files:
-            try:
-                with open(readme, 'r', encoding='utf-8', errors='ignore') as f:
-                    readme_content += f.read().lower()
-            except:
-                continue
+            keywords |= self.scanner.find_file_keywords(readme, self.read_file_lower, self.cache,
+                                                        transform='lower')
         
         # Check for key sections
-        key_sections = {
-            'requirements': ['requirement', 'dependencies', 'software', 'version'],
-            'data': ['data', 'dataset', 'source'],
-            'instructions': ['instruction', 'how to', 'steps', 'run', 'execute'],
-            'files': ['file', 'structure', 'organization'],
-            'output': ['output', 'results', 'tables', 'figures'],
-            'authors': ['author', 'contact'],
-            'license': ['license', 'copyright'],
-            'citation': ['citation', 'cite', 'reference']
-        }
-        
-        for section, keywords in key_sections.items():
-            if any(keyword in readme_content for keyword in keywords):
-                score += 1
+        sections = self.scanner.categorize(keywords)['readme']
+        score = sum(1 for section in self.readme_sections if sections[section])
         
         return score
     
     def check_master_script(self, repo_path):
         """Check for master execution script"""
         master_patterns = ['master*', 'main*', 'run*', '_RunAll*', '00_*', '0_*']
+        inventory = self.get_inventory(repo_path)
         
         for pattern in master_patterns:
-            if list(repo_path.glob(pattern)):
+            if inventory.top_level_matches(pattern):
                 return True
         
         return False
@@ -170,11 +257,12 @@ class AEARepositoryAnalyzer:
     def check_data_statement(self, repo_path):
         """Check for data availability statement"""
         data_files = ['Data_Availability*', 'data_statement*', 'DAS*']
-        readme_files = list(repo_path.glob("README*"))
+        inventory = self.get_inventory(repo_path)
+        readme_files = [repo_path / name for name in inventory.top_level_matches("README*")]
         
         # Check dedicated files
         for pattern in data_files:
-            if list(repo_path.glob(pattern)):
+            if inventory.top_level_matches(pattern):
                 return True
         
         # Check in README
@@ -193,19 +281,17 @@ class AEARepositoryAnalyzer:
         """Check for dependency documentation"""
         dep_files = ['requirements.txt', 'environment.yml', 'packages.R', 
                     'stata.trk', 'dependencies*', 'packages*']
+        inventory = self.get_inventory(repo_path)
         
         for pattern in dep_files:
-            if list(repo_path.glob(pattern)):
+            if inventory.top_level_matches(pattern):
                 return True
         
         return False
     
     def assess_code_organization(self, repo_path):
         """Assess code organization quality"""
-        code_files = list(repo_path.glob("**/*.do")) + \
-                    list(repo_path.glob("**/*.R")) + \
-                    list(repo_path.glob("**/*.py")) + \
-                    list(repo_path.glob("**/*.m"))
+        code_files = self.get_inventory(repo_path).paths('.do', '.R', '.py', '.m')
         
         if not code_files:
             return 'no_code'
@@ -228,99 +314,75 @@ class AEARepositoryAnalyzer:
     def detect_statistical_methods(self, repo_path):
         """Detect statistical methods used"""
         methods = []
-        code_files = list(repo_path.glob("**/*.do")) + \
-                    list(repo_path.glob("**/*.R")) + \
-                    list(repo_path.glob("**/*.py"))
+        code_files = self.get_inventory(repo_path).entries('.do', '.R', '.py')
         
-        # Keywords for different methods
-        method_keywords = {
-            'OLS': ['regress', 'lm(', 'ols', 'regression'],
-            'IV': ['ivregress', 'ivreg', 'instrument', '2sls', 'tsls'],
-            'Panel': ['xtreg', 'plm', 'panel', 'fixed effect', 'random effect'],
-            'DID': ['diff-in-diff', 'difference-in-difference', 'did', 'event study'],
-            'RDD': ['rdrobust', 'rdd', 'regression discontinuity', 'fuzzy rd'],
-            'ML': ['random forest', 'neural', 'lasso', 'ridge', 'elastic net',
-                  'machine learning', 'cross-validation', 'sklearn'],
-            'Structural': ['gmm', 'maximum likelihood', 'mle', 'structural model'],
-            'Time Series': ['arima', 'var', 'vecm', 'cointegration', 'unit root'],
-            'Causal': ['causal', 'treatment effect', 'ate', 'att', 'propensity'],
-            'Bayesian': ['bayes', 'mcmc', 'prior', 'posterior', 'gibbs']
-        }
-        
-        content = ""
+        keywords = set()
         for f in code_files[:20]:  # Sample first 20 files
-            try:
-                with open(f, 'r', encoding='utf-8', errors='ignore') as file:
-                    content += file.read().lower()
-            except:
-                continue
+            keywords |= self.scanner.find_file_keywords(f, self.read_file_lower, self.cache,
+                                                        transform='lower')
         
-        for method, keywords in method_keywords.items():
-            if any(keyword in content for keyword in keywords):
+        hits = self.scanner.categorize(keywords)['methods']
+        for method in self.method_keywords:
+            if hits[method]:
                 methods.append(method)
         
         return methods
     
-    def compile_statistics(self, language_files, readme_quality, 
-                          folder_structures, master_scripts,
-                          data_statements, dependencies_docs):
-        """Compile final statistics and insights"""
+    def read_file_lower(self, filepath):
+        """Read lowercased file content safely"""
+        try:
+            with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+                return f.read().lower()
+        except:
+            return ""
+    
+    def compile_statistics(self, matrix):
+        """Compile final statistics and insights from the repo feature matrix"""
         
         # Language distribution
+        language_files = matrix.totals('language')
         total_files = sum(language_files.values())
         self.analysis_results['programming_languages'] = {
-            'distribution': dict(language_files),
+            'distribution': language_files,
             'percentages': {lang: (count/total_files*100) 
                           for lang, count in language_files.items()},
             'dominant': max(language_files, key=language_files.get)
         }
         
         # Documentation quality
+        readme_quality = matrix.column('readme:score')
         avg_readme_score = sum(readme_quality) / len(readme_quality)
         self.analysis_results['documentation'] = {
             'average_readme_score': avg_readme_score,
             'high_quality_repos': sum(1 for s in readme_quality if s >= 6),
             'poor_documentation': sum(1 for s in readme_quality if s <= 2),
-            'has_data_statements': len(data_statements),
-            'has_dependencies': len(dependencies_docs)
+            'has_data_statements': matrix.count('has:data_statement'),
+            'has_dependencies': matrix.count('has:dependencies')
         }
         
         # Structure patterns
-        structure_counts = Counter(folder_structures)
-        self.analysis_results['structure_patterns'] = dict(structure_counts)
+        self.analysis_results['structure_patterns'] = matrix.totals('structure')
         
         # Reproducibility features
+        master_scripts = matrix.count('has:master_script')
         self.analysis_results['reproducibility_features'] = {
-            'master_scripts': len(master_scripts),
-            'percentage_with_master': (len(master_scripts) / len(self.repos) * 100)
+            'master_scripts': master_scripts,
+            'percentage_with_master': (master_scripts / len(self.repos) * 100)
         }
         
         # Best practices identification
-        self.identify_best_practices(master_scripts, data_statements, 
-                                    dependencies_docs, readme_quality)
+        self.identify_best_practices(matrix)
     
-    def identify_best_practices(self, master_scripts, data_statements, 
-                               dependencies_docs, readme_quality):
+    def identify_best_practices(self, matrix):
         """Identify repos following best practices"""
         
         # Find repos with high scores across multiple dimensions
-        repo_scores = {}
-        
-        for i, repo in enumerate(self.repos):
-            score = 0
-            repo_name = repo.name
-            
-            # Check various quality indicators
-            if repo_name in master_scripts:
-                score += 2
-            if repo_name in data_statements:
-                score += 2
-            if repo_name in dependencies_docs:
-                score += 2
-            if i < len(readme_quality) and readme_quality[i] >= 6:
-                score += 3
-            
-            repo_scores[repo_name] = score
+        scores = [3 if s >= 6 else 0 for s in matrix.column('readme:score')]
+        for column in ['has:master_script', 'has:data_statement', 'has:dependencies']:
+            for i, value in enumerate(matrix.column(column)):
+                if value:
+                    scores[i] += 2
+        repo_scores = dict(zip(matrix.rows, scores))
         
         # Top 10% repos
         sorted_repos = sorted(repo_scores.items(), key=lambda x: x[1], reverse=True)
@@ -396,11 +458,67 @@ class AEARepositoryAnalyzer:
         
         return "\n".join(report)
 
+def read_ndjson(path):
+    """Yield the records of an NDJSON file, skipping a truncated last line"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            if line.strip():
+                yield json.loads(line)
+
+def recorded_repo_names(stream_path):
+    """Return repo names already in a stream, dropping a partially written last line"""
+    if not os.path.exists(stream_path):
+        return set()
+    
+    with open(stream_path, 'rb+') as f:
+        data = f.read()
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            f.truncate(complete)
+    
+    return {record['name'] for record in read_ndjson(stream_path)}
+
+_worker_analyzer = None
+
+def _init_worker(base_path, cache_dir):
+    """Create the analyzer used by one pool worker"""
+    global _worker_analyzer
+    cache = ScanCache(cache_dir) if cache_dir else None
+    _worker_analyzer = AEARepositoryAnalyzer(base_path, cache=cache)
+
+def _analyze_repo_worker(repo_path):
+    """Analyze one repository in a pool worker"""
+    repo_analysis = _worker_analyzer.analyze_single_repo(repo_path)
+    if _worker_analyzer.cache:
+        _worker_analyzer.cache.commit()
+    return repo_analysis
+
 # Run analysis
 if __name__ == "__main__":
-    analyzer = AEARepositoryAnalyzer("AEAREP-103-ssh/aea_packages_complete")
-    results = analyzer.analyze_all()
+    parser = argparse.ArgumentParser(description="Analyze AEA replication packages")
+    parser.add_argument("base_path", nargs="?", default="AEAREP-103-ssh/aea_packages_complete")
+    parser.add_argument("--cache-dir", help="reuse per-file scan results cached in this directory")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--stream", metavar="NDJSON",
+                        help="append one JSON line per repo to this file, resuming if it exists")
+    parser.add_argument("--reduce-only", action="store_true",
+                        help="only compute aggregates from the --stream file")
+    parser.add_argument("--matrix", help="save the repo × feature matrix to this file")
+    args = parser.parse_args()
+    
+    cache = ScanCache(args.cache_dir) if args.cache_dir else None
+    analyzer = AEARepositoryAnalyzer(args.base_path, cache=cache)
+    if args.stream and args.reduce_only:
+        results = analyzer.reduce_stream(args.stream)
+    elif args.stream:
+        results = analyzer.analyze_stream(args.stream, workers=args.workers)
+    else:
+        results = analyzer.analyze_all(workers=args.workers)
     report = analyzer.generate_report()
+    if cache:
+        cache.close()
     
     print("\n" + report)
     
@@ -411,6 +529,9 @@ if __name__ == "__main__":
     with open("aea_analysis_report.txt", "w") as f:
         f.write(report)
     
+    if args.matrix:
+        analyzer.matrix.save(args.matrix)
+    
     print("\n✅ Analysis complete! Results saved to:")
     print("  - aea_analysis_results.json")
     print("  - aea_analysis_report.txt")
\ No newline at end of file
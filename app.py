@@ -4,270 +4,436 @@ Flask Web Application for Lars Vilhuber Chatbot
 Provides a REST API and web interface for the chatbot
 """
 
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, Response, render_template, request, jsonify, session, stream_with_context
 from flask_cors import CORS
-import json
+from werkzeug.middleware.proxy_fix import ProxyFix
+import functools
+import math
 import random
 import re
+import time
 import uuid
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from collections import defaultdict, namedtuple
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 import os
 
+from conversation_store import Message, create_conversation_store
+from knowledge_base import KnowledgeBase, load_knowledge_base
+from metrics import ChatMetrics, service_metrics
+from rate_limit import create_rate_limiter
+from retrieval import DEFAULT_INDEX_DIR, BM25Index, Passage
+from sse import sse_event
+
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'lars-vilhuber-chatbot-secret-key-2024')
 CORS(app)
 
-# Store conversation histories (in production, use a database)
-conversations = {}
+# Larger request bodies are rejected with 413 before they are parsed
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 1024 * 1024))
+
+# Behind PROXY_COUNT reverse proxies (e.g. Render's), take the client IP from X-Forwarded-For
+if int(os.environ.get('PROXY_COUNT', 0)):
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.environ['PROXY_COUNT']))
+
+# Store conversation histories, bounded so bot traffic cannot exhaust memory.
+# Use SESSION_BACKEND=sqlite to share them between gunicorn workers.
+conversations = create_conversation_store(
+    os.environ.get('SESSION_BACKEND', 'memory'),
+    path=os.environ.get('SESSION_DB', 'conversations.sqlite3'),
+    max_sessions=int(os.environ.get('MAX_SESSIONS', 10000)),
+    ttl=int(os.environ.get('SESSION_TTL', 24 * 3600)),
+    max_messages=50
+)
+
+# Token buckets per client IP and per session, as (requests per second, burst).
+# Use RATE_LIMIT_BACKEND=sqlite to share them between gunicorn workers, or off.
+rate_limiter = create_rate_limiter(
+    os.environ.get('RATE_LIMIT_BACKEND', 'memory'),
+    path=os.environ.get('RATE_LIMIT_DB', 'rate_limits.sqlite3'),
+    limits={
+        'ip': (float(os.environ.get('RATE_LIMIT_IP', 120)) / 60, int(os.environ.get('RATE_LIMIT_IP_BURST', 60))),
+        'session': (float(os.environ.get('RATE_LIMIT_SESSION', 30)) / 60,
+                    int(os.environ.get('RATE_LIMIT_SESSION_BURST', 10)))
+    }
+)
+
+# Largest number of messages accepted by /api/chat/batch
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 1000))
+
+# Stage timings of /api/chat; METRICS_ENABLED=0 skips the timing calls
+metrics = ChatMetrics(enabled=os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no'))
+CHAT_STAGES = ('parse', 'store_read', 'match', 'generate', 'store_write', 'serialize')
+
+# What generate_response needs to know about a message: the reply kind
+# ("greeting", "closing" or "answer"), whether it asks a question, the pool
+# its main reply is drawn from, and corpus passages to cite
+ResponsePlan = namedtuple('ResponsePlan', ['topic', 'confidence', 'reply_kind', 'is_question', 'candidates',
+                                           'citations'])
 
 class LarsVilhuberBot:
     """Core chatbot logic"""
     
-    def __init__(self):
+    # Longer messages are rarely repeated, so they are planned without the cache
+    MAX_CACHED_MESSAGE = 256
+    
+    # Weaker retrieval matches are not worth quoting
+    MIN_CITATION_SCORE = 6.0
+    
+    def __init__(self, plan_cache_size=1024, knowledge: KnowledgeBase = None, retriever: BM25Index = None):
+        self.plan_cache_size = plan_cache_size
+        self.retriever = retriever
+        self.knowledge = knowledge or load_knowledge_base()
         self.initialize_knowledge_base()
         
     def initialize_knowledge_base(self):
-        """Initialize comprehensive knowledge base"""
+        """Attach the knowledge base shared by all bots in this process"""
+        self.expertise = self.knowledge.web["expertise"]
+        self.personality_phrases = self.knowledge.web["personality_phrases"]
+        self.default_responses = self.knowledge.web["default_responses"]
         
-        self.expertise = {
-            "computational_empathy": {
-                "keywords": ["computational empathy", "empathy", "thinking about"],
-                "responses": [
-                    "Computational empathy is a concept I developed to describe thinking about what an unknown person attempting to reproduce your results might face. It means considering different operating systems, software versions, skill levels, and access to resources.",
-                    "The key to computational empathy is documenting everything explicitly and testing your code as if you were a stranger to your own work. Ask yourself: would someone with a different setup be able to run this?"
-                ]
-            },
-            "reproducibility": {
-                "keywords": ["reproducible", "reproducibility", "replication", "replicate", "reproduce"],
-                "responses": [
-                    "Making research reproducible starts with good habits: clear file organization, documented dependencies, and tested code. I recommend the 'run it again' test - delete your output and see if you can recreate everything from scratch.",
-                    "A good replication package has three key elements: all the data (or clear access instructions), all the code in runnable form, and clear documentation linking the code to the paper results.",
-                    "Think of reproducibility as a ladder - each rung makes your work more accessible. Start with making it work for you, then a colleague, then someone in your field, then anyone."
-                ]
-            },
-            "data_transparency": {
-                "keywords": ["data", "transparency", "sharing", "access", "confidential", "restricted", "private"],
-                "responses": [
-                    "Data transparency doesn't mean everything must be public. When data can't be shared, document the data structure, provide access instructions, and consider creating synthetic data that demonstrates your code works.",
-                    "Even with confidential data, we can be transparent about its provenance and characteristics. Document exactly what data you used, where it came from, and how others can access it if possible.",
-                    "Data availability statements should be precise: what data exists, where it can be found, and what restrictions apply. 'Data available upon request' is no longer sufficient - be specific about the process."
-                ]
-            },
-            "stata": {
-                "keywords": ["stata"],
-                "responses": [
-                    "For Stata reproducibility: Always set the version explicitly with the 'version' command, document all ado files needed, and remember that not everyone has access to Stata/MP or the latest version.",
-                    "In Stata, use 'ssc install' or 'net install' with specific sources for packages. Consider using 'creturn list' to document your system configuration. And always specify the exact Stata version you're using."
-                ]
-            },
-            "r_language": {
-                "keywords": ["\\br\\b", "rstudio", "r programming", "r language"],
-                "responses": [
-                    "For R reproducibility: Use renv for package management, document your R version and all package versions. Use sessionInfo() to capture your environment.",
-                    "In R, consider using the groundhog package for date-based package versions. Be careful with compiled packages that may be OS-specific. Always include both your R version and package versions."
-                ]
-            },
-            "python": {
-                "keywords": ["python"],
-                "responses": [
-                    "For Python reproducibility: Use virtual environments or conda, create requirements.txt with specific versions using 'pip freeze'. Consider using poetry or pipenv for dependency management.",
-                    "With Python, be explicit about the Python version (3.8, 3.9, etc.). Different versions can have subtle differences that affect results. Always include a requirements.txt with exact versions."
-                ]
-            },
-            "docker": {
-                "keywords": ["docker", "container", "singularity"],
-                "responses": [
-                    "Docker and containers provide complete environment reproducibility. They're especially useful for complex setups with multiple software dependencies. Start with a minimal base image and document the build process.",
-                    "Containers like Docker ensure your code runs the same everywhere. While there's a learning curve, they solve many reproducibility issues. Consider them for projects with complex dependencies."
-                ]
-            },
-            "readme": {
-                "keywords": ["readme", "documentation", "document", "instructions"],
-                "responses": [
-                    "A good README should include: software requirements with versions, data availability statement, instructions to run the code, expected runtime, hardware requirements if substantial, and description of expected output.",
-                    "Think of your README as a letter to a stranger who needs to understand and run your work. Be explicit about prerequisites, provide step-by-step instructions, and explain what they should expect to see."
-                ]
-            },
-            "repositories": {
-                "keywords": ["repository", "zenodo", "archive", "openicpsr", "dataverse", "preserve", "github"],
-                "responses": [
-                    "For long-term preservation, use trusted repositories. Zenodo is excellent and provides DOIs. OpenICPSR is the AEA's preferred repository. Harvard Dataverse is widely used in social sciences.",
-                    "GitHub is great for collaboration but isn't an archive - it's for development, not preservation. For published work, use repositories that guarantee long-term preservation and provide DOIs."
-                ]
-            },
-            "teaching": {
-                "keywords": ["teach", "student", "education", "learning", "course", "class"],
-                "responses": [
-                    "Teaching reproducibility is crucial for the next generation. Start with simple exercises - have students reproduce a basic analysis, then gradually introduce complications.",
-                    "The 'have an undergrad run it' test is remarkably effective for finding issues in your replication package! Fresh eyes catch problems you've become blind to."
-                ]
-            },
-            "errors": {
-                "keywords": ["error", "problem", "issue", "fail", "doesn't work", "broken"],
-                "responses": [
-                    "When encountering errors, first check: Are all required packages/software installed? Are you using the correct versions? Are file paths correct? These solve 90% of reproducibility issues.",
-                    "Common reproducibility failures: hard-coded paths, missing dependencies, version mismatches, and platform-specific code. Document these potential issues in your README."
-                ]
-            },
-            "best_practices": {
-                "keywords": ["best practice", "recommend", "suggestion", "advice", "tips", "should i"],
-                "responses": [
-                    "My top recommendations: Start simple and build up. Test on a clean machine. Have someone else run your code. Document more than you think necessary. Use relative paths, not absolute ones.",
-                    "Best practices: Organize files logically, use descriptive names, set random seeds, avoid manual steps, test everything, and remember - perfect is the enemy of good. Any documentation beats none."
-                ]
-            }
-        }
+        self.build_match_index()
         
-        self.personality_phrases = {
-            "greeting": [
-                "Hello! I'm Lars Vilhuber, Data Editor at the American Economic Association. How can I help you with reproducibility today?",
-                "Hi there! I work on data transparency and reproducibility in economics. What questions do you have?",
-                "Welcome! I'm here to help with questions about replication packages, data citation, or reproducible research."
-            ],
-            "acknowledgment": [
-                "That's a great question.",
-                "This is something many researchers struggle with.",
-                "You're right to be thinking about this.",
-                "Good point - let me elaborate.",
-                "This is indeed important to consider."
-            ],
-            "teaching": [
-                "Let me break this down step by step.",
-                "Here's how I think about this:",
-                "In my experience with thousands of replication packages,",
-                "The key insight here is",
-                "Think about it this way:"
-            ],
-            "encouragement": [
-                "You're on the right track!",
-                "Every step toward reproducibility matters.",
-                "Don't let perfect be the enemy of good.",
-                "This is great progress!",
-                "Keep up the good work!"
-            ],
-            "closing": [
-                "Remember, perfect is the enemy of good - start with making your work reproducible by yourself!",
-                "Feel free to check out my self-checking reproducibility guide for more tips.",
-                "Good luck with your research! The reproducibility community is here to help.",
-                "Keep working on computational empathy - it gets easier with practice!"
-            ]
-        }
+    def build_match_index(self):
+        """Attach the keyword lookups precompiled in the knowledge base"""
+        # Inverted index: keyword -> ((topic, weight), ...), multi-word keywords weigh more
+        self.keyword_topics = self.knowledge.web_keyword_topics
         
-    def find_best_response(self, message: str) -> Tuple[str, float]:
-        """Find the best matching response for a message"""
+        # Substring triggers, so "hi" also matches inside "this"
+        self.trigger_words = self.knowledge.web_trigger_words
+        
+        self.matcher = self.knowledge.web_matcher
+        
+        # LRU cache of response plans, rebuilt along with the index it depends on
+        self._cached_plan = functools.lru_cache(maxsize=self.plan_cache_size)(self._build_plan)
+        
+    def warm_up(self):
+        """Compile the keyword matcher and load the corpus index before the first request"""
+        self.matcher.pattern
+        if self.retriever is not None:
+            self.retriever.refresh(force=True)
+        
+    def match_message(self, message: str) -> Tuple[Set[str], Optional[str], float]:
+        """Scan a message once for trigger words and its best matching topic"""
         message_lower = message.lower()
+        keywords = self.matcher.find_keywords(message_lower)
+        
+        scores = defaultdict(int)
+        for keyword in keywords:
+            for topic, weight in self.keyword_topics.get(keyword, ()):
+                scores[topic] += weight
+        
+        # Ties go to the first topic in knowledge-base order
         best_topic = None
         best_score = 0
-        
-        # Check each expertise area
-        for topic, data in self.expertise.items():
-            score = 0
-            for keyword in data["keywords"]:
-                if keyword in message_lower:
-                    # Weight multi-word keywords higher
-                    score += len(keyword.split())
-            
-            if score > best_score:
-                best_score = score
+        for topic in self.expertise:
+            if scores[topic] > best_score:
+                best_score = scores[topic]
                 best_topic = topic
         
         confidence = best_score / max(len(message_lower.split()), 1)
-        return best_topic, confidence
+        return keywords, best_topic, confidence
+        
+    def find_best_response(self, message: str) -> Tuple[str, float]:
+        """Find the best matching response for a message"""
+        plan = self.plan_response(message)
+        return plan.topic, plan.confidence
     
-    def generate_response(self, message: str, conversation_history: List[Dict] = None) -> str:
-        """Generate a contextual response"""
-        message_lower = message.lower()
+    def plan_response(self, message: str) -> ResponsePlan:
+        """Return the response plan of a message, from the cache when it was seen before"""
+        # Plans cite the corpus index, so they are dropped when it gains segments
+        if self.retriever is not None and self.retriever.refresh():
+            self._cached_plan.cache_clear()
+        
+        # Keywords never start or end with whitespace, so stripping keeps the match
+        normalized = message.lower().strip()
+        if len(normalized) > self.MAX_CACHED_MESSAGE:
+            return self._build_plan(normalized)
+        return self._cached_plan(normalized)
+    
+    def _build_plan(self, normalized: str) -> ResponsePlan:
+        keywords, topic, confidence = self.match_message(normalized)
+        is_question = bool(keywords & self.trigger_words["question"])
         
         # Handle greetings
-        if any(g in message_lower for g in ["hello", "hi", "hey", "greetings"]):
-            return random.choice(self.personality_phrases["greeting"])
+        if keywords & self.trigger_words["greeting"]:
+            return ResponsePlan(topic, confidence, "greeting", is_question, self.personality_phrases["greeting"], ())
         
         # Handle thanks/goodbye
-        if any(word in message_lower for word in ["thank", "thanks", "bye", "goodbye"]):
-            return random.choice(self.personality_phrases["closing"])
+        if keywords & self.trigger_words["closing"]:
+            return ResponsePlan(topic, confidence, "closing", is_question, self.personality_phrases["closing"], ())
+        
+        citations = ()
+        if self.retriever is not None:
+            citations = tuple(passage for passage in self.retriever.search(normalized, k=1, min_terms=2)
+                              if passage.score >= self.MIN_CITATION_SCORE)
         
-        # Find best matching topic
-        topic, confidence = self.find_best_response(message)
+        if topic and confidence > 0.1:
+            return ResponsePlan(topic, confidence, "answer", is_question, self.expertise[topic]["responses"], citations)
+        return ResponsePlan(topic, confidence, "answer", is_question, self.default_responses, citations)
+    
+    def format_citation(self, passage: Passage, max_words: int = 40) -> str:
+        """Quote the start of a corpus passage with its source"""
+        words = passage.text.split()
+        quote = " ".join(words[:max_words]) + (" ..." if len(words) > max_words else "")
+        return f'A relevant passage from {passage.source}: "{quote}"'
+    
+    def plan_cache_stats(self) -> Dict[str, int]:
+        """Hit and miss counts of the response plan cache"""
+        info = self._cached_plan.cache_info()
+        return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'max_size': info.maxsize}
+    
+    def generate_response(self, message: str, conversation_history: List[Message] = None,
+                          plan: ResponsePlan = None) -> str:
+        """Generate a contextual response, from a precomputed plan if given"""
+        return " ".join(self.iter_response_parts(message, conversation_history, plan))
+    
+    def iter_response_parts(self, message: str, conversation_history: List[Message] = None,
+                            plan: ResponsePlan = None) -> Iterator[str]:
+        """Yield the parts of a response (acknowledgment, teaching phrase, main answer,
+        encouragement) as each is chosen, so they can be streamed to the client"""
+        if plan is None:
+            plan = self.plan_response(message)
         
-        # Build response
-        response_parts = []
+        # Greetings and thanks/goodbye get a single phrase
+        if plan.reply_kind != "answer":
+            yield random.choice(plan.candidates)
+            return
         
         # Add acknowledgment for good questions
-        if confidence > 0.2 and random.random() > 0.5:
-            response_parts.append(random.choice(self.personality_phrases["acknowledgment"]))
+        if plan.confidence > 0.2 and random.random() > 0.5:
+            yield random.choice(self.personality_phrases["acknowledgment"])
         
         # Add teaching phrase for complex topics
-        if "how" in message_lower or "what" in message_lower or "why" in message_lower:
+        if plan.is_question:
             if random.random() > 0.6:
-                response_parts.append(random.choice(self.personality_phrases["teaching"]))
+                yield random.choice(self.personality_phrases["teaching"])
         
-        # Add main response
-        if topic and confidence > 0.1:
-            response_parts.append(random.choice(self.expertise[topic]["responses"]))
-        else:
-            # Default responses for unclear questions
-            defaults = [
-                "Could you tell me more about your specific situation? Are you working with a particular software or type of data?",
-                "I'd be happy to help! Could you provide more details about what aspect of reproducibility you're interested in?",
-                "That's interesting. To give you the most relevant advice, could you tell me what software you're using and what kind of project you're working on?",
-                "Let me understand better - are you preparing a replication package, or trying to reproduce someone else's work?"
-            ]
-            response_parts.append(random.choice(defaults))
+        # Add main response, or a default one for unclear questions
+        yield random.choice(plan.candidates)
+        
+        # Cite the most relevant passage of the local research corpus
+        for passage in plan.citations:
+            yield self.format_citation(passage)
         
         # Add encouragement occasionally
         if random.random() > 0.8:
-            response_parts.append(random.choice(self.personality_phrases["encouragement"]))
+            yield random.choice(self.personality_phrases["encouragement"])
+    
+    def generate_responses(self, messages: List[str]) -> List[Dict]:
+        """Respond to many independent messages in one call
+        
+        Each result has the response with the matched topic and confidence.
+        Repeated messages reuse their cached response plan.
+        """
+        results = []
+        for message in messages:
+            plan = self.plan_response(message)
+            results.append({
+                'response': self.generate_response(message, plan=plan),
+                'topic': plan.topic,
+                'confidence': plan.confidence
+            })
+        return results
+    
+    async def agenerate_response(self, message: str, conversation_history: List[Message] = None) -> str:
+        """Coroutine version of generate_response for the async server (asgi_app.py)
         
-        return " ".join(response_parts)
+        Planning refreshes the corpus index, which stats the manifest and may
+        load new segments from disk, so it runs in a thread; generating from the
+        plan is CPU-only and fast, so it runs inline. Responders backed by I/O
+        (e.g. an LLM call) override this to await without blocking the loop.
+        """
+        # Imported here so the Flask app does not load asyncio at startup
+        import asyncio
+        plan = await asyncio.to_thread(self.plan_response, message)
+        return self.generate_response(message, conversation_history, plan=plan)
+    
+    async def aiter_response_parts(self, message: str, conversation_history: List[Message] = None):
+        """Async iterator version of iter_response_parts for the async server, planning in a thread"""
+        import asyncio
+        plan = await asyncio.to_thread(self.plan_response, message)
+        for part in self.iter_response_parts(message, conversation_history, plan):
+            yield part
+    
+    async def agenerate_responses(self, messages: List[str]) -> List[Dict]:
+        """Coroutine version of generate_responses for the async server
+        
+        A batch holds up to MAX_BATCH_SIZE messages, so it runs in a thread.
+        """
+        import asyncio
+        return await asyncio.to_thread(self.generate_responses, messages)
+
+# STARTUP_MODE=lazy (the default) leaves loading the corpus index and compiling
+# the keyword matcher to the first chat request, so a cold worker is ready sooner;
+# eager does both while the worker starts
+LAZY_STARTUP = os.environ.get('STARTUP_MODE', 'lazy').lower() != 'eager'
 
-# Initialize the bot
-bot = LarsVilhuberBot()
+# Initialize the bot; answers cite the corpus once `python retrieval.py build` has run,
+# and segments added later by `python retrieval.py update` are picked up while running
+bot = LarsVilhuberBot(
+    plan_cache_size=int(os.environ.get('RESPONSE_CACHE_SIZE', 1024)),
+    retriever=BM25Index.open(os.environ.get('RETRIEVAL_INDEX',
+                                            os.path.join(os.path.dirname(os.path.abspath(__file__)), DEFAULT_INDEX_DIR)),
+                             lazy=LAZY_STARTUP)
+)
+if not LAZY_STARTUP:
+    bot.warm_up()
 
 @app.route('/')
 def index():
     """Serve the main chat interface"""
+    # The conversation itself is only stored once a message is sent
     if 'session_id' not in session:
         session['session_id'] = str(uuid.uuid4())
-        conversations[session['session_id']] = []
     return render_template('chat.html')
 
+def rate_limited(kind, key, cost=1):
+    """Take cost tokens from a client's bucket; returns a 429 response when they are not there, else None
+    
+    Requests without a session_id get a new session each time, so their
+    session bucket is keyed by the client IP instead. A cost the bucket can
+    never cover is rejected without a Retry-After. Clients without an address,
+    as behind a unix socket, share the 'unknown' bucket.
+    """
+    if not rate_limiter.enabled:
+        return None
+    wait = rate_limiter.hit(kind, key or 'unknown', cost)
+    if not wait:
+        return None
+    response = jsonify({'error': 'Too many requests, please slow down'})
+    response.status_code = 429
+    if wait != math.inf:
+        response.headers['Retry-After'] = str(math.ceil(wait))
+    return response
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Handle chat messages via API"""
+    # Over-limit clients are turned away before the body is even parsed
+    rejected = rate_limited('ip', request.remote_addr)
+    if rejected:
+        return rejected
+    
+    # Timestamps at the end of each of CHAT_STAGES, when metrics are enabled
+    marks = [time.perf_counter()] if metrics.enabled else None
+    
     data = request.json
     message = data.get('message', '')
-    session_id = data.get('session_id', str(uuid.uuid4()))
-    
-    # Get or create conversation history
-    if session_id not in conversations:
-        conversations[session_id] = []
+    session_id = data.get('session_id')
+    rejected = rate_limited('session', session_id or request.remote_addr)
+    if rejected:
+        return rejected
+    session_id = session_id or str(uuid.uuid4())
+    if marks:
+        marks.append(time.perf_counter())
     
     # Add user message to history
-    conversations[session_id].append({
-        'role': 'user',
-        'content': message,
-        'timestamp': datetime.now().isoformat()
-    })
-    
-    # Generate response
-    response = bot.generate_response(message, conversations[session_id])
+    user_message = Message('user', message, time.time())
+    history = conversations.get(session_id) + [user_message]
+    if marks:
+        marks.append(time.perf_counter())
     
-    # Add bot response to history
-    conversations[session_id].append({
-        'role': 'assistant',
-        'content': response,
-        'timestamp': datetime.now().isoformat()
-    })
+    # Match the message, then generate the response from its plan
+    plan = bot.plan_response(message)
+    if marks:
+        marks.append(time.perf_counter())
+    response = bot.generate_response(message, history, plan=plan)
+    if marks:
+        marks.append(time.perf_counter())
     
-    # Limit conversation history to last 50 messages
-    if len(conversations[session_id]) > 50:
-        conversations[session_id] = conversations[session_id][-50:]
+    # Store both messages in one write (the store keeps the last 50 messages)
+    conversations.extend(session_id, [user_message, Message('assistant', response, time.time())])
+    if marks:
+        marks.append(time.perf_counter())
     
-    return jsonify({
+    result = jsonify({
         'response': response,
         'session_id': session_id
     })
+    if marks:
+        marks.append(time.perf_counter())
+        metrics.record_request(
+            plan.topic,
+            {stage: end - start for stage, start, end in zip(CHAT_STAGES, marks, marks[1:])},
+            marks[-1] - marks[0]
+        )
+    return result
+
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    """Answer a list of messages in one request
+    
+    Conversations are left untouched unless a session_id is given, in which case
+    every message and response is appended to that conversation in one write.
+    Every message takes a token from the client IP's bucket, so a batch larger
+    than its burst is rejected before any matching; the session bucket is
+    charged once per batch.
+    """
+    rejected = rate_limited('ip', request.remote_addr)
+    if rejected:
+        return rejected
+    
+    data = request.json
+    messages = data.get('messages')
+    if not isinstance(messages, list) or not all(isinstance(m, str) for m in messages):
+        return jsonify({'error': "'messages' must be a list of strings"}), 400
+    if len(messages) > MAX_BATCH_SIZE:
+        return jsonify({'error': f"At most {MAX_BATCH_SIZE} messages per batch"}), 400
+    # The token taken before the body was parsed covers the first message
+    if len(messages) > 1:
+        rejected = rate_limited('ip', request.remote_addr, len(messages) - 1)
+        if rejected:
+            return rejected
+    
+    session_id = data.get('session_id')
+    rejected = rate_limited('session', session_id or request.remote_addr)
+    if rejected:
+        return rejected
+    
+    results = bot.generate_responses(messages)
+    
+    if session_id is not None:
+        now = time.time()
+        conversations.extend(session_id, [
+            turn for message, result in zip(messages, results)
+            for turn in (Message('user', message, now), Message('assistant', result['response'], now))
+        ])
+    
+    return jsonify({'results': results, 'session_id': session_id})
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream a chat response as Server-Sent Events, one 'part' event per response part
+    
+    A final 'done' event carries the full response and session id, as /api/chat returns.
+    """
+    rejected = rate_limited('ip', request.remote_addr)
+    if rejected:
+        return rejected
+    
+    data = request.json
+    message = data.get('message', '')
+    session_id = data.get('session_id')
+    rejected = rate_limited('session', session_id or request.remote_addr)
+    if rejected:
+        return rejected
+    session_id = session_id or str(uuid.uuid4())
+    
+    def events():
+        user_message = Message('user', message, time.time())
+        history = conversations.get(session_id) + [user_message]
+        
+        parts = []
+        for part in bot.iter_response_parts(message, history):
+            parts.append(part)
+            yield sse_event('part', {'text': part})
+        
+        response = " ".join(parts)
+        conversations.extend(session_id, [user_message, Message('assistant', response, time.time())])
+        yield sse_event('done', {'response': response, 'session_id': session_id})
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/reset', methods=['POST'])
 def reset():
@@ -275,15 +441,27 @@ def reset():
     data = request.json
     session_id = data.get('session_id')
     
-    if session_id in conversations:
-        conversations[session_id] = []
+    conversations.reset(session_id)
     
     return jsonify({'status': 'success', 'message': 'Conversation reset'})
 
 @app.route('/api/health')
 def health():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'bot': 'Lars Vilhuber Chatbot'})
+    return jsonify({
+        'status': 'healthy',
+        'bot': 'Lars Vilhuber Chatbot',
+        'conversations': conversations.stats(),
+        'response_cache': bot.plan_cache_stats(),
+        'rate_limit': rate_limiter.stats()
+    })
+
+@app.route('/api/metrics')
+def metrics_endpoint():
+    """Request metrics of this worker in the Prometheus text format"""
+    text = metrics.render(service_metrics(conversations.stats(), bot.plan_cache_stats(),
+                                          rate_limiter.stats()['rejected']))
+    return Response(text, mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
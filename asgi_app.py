@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+ASGI version of the Lars Vilhuber Chatbot API
+Serves the same routes and JSON contract as app.py from an async server, so a
+slow responder (e.g. one calling an LLM) does not hold a worker per request.
+Run with: uvicorn asgi_app:app
+"""
+
+import asyncio
+import json
+import math
+import os
+import time
+import uuid
+from pathlib import Path
+
+from conversation_store import Message
+from metrics import ChatMetrics, service_metrics
+from sse import sse_event
+
+TEMPLATE_PATH = Path(__file__).resolve().parent / 'templates' / 'chat.html'
+
+# Largest request body read, as MAX_CONTENT_LENGTH in app.py
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class RequestTooLarge(Exception):
+    """The request body is larger than the app accepts"""
+
+
+class ClientDisconnected(Exception):
+    """The client went away before its request body was read"""
+
+
+class ChatASGIApp:
+    """Minimal ASGI application for the chat API
+
+    The responder is any object with coroutines
+    agenerate_response(message, history) and agenerate_responses(messages)
+    and an async iterator aiter_response_parts(message, history), such as
+    LarsVilhuberBot or a stub backend in tests. Conversation store and rate
+    limiter calls run in a thread, as their SQLite backends block. Without a
+    limiter, requests are not rate limited. /api/metrics reports the store,
+    response cache and rate limit values; the per-stage /api/chat timings are
+    only recorded by app.py, so the metrics default to disabled here. Behind
+    proxy_count reverse proxies, client IPs are read from X-Forwarded-For, as
+    PROXY_COUNT does for app.py.
+    """
+
+    def __init__(self, responder, store, template_path=TEMPLATE_PATH, limiter=None,
+                 metrics=None, max_batch_size=1000, max_body_size=MAX_BODY_SIZE, proxy_count=0):
+        self.responder = responder
+        self.store = store
+        self.limiter = limiter
+        self.proxy_count = proxy_count
+        self.metrics = metrics if metrics is not None else ChatMetrics(enabled=False)
+        self.max_batch_size = max_batch_size
+        self.max_body_size = max_body_size
+        self.template_path = Path(template_path)
+        self._page = None
+        self.routes = {
+            '/': {'GET': self.index},
+            '/api/chat': {'POST': self.chat},
+            '/api/chat/batch': {'POST': self.chat_batch},
+            '/api/chat/stream': {'POST': self.chat_stream},
+            '/api/reset': {'POST': self.reset},
+            '/api/health': {'GET': self.health},
+            '/api/metrics': {'GET': self.metrics_endpoint}
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        methods = self.routes.get(scope['path'])
+        if methods is None:
+            await self.send_json(send, 404, {'error': 'Not found'})
+            return
+        if scope['method'] == 'OPTIONS':
+            # CORS preflight, matching flask_cors defaults in app.py
+            await self.send(send, 200, 'text/plain', b'', [
+                (b'access-control-allow-methods', ', '.join(list(methods) + ['OPTIONS']).encode()),
+                (b'access-control-allow-headers', b'content-type')
+            ])
+            return
+        handler = methods.get(scope['method'])
+        if handler is None:
+            await self.send_json(send, 405, {'error': 'Method not allowed'})
+            return
+        try:
+            await handler(scope, receive, send)
+        except RequestTooLarge:
+            await self.send_json(send, 413, {'error': 'Request body too large'})
+        except ClientDisconnected:
+            # Nobody is left to answer
+            return
+
+    async def lifespan(self, receive, send):
+        """Answer server startup and shutdown events"""
+        while True:
+            event = await receive()
+            if event['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif event['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_json(self, receive):
+        """Read the full request body and decode it as JSON, or None if invalid
+
+        Raises RequestTooLarge, answered with a 413, as soon as the body
+        exceeds max_body_size, before the rest of it is read, and
+        ClientDisconnected, left unanswered, if the client goes away first.
+        """
+        body = b''
+        more_body = True
+        while more_body:
+            event = await receive()
+            if event['type'] == 'http.disconnect':
+                raise ClientDisconnected()
+            body += event.get('body', b'')
+            if len(body) > self.max_body_size:
+                raise RequestTooLarge()
+            more_body = event.get('more_body', False)
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    async def send(self, send, status, content_type, body, headers=()):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', content_type.encode()),
+                (b'content-length', str(len(body)).encode()),
+                (b'access-control-allow-origin', b'*'),
+                *headers
+            ]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def send_json(self, send, status, payload):
+        await self.send(send, status, 'application/json', json.dumps(payload).encode('utf-8'))
+
+    async def rate_limited(self, send, kind, key, cost=1):
+        """Take cost tokens from a client's bucket; sends a 429 and returns True when they are not there"""
+        if self.limiter is None or not self.limiter.enabled:
+            return False
+        wait = await asyncio.to_thread(self.limiter.hit, kind, key, cost)
+        if not wait:
+            return False
+        headers = [(b'retry-after', str(math.ceil(wait)).encode())] if wait != math.inf else []
+        await self.send(send, 429, 'application/json',
+                        json.dumps({'error': 'Too many requests, please slow down'}).encode('utf-8'), headers)
+        return True
+
+    async def admit(self, scope, send):
+        """Check the client IP against its rate limit, before the request body is read"""
+        return not await self.rate_limited(send, 'ip', self.client_ip(scope))
+
+    async def admit_session(self, scope, send, session_id):
+        """Check a session against its rate limit, or the client IP's session bucket without one"""
+        return not await self.rate_limited(send, 'session', session_id or self.client_ip(scope))
+
+    def client_ip(self, scope):
+        """Address of the client, or 'unknown' when the server has none, as over a unix socket
+
+        Behind proxies it is the proxy_count-th X-Forwarded-For entry from the
+        right, the one added by the outermost trusted proxy, like werkzeug's
+        ProxyFix; with fewer entries the connecting address is used.
+        """
+        if self.proxy_count:
+            forwarded = [address.strip() for name, value in scope.get('headers', ())
+                         if name == b'x-forwarded-for' for address in value.decode('latin-1').split(',')]
+            if len(forwarded) >= self.proxy_count:
+                return forwarded[-self.proxy_count]
+        client = scope.get('client')
+        return client[0] if client else 'unknown'
+
+    async def index(self, scope, receive, send):
+        """Serve the main chat interface"""
+        if self._page is None:
+            self._page = await asyncio.to_thread(self.template_path.read_bytes)
+        await self.send(send, 200, 'text/html; charset=utf-8', self._page)
+
+    async def chat(self, scope, receive, send):
+        """Handle chat messages via API"""
+        # Over-limit clients are turned away before the body is even read
+        if not await self.admit(scope, send):
+            return
+        data = await self.read_json(receive)
+        if data is None:
+            await self.send_json(send, 400, {'error': 'Expected a JSON object'})
+            return
+        message = data.get('message', '')
+        session_id = data.get('session_id')
+        if not await self.admit_session(scope, send, session_id):
+            return
+        session_id = session_id or str(uuid.uuid4())
+
+        user_message = Message('user', message, time.time())
+        history = await asyncio.to_thread(self.store.get, session_id)
+        history.append(user_message)
+
+        response = await self.responder.agenerate_response(message, history)
+
+        await asyncio.to_thread(
+            self.store.extend, session_id,
+            [user_message, Message('assistant', response, time.time())]
+        )
+        await self.send_json(send, 200, {'response': response, 'session_id': session_id})
+
+    async def chat_batch(self, scope, receive, send):
+        """Answer a list of messages in one request, like /api/chat/batch in app.py
+
+        Every message takes a token from the client IP's bucket, the token
+        taken before the body is read covering the first one.
+        """
+        if not await self.admit(scope, send):
+            return
+        data = await self.read_json(receive)
+        if data is None:
+            await self.send_json(send, 400, {'error': 'Expected a JSON object'})
+            return
+        messages = data.get('messages')
+        if not isinstance(messages, list) or not all(isinstance(m, str) for m in messages):
+            await self.send_json(send, 400, {'error': "'messages' must be a list of strings"})
+            return
+        if len(messages) > self.max_batch_size:
+            await self.send_json(send, 400, {'error': f"At most {self.max_batch_size} messages per batch"})
+            return
+        if len(messages) > 1 and await self.rate_limited(send, 'ip', self.client_ip(scope), len(messages) - 1):
+            return
+
+        session_id = data.get('session_id')
+        if not await self.admit_session(scope, send, session_id):
+            return
+
+        results = await self.responder.agenerate_responses(messages)
+
+        if session_id is not None:
+            now = time.time()
+            await asyncio.to_thread(self.store.extend, session_id, [
+                turn for message, result in zip(messages, results)
+                for turn in (Message('user', message, now), Message('assistant', result['response'], now))
+            ])
+        await self.send_json(send, 200, {'results': results, 'session_id': session_id})
+
+    async def chat_stream(self, scope, receive, send):
+        """Stream a chat response as Server-Sent Events, like /api/chat/stream in app.py"""
+        # Over-limit clients are turned away before the body is even read
+        if not await self.admit(scope, send):
+            return
+        data = await self.read_json(receive)
+        if data is None:
+            await self.send_json(send, 400, {'error': 'Expected a JSON object'})
+            return
+        message = data.get('message', '')
+        session_id = data.get('session_id')
+        if not await self.admit_session(scope, send, session_id):
+            return
+        session_id = session_id or str(uuid.uuid4())
+
+        user_message = Message('user', message, time.time())
+        history = await asyncio.to_thread(self.store.get, session_id)
+        history.append(user_message)
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+                (b'access-control-allow-origin', b'*')
+            ]
+        })
+        parts = []
+        async for part in self.responder.aiter_response_parts(message, history):
+            parts.append(part)
+            await send({'type': 'http.response.body',
+                        'body': sse_event('part', {'text': part}).encode('utf-8'),
+                        'more_body': True})
+
+        response = " ".join(parts)
+        await asyncio.to_thread(
+            self.store.extend, session_id,
+            [user_message, Message('assistant', response, time.time())]
+        )
+        await send({'type': 'http.response.body',
+                    'body': sse_event('done', {'response': response, 'session_id': session_id}).encode('utf-8')})
+
+    async def reset(self, scope, receive, send):
+        """Reset conversation history"""
+        data = await self.read_json(receive)
+        if data is None:
+            await self.send_json(send, 400, {'error': 'Expected a JSON object'})
+            return
+        await asyncio.to_thread(self.store.reset, data.get('session_id'))
+        await self.send_json(send, 200, {'status': 'success', 'message': 'Conversation reset'})
+
+    async def health(self, scope, receive, send):
+        """Health check endpoint"""
+        stats = await asyncio.to_thread(self.store.stats)
+        payload = {
+            'status': 'healthy',
+            'bot': 'Lars Vilhuber Chatbot',
+            'conversations': stats
+        }
+        if hasattr(self.responder, 'plan_cache_stats'):
+            payload['response_cache'] = self.responder.plan_cache_stats()
+        if self.limiter is not None:
+            payload['rate_limit'] = await asyncio.to_thread(self.limiter.stats)
+        await self.send_json(send, 200, payload)
+
+    async def metrics_endpoint(self, scope, receive, send):
+        """Request metrics of this worker in the Prometheus text format"""
+        store_stats = await asyncio.to_thread(self.store.stats)
+        cache_stats = self.responder.plan_cache_stats() if hasattr(self.responder, 'plan_cache_stats') else None
+        rejected = (await asyncio.to_thread(self.limiter.stats))['rejected'] if self.limiter is not None else {}
+        text = self.metrics.render(service_metrics(store_stats, cache_stats, rejected))
+        await self.send(send, 200, 'text/plain; version=0.0.4', text.encode('utf-8'))
+
+
+def create_app(responder=None, store=None, limiter=None, max_batch_size=None, max_body_size=None,
+               proxy_count=None):
+    """Build the ASGI app, defaulting to the bot, store, rate limiter, size limits and PROXY_COUNT of app.py"""
+    if None in (responder, store, limiter, max_batch_size, max_body_size):
+        import app as flask_app
+        if responder is None:
+            responder = flask_app.bot
+        if store is None:
+            store = flask_app.conversations
+        if limiter is None:
+            limiter = flask_app.rate_limiter
+        if max_batch_size is None:
+            max_batch_size = flask_app.MAX_BATCH_SIZE
+        if max_body_size is None:
+            max_body_size = flask_app.app.config['MAX_CONTENT_LENGTH']
+    if proxy_count is None:
+        proxy_count = int(os.environ.get('PROXY_COUNT', 0))
+    return ChatASGIApp(responder, store, limiter=limiter, max_batch_size=max_batch_size,
+                       max_body_size=max_body_size, proxy_count=proxy_count)
+
+
+app = create_app()
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Streaming lexers reducing Stata, R and Python code to the commands it runs
+Comments and strings are masked and only words in command position are kept:
+the command of every Stata statement with its subcommand and options, and the
+functions an R or Python script calls with the packages or modules it loads, so
+method tables are looked up in those tokens instead of in text that also holds
+comments, strings and variable names
+"""
+
+import keyword
+import re
+from abc import ABC, abstractmethod
+
+# Identifies the tokens produced for a file, so cached token sets are dropped when it changes
+LEXER_VERSION = 3
+
+
+def string_pattern(quote, multiline=True):
+    """Regex matching the rest of a string after its opening quote, escapes included"""
+    body = re.escape(quote[0])
+    if len(quote) == 1:
+        newline = '' if multiline else r'\n'
+        return re.compile(r'[^%s\\%s]*(?:\\.[^%s\\%s]*)*(?P<end>%s)' % (body, newline, body, newline, body),
+                          re.DOTALL if multiline else 0)
+    return re.compile(r'(?:[^\\]|\\.)*?(?P<end>%s)' % re.escape(quote), re.DOTALL)
+
+
+# Calls are matched in reversed code, from each '(' back to the name before it (and a def or
+# class keyword before that): a regex starting with a literal is searched for far faster
+# than one that has to be tried at every name
+REVERSED_CALL = re.compile(r'\([ \t]*([\w.]+)(?P<define>[ \t]+(?:fed|ssalc)(?!\w))?')
+
+
+def calls(code):
+    """Yield (name, whether def or class defines it) for every call in masked code"""
+    for match in REVERSED_CALL.finditer(code[::-1]):
+        name = match.group(1)[::-1].lstrip('.')
+        if name and not name[0].isdigit():
+            yield name, bool(match.group('define'))
+
+
+class CodeLexer(ABC):
+    """Token set of code fed chunk by chunk, lexed a whole line at a time
+
+    Only the unfinished last line of a chunk is held until the next one.
+    Lines longer than max_line characters are lexed up to there and the rest
+    of them is skipped, bounding memory for generated files.
+
+    Subclasses mask their code with SKIP, a regex matching where a comment
+    (group 'comment', dropped) or a string (group 'string', its opening quote)
+    starts; STRINGS maps each opening quote to the regex of the rest of the
+    string. Strings whose regex is DOTALL may go on over later lines.
+    """
+
+    SKIP = None
+    STRINGS = {}
+
+    def __init__(self, max_line=1 << 20):
+        self.tokens = set()
+        self.max_line = max_line
+        self._pending = ''
+        self._skip_line = False
+        self._string = None
+
+    @classmethod
+    def tokenize(cls, text):
+        """Return the token set of a whole text"""
+        lexer = cls()
+        lexer.feed(text)
+        return lexer.close()
+
+    def feed(self, chunk):
+        """Lex the lines completed by the next chunk; returns the tokens found so far"""
+        if self._skip_line:
+            newline = chunk.find('\n')
+            if newline < 0:
+                return self.tokens
+            chunk = chunk[newline + 1:]
+            self._skip_line = False
+
+        text = self._pending + chunk
+        cut = text.rfind('\n') + 1
+        if cut:
+            self.lex(text[:cut])
+            text = text[cut:]
+        if len(text) > self.max_line:
+            self.lex(text[:self.max_line] + '\n')
+            text = ''
+            self._skip_line = True
+        self._pending = text
+        return self.tokens
+
+    def close(self):
+        """Lex the last line even without a newline; returns all tokens of the code"""
+        if self._pending:
+            self.lex(self._pending + '\n')
+            self._pending = ''
+        return self.tokens
+
+    @abstractmethod
+    def lex(self, text):
+        """Add the tokens of complete lines of code to self.tokens"""
+
+    def mask(self, text):
+        """Return text with comments dropped and strings masked, carrying an open string over"""
+        parts = []
+        pos = self._close_string(text, 0, self._string, parts) if self._string else 0
+        end = len(text)
+        while pos < end:
+            match = self.SKIP.search(text, pos)
+            if not match:
+                parts.append(text[pos:])
+                break
+            parts.append(text[pos:match.start()])
+            pos = self.skip(text, match, parts)
+        return ''.join(parts)
+
+    def skip(self, text, match, parts):
+        """Mask the comment or string at a SKIP match; returns where the code resumes"""
+        if match.lastgroup == 'comment':
+            return match.end()
+        return self._close_string(text, match.end(), self.STRINGS[match.group()], parts)
+
+    def _close_string(self, text, pos, closing, parts):
+        """Skip a string to its closing regex, or carry it over when it goes on past text"""
+        match = closing.match(text, pos)
+        if match:
+            self._string = None
+            parts.append(self.masked_string(text[pos:match.start('end')]))
+            return match.end()
+        if closing.flags & re.DOTALL:
+            self._string = closing
+            return len(text)
+        # A single-line string left open ends at the line
+        parts.append('""')
+        newline = text.find('\n', pos)
+        return newline if newline >= 0 else len(text)
+
+    def masked_string(self, content):
+        """What a string is replaced with in the masked code"""
+        return '""'
+
+
+class StataLexer(CodeLexer):
+    """Commands of a do-file, with their subcommands and option names
+
+    Every statement yields its command ('ivregress'), the command with its
+    next word ('ivregress 2sls'), the family of an underscored command
+    ('did_' for did_imputation) and its options, by name ('vce') and with
+    their first argument ('vce(cluster'). Prefixes such as 'quietly' or
+    'by id:' are followed to the command they run. Comments (*, //, ///,
+    nested /* */) and strings are masked, and statements are split at
+    semicolons after #delimit ;. Like lines, statements longer than max_line
+    characters are lexed up to there and the rest of them is skipped.
+    """
+
+    SKIP = re.compile(r'''
+        (?P<comment>^[ \t]*\*[^\n]*|(?<!\S)//(?!/)[^\n]*)
+      | (?P<continuation>(?<!\S)///[^\n]*\n?)
+      | (?P<block>/\*)
+      | (?P<string>`"|")
+    ''', re.VERBOSE | re.MULTILINE)
+    STRINGS = {'"': re.compile(r'[^"\n]*(?P<end>")'), '`"': re.compile(r'[^\n]*?(?P<end>"\')')}
+    BLOCK = re.compile(r'/\*|\*/')
+    DELIMIT = re.compile(r'^[ \t]*#d(?:e(?:l(?:i(?:m(?:i(?:t)?)?)?)?)?)?[ \t]+(;|cr)(?!\w)[^\n]*\n?', re.MULTILINE)
+
+    # Words run before a command: quietly, noisily and capture with their abbreviations
+    WORD_PREFIXES = ({'quietly'[:n] for n in range(3, 8)} | {'noisily'[:n] for n in range(1, 8)}
+                     | {'capture'[:n] for n in range(3, 8)})
+    # Commands whose colon is followed by the command they run
+    COLON_PREFIXES = {'by', 'bys', 'byso', 'bysor', 'bysort', 'xi', 'svy', 'mi', 'eststo', 'version',
+                      'bootstrap', 'bs', 'jackknife', 'jknife', 'statsby', 'rolling', 'simulate',
+                      'permute', 'nestreg', 'stepwise', 'frame'}
+    COMMAND = re.compile(r'[ \t]*(?:(?:%s)(?!\w)[ \t]*:?[ \t]*)*(?P<command>[^\W\d]\w*)(?:[ \t]+(?P<sub>\w+))?'
+                         % '|'.join(sorted(WORD_PREFIXES, key=len, reverse=True)))
+    # An option with the first word of its arguments, whose other words are skipped
+    OPTION = re.compile(r'([^\W\d]\w*)[ \t]*(?:\([ \t]*(\w*)[^()]*(?:\([^()]*\)[^()]*)*\)?)?')
+
+    def __init__(self, max_line=1 << 20):
+        super().__init__(max_line)
+        self._delimiter = '\n'
+        self._comment_depth = 0
+        # Start of a statement going on over later lines
+        self._statement = ''
+        self._skip_statement = False
+
+    def skip(self, text, match, parts):
+        if match.lastgroup == 'continuation':
+            parts.append(' ')
+            return match.end()
+        if match.lastgroup == 'block':
+            self._comment_depth = 1
+            return self._skip_block(text, match.end())
+        return super().skip(text, match, parts)
+
+    def _skip_block(self, text, pos):
+        """Skip a /* */ comment, nested ones included; returns where the code resumes"""
+        for match in self.BLOCK.finditer(text, pos):
+            self._comment_depth += 1 if match.group() == '/*' else -1
+            if not self._comment_depth:
+                return match.end()
+        return len(text)
+
+    def lex(self, text):
+        pos = self._skip_block(text, 0) if self._comment_depth else 0
+        pieces = self.DELIMIT.split(self.mask(text[pos:]))
+        for i, piece in enumerate(pieces):
+            if i % 2:
+                self._end_statement()
+                self._delimiter = ';' if piece == ';' else '\n'
+                continue
+            if self._delimiter == ';':
+                piece = piece.replace('\n', ' ')
+            # Braces of blocks end statements too
+            statements = (self._statement + piece.replace('{', self._delimiter).replace('}', self._delimiter)
+                          ).split(self._delimiter)
+            if self._skip_statement:
+                # Drop the rest of an overlong statement, up to its delimiter
+                del statements[0]
+                if not statements:
+                    continue
+                self._skip_statement = False
+            self._statement = statements.pop()
+            for statement in statements:
+                self._command(statement)
+            if len(self._statement) > self.max_line:
+                self._command(self._statement[:self.max_line])
+                self._statement = ''
+                self._skip_statement = True
+
+    def close(self):
+        tokens = super().close()
+        self._end_statement()
+        return tokens
+
+    def _end_statement(self):
+        self._skip_statement = False
+        if self._statement:
+            self._command(self._statement)
+            self._statement = ''
+
+    def _command(self, statement):
+        """Add the tokens of one statement, following prefixes to the command they run"""
+        match = self.COMMAND.match(statement)
+        if not match:
+            return
+        command = match.group('command')
+        self.tokens.add(command)
+        underscore = command.find('_', 1)
+        if underscore > 0:
+            self.tokens.add(command[:underscore + 1])
+        if command in self.COLON_PREFIXES:
+            colon = statement.find(':', match.end('command'))
+            if colon >= 0:
+                self._command(statement[colon + 1:])
+            return
+        if match.group('sub'):
+            self.tokens.add(f"{command} {match.group('sub')}")
+
+        # Options follow the first comma outside parentheses
+        rest = statement[match.end('command'):]
+        comma = rest.find(',')
+        while comma >= 0 and rest.count('(', 0, comma) != rest.count(')', 0, comma):
+            comma = rest.find(',', comma + 1)
+        if comma >= 0:
+            for option, argument in self.OPTION.findall(rest, comma + 1):
+                self.tokens.add(option)
+                if argument:
+                    self.tokens.add(f'{option}({argument}')
+
+
+class RLexer(CodeLexer):
+    """Functions called by an R script and the packages it uses
+
+    Yields the name of every function call ('feols'), the package of every
+    pkg::name reference, and the packages given to library(), require(),
+    requireNamespace(), loadNamespace() or pacman's p_load(), quoted or not.
+    Comments and strings are masked.
+    """
+
+    SKIP = re.compile(r'(?P<comment>#[^\n]*)|(?P<string>["\'`])')
+    STRINGS = {'"': string_pattern('"'), "'": string_pattern("'"), '`': re.compile(r'[^`\n]*(?P<end>`)')}
+    NAME = re.compile(r'(?:[^\W\d_]|\.(?!\d))[\w.]*')
+    # pkg::name reversed
+    NAMESPACE = re.compile(r':::?([\w.]+)')
+    LOADER = re.compile(r'(?<![\w.])(library|require|requireNamespace|loadNamespace|p_load)[ \t]*\(([^()\n]*)')
+    RESERVED = {'if', 'for', 'while', 'function', 'repeat'}
+
+    def masked_string(self, content):
+        # Quoted package names are kept for the loader calls
+        return f'"{content}"' if self.NAME.fullmatch(content) else '""'
+
+    def lex(self, text):
+        code = self.mask(text)
+        self.tokens.update(name for name, _ in calls(code) if name not in self.RESERVED)
+        self.tokens.update(package[::-1] for package in self.NAMESPACE.findall(code[::-1]))
+        for loader, arguments in self.LOADER.findall(code):
+            # library() and friends load their first argument, p_load() all of them
+            for argument in arguments.split(','):
+                name = argument.strip().strip('"')
+                if '=' not in argument and self.NAME.fullmatch(name):
+                    self.tokens.add(name)
+                if loader != 'p_load':
+                    break
+
+
+class PythonLexer(CodeLexer):
+    """Modules imported by a Python script, the names it imports and the functions it calls
+
+    An import of statsmodels.tsa.api yields 'statsmodels', 'statsmodels.tsa'
+    and 'statsmodels.tsa.api'; from-imports add the imported names, and a
+    call such as sm.OLS(...) yields both 'sm.OLS' and 'OLS'. Comments and
+    strings, docstrings included, are masked.
+    """
+
+    SKIP = re.compile(r'(?P<comment>#[^\n]*)|(?P<string>\'\'\'|"""|[\'"])')
+    STRINGS = {"'": string_pattern("'", multiline=False), '"': string_pattern('"', multiline=False),
+               "'''": string_pattern("'''"), '"""': string_pattern('"""')}
+    # Parenthesized names of a from-import may go on over later lines
+    IMPORT = re.compile(r'^[ \t]*(?:from[ \t]+(?P<module>[\w.]+)[ \t]+)?import[ \t]+(?P<names>\([^)]*\)?|[^\n;]*)',
+                        re.MULTILINE)
+    NAME = re.compile(r'([^\W\d][\w.]*)(?:\s+as\s+\w+)?')
+
+    def __init__(self, max_line=1 << 20):
+        super().__init__(max_line)
+        self._import_open = False
+
+    def lex(self, text):
+        code = self.mask(text)
+        pos = 0
+        if self._import_open:
+            pos = code.find(')') + 1
+            self._import_open = not pos
+            self.tokens.update(self.NAME.findall(code if self._import_open else code[:pos]))
+            if self._import_open:
+                return
+
+        for match in self.IMPORT.finditer(code, pos):
+            names = match.group('names')
+            if match.group('module'):
+                self._add_module(match.group('module'))
+                self.tokens.update(self.NAME.findall(names))
+                self._import_open = names.startswith('(') and not names.endswith(')')
+            else:
+                for name in self.NAME.findall(names):
+                    self._add_module(name)
+
+        for name, define in calls(code[pos:]):
+            last = name.rpartition('.')[2]
+            if not define and not keyword.iskeyword(last):
+                self.tokens.add(name)
+                self.tokens.add(last)
+
+    def _add_module(self, module):
+        """Add a dotted module name and all its parent packages"""
+        parts = module.split('.')
+        self.tokens.update('.'.join(parts[:n]) for n in range(1, len(parts) + 1) if parts[n - 1])
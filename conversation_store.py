@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Bounded conversation stores for the chatbot web app
+Keep at most max_sessions conversations, evicting the least recently used
+ones and any idle longer than the TTL, with messages stored as compact tuples.
+The in-memory store serves a single process; the SQLite store is shared by
+all gunicorn workers on a host.
+"""
+
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque, namedtuple
+
+Message = namedtuple('Message', ['role', 'content', 'timestamp'])
+
+
+class ConversationBackend(ABC):
+    """Interface of the conversation stores used by /api/chat and /api/reset"""
+
+    @abstractmethod
+    def get(self, session_id):
+        """Return a copy of a conversation's messages, oldest first"""
+
+    @abstractmethod
+    def extend(self, session_id, messages):
+        """Append Message tuples in one write, creating the conversation if needed"""
+
+    def append(self, session_id, role, content):
+        """Append a message, creating the conversation if needed; returns the history"""
+        self.extend(session_id, [Message(role, content, time.time())])
+        return self.get(session_id)
+
+    @abstractmethod
+    def reset(self, session_id):
+        """Clear a conversation's messages"""
+
+    @abstractmethod
+    def stats(self):
+        """Current size and eviction counts"""
+
+
+class ConversationStore(ConversationBackend):
+    """In-memory conversation histories with LRU and TTL eviction"""
+
+    def __init__(self, max_sessions=10000, ttl=24 * 3600, max_messages=50, clock=time.time):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.clock = clock
+        self._sessions = OrderedDict()  # session_id -> [last_access, deque of Message]
+        self._lock = threading.Lock()
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+
+    def _expire(self, now):
+        """Drop sessions idle longer than the TTL; the oldest are at the front"""
+        while self._sessions:
+            last_access, _ = next(iter(self._sessions.values()))
+            if now - last_access < self.ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.evicted_ttl += 1
+
+    def _session(self, session_id, now, create):
+        self._expire(now)
+        session = self._sessions.get(session_id)
+        if session is None:
+            if not create:
+                return None
+            session = [now, deque(maxlen=self.max_messages)]
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted_lru += 1
+        else:
+            session[0] = now
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._session(session_id, self.clock(), create=False)
+            return list(session[1]) if session else []
+
+    def extend(self, session_id, messages):
+        with self._lock:
+            session = self._session(session_id, self.clock(), create=True)
+            session[1].extend(messages)
+
+    def append(self, session_id, role, content):
+        with self._lock:
+            now = self.clock()
+            session = self._session(session_id, now, create=True)
+            session[1].append(Message(role, content, now))
+            return list(session[1])
+
+    def reset(self, session_id):
+        with self._lock:
+            session = self._session(session_id, self.clock(), create=False)
+            if session:
+                session[1].clear()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'evicted_lru': self.evicted_lru,
+                'evicted_ttl': self.evicted_ttl
+            }
+
+
+class SQLiteConversationStore(ConversationBackend):
+    """Conversation histories in a WAL-mode SQLite file shared by worker processes
+
+    Each chat turn is written in one transaction, and session eviction runs
+    as a batch every sweep_every writes rather than on every request, so the
+    session count may briefly exceed max_sessions. Recency is the time of the
+    last write to a conversation.
+    """
+
+    def __init__(self, path, max_sessions=10000, ttl=24 * 3600, max_messages=50,
+                 sweep_every=100, clock=time.time):
+        self.path = str(path)
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.sweep_every = sweep_every
+        self.clock = clock
+        self._local = threading.local()
+        self._writes = 0
+
+        with self._connect() as conn:
+            conn.executescript(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                ' session_id TEXT PRIMARY KEY, last_access REAL NOT NULL);'
+                'CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access);'
+                'CREATE TABLE IF NOT EXISTS messages ('
+                ' id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL,'
+                ' role TEXT NOT NULL, content TEXT NOT NULL, timestamp REAL NOT NULL);'
+                'CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id);'
+                'CREATE TABLE IF NOT EXISTS counters ('
+                ' name TEXT PRIMARY KEY, value INTEGER NOT NULL);'
+            )
+
+    def _connect(self):
+        """Return this thread's connection, reopening it after a fork"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            # Imported here so the default in-memory store does not load sqlite3 at startup
+            import sqlite3
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, session_id):
+        rows = self._connect().execute(
+            'SELECT m.role, m.content, m.timestamp FROM messages m'
+            ' JOIN sessions s ON s.session_id = m.session_id'
+            ' WHERE m.session_id = ? AND s.last_access > ? ORDER BY m.id',
+            (session_id, self.clock() - self.ttl)
+        ).fetchall()
+        return [Message(*row) for row in rows]
+
+    def extend(self, session_id, messages):
+        now = self.clock()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # An expired conversation that was not swept yet starts afresh
+            conn.execute(
+                'DELETE FROM messages WHERE session_id = ? AND EXISTS ('
+                ' SELECT 1 FROM sessions WHERE session_id = ? AND last_access <= ?)',
+                (session_id, session_id, now - self.ttl)
+            )
+            conn.execute(
+                'INSERT INTO sessions (session_id, last_access) VALUES (?, ?)'
+                ' ON CONFLICT (session_id) DO UPDATE SET last_access = excluded.last_access',
+                (session_id, now)
+            )
+            conn.executemany(
+                'INSERT INTO messages (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)',
+                [(session_id, m.role, m.content, m.timestamp) for m in messages]
+            )
+            # Keep only the last max_messages of this conversation
+            conn.execute(
+                'DELETE FROM messages WHERE session_id = ? AND id <= ('
+                ' SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)',
+                (session_id, session_id, self.max_messages)
+            )
+            self._writes += 1
+            if self._writes % self.sweep_every == 0:
+                self._sweep(conn, now)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _sweep(self, conn, now):
+        """Evict expired and least recently used sessions inside the open transaction"""
+        expired = conn.execute(
+            'DELETE FROM sessions WHERE last_access <= ?', (now - self.ttl,)
+        ).rowcount
+        excess = conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0] - self.max_sessions
+        evicted = 0
+        if excess > 0:
+            evicted = conn.execute(
+                'DELETE FROM sessions WHERE session_id IN ('
+                ' SELECT session_id FROM sessions ORDER BY last_access LIMIT ?)', (excess,)
+            ).rowcount
+        if expired or evicted:
+            conn.execute('DELETE FROM messages WHERE session_id NOT IN (SELECT session_id FROM sessions)')
+            for name, value in (('evicted_ttl', expired), ('evicted_lru', evicted)):
+                conn.execute(
+                    'INSERT INTO counters (name, value) VALUES (?, ?)'
+                    ' ON CONFLICT (name) DO UPDATE SET value = value + excluded.value',
+                    (name, value)
+                )
+
+    def reset(self, session_id):
+        self._connect().execute('DELETE FROM messages WHERE session_id = ?', (session_id,))
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+    def __contains__(self, session_id):
+        return self._connect().execute(
+            'SELECT 1 FROM sessions WHERE session_id = ?', (session_id,)
+        ).fetchone() is not None
+
+    def stats(self):
+        counters = dict(self._connect().execute('SELECT name, value FROM counters').fetchall())
+        return {
+            'sessions': len(self),
+            'max_sessions': self.max_sessions,
+            'evicted_lru': counters.get('evicted_lru', 0),
+            'evicted_ttl': counters.get('evicted_ttl', 0)
+        }
+
+
+def create_conversation_store(backend='memory', path='conversations.sqlite3', **options):
+    """Create the conversation store selected by name ('memory' or 'sqlite')"""
+    if backend == 'memory':
+        return ConversationStore(**options)
+    if backend == 'sqlite':
+        return SQLiteConversationStore(path, **options)
+    raise ValueError(f"Unknown conversation store backend: {backend}")
@@ -5,106 +5,106 @@ Analyze econometric and statistical methods used in AEA replication packages
 
 import os
 import re
+import argparse
 from pathlib import Path
-from collections import Counter, defaultdict
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from code_lexer import LEXER_VERSION, PythonLexer, RLexer, StataLexer
+from feature_matrix import FeatureMatrix
+from pattern_scanner import KeywordScanner
+from repo_inventory import RepoInventory
+from scan_cache import ScanCache
+
+# Characters read from a code file at a time, bounding memory for huge generated files
+CHUNK_SIZE = 1 << 20
+CODE_SUFFIXES = ('.do', '.R', '.py', '.m')
+
+class ScanPartial:
+    """Results of scanning some of the code files of one repo
+    
+    Files hitting each category are counted and the advanced techniques
+    flagged by their keywords kept; the partials of a repo add up in its
+    row of the feature matrix.
+    """
+    
+    def __init__(self, repo_id):
+        self.repo_id = repo_id
+        self.methods = {'stata': Counter(), 'r': Counter(), 'python': Counter()}
+        self.robustness = Counter()
+        self.cleaning = Counter()
+        self.advanced = set()
+    
+    def add_to(self, matrix):
+        """Add this partial's results to its repo's row of a feature matrix"""
+        repo = matrix.rows[self.repo_id]
+        for table, counts in self.methods.items():
+            for method, count in counts.items():
+                matrix.add(repo, f"{table}:{method}", count)
+        for check_type, count in self.robustness.items():
+            matrix.add(repo, f"robustness:{check_type}", count)
+        for practice, count in self.cleaning.items():
+            matrix.add(repo, f"cleaning:{practice}", count)
+        for technique in self.advanced:
+            matrix.set(repo, f"advanced:{technique}", 1)
 
 class EconometricAnalyzer:
-    def __init__(self, base_path):
+    def __init__(self, base_path, cache=None, inventories=None):
         self.base_path = Path(base_path)
-        self.methods_found = defaultdict(list)
+        self.cache = cache
+        # Inventories of repos a caller has already walked, {repo path: RepoInventory};
+        # when given, these repos are scanned instead of the folders under base_path
+        self.inventories = dict(inventories or {})
+        # Repos using each Stata method, each listed once in repository order
+        self.methods_found = {}
+        # Repo × feature matrix of the last scan, from which the analyses are computed
+        self.matrix = None
+        # Method tables list command tokens of the code_lexer lexers, not text:
+        # Stata commands, subcommands ('ml model') and options ('fe', 'vce(cluster'),
+        # R functions and packages, Python modules, imported names and calls
         self.stata_commands = {
-            'OLS': ['regress ', 'reg ', 'areg '],
+            'OLS': ['regress', 'reg', 'areg'],
             'Panel': ['xtreg', 'xtset', 'xtlogit', 'xtprobit', 'xttobit', 'xtivreg'],
-            'IV/2SLS': ['ivregress', 'ivreg2', 'xtivreg', '2sls'],
-            'Probit/Logit': ['probit', 'logit', 'mlogit', 'ologit', 'oprobit'],
-            'Tobit': ['tobit', 'xttobit'],
-            'DID': ['diff', 'did_', 'event_study', 'twfe'],
+            'IV/2SLS': ['ivregress', 'ivreg', 'ivreg2', 'ivreghdfe', 'xtivreg'],
+            'Probit/Logit': ['probit', 'logit', 'mlogit', 'ologit', 'oprobit', 'ivprobit', 'xtlogit', 'xtprobit'],
+            'Tobit': ['tobit', 'xttobit', 'ivtobit'],
+            'DID': ['diff', 'did_', 'didregress', 'xtdidregress', 'csdid', 'eventstudyinteract',
+                    'event_study', 'twowayfeweights'],
             'RDD': ['rdrobust', 'rddensity', 'rdplot'],
-            'Matching': ['psmatch', 'nnmatch', 'teffects'],
-            'Quantile': ['qreg', 'xtqreg', 'quantile'],
-            'GMM': ['gmm', 'xtabond', 'xtdpdsys'],
+            'Matching': ['psmatch', 'psmatch2', 'nnmatch', 'teffects'],
+            'Quantile': ['qreg', 'xtqreg', 'sqreg', 'quantile'],
+            'GMM': ['gmm', 'xtabond', 'xtabond2', 'xtdpdsys'],
             'Time Series': ['arima', 'var', 'vec', 'dfuller', 'dfgls'],
             'Survival': ['stcox', 'streg', 'stset'],
-            'Structural': ['ml model', 'nlsur', 'nl '],
-            'Bootstrap': ['bootstrap', 'boottest'],
+            'Structural': ['ml model', 'nlsur', 'nl'],
+            'Bootstrap': ['bootstrap', 'boottest', 'vce(bootstrap'],
             'Clustering': ['cluster', 'vce(cluster'],
-            'Fixed Effects': [' fe ', 'absorb(', 'reghdfe'],
-            'Random Effects': [' re ', 'mixed', 'xtmixed'],
+            'Fixed Effects': ['fe', 'absorb', 'reghdfe'],
+            'Random Effects': ['re', 'mixed', 'xtmixed'],
             'Synthetic Control': ['synth', 'synth_runner'],
-            'Machine Learning': ['lasso', 'elasticnet', 'randomforest']
+            'Machine Learning': ['lasso', 'elasticnet', 'randomforest', 'rforest']
         }
         
         self.r_methods = {
-            'OLS': ['lm(', 'glm('],
-            'Panel': ['plm', 'pdata.frame', 'fixest'],
+            'OLS': ['lm', 'glm'],
+            'Panel': ['plm', 'pdata.frame', 'fixest', 'feols'],
             'IV': ['ivreg', 'tsls'],
-            'Causal': ['did', 'rdrobust', 'synthdid'],
+            'Causal': ['did', 'att_gt', 'rdrobust', 'synthdid'],
             'ML': ['randomForest', 'glmnet', 'xgboost', 'caret'],
-            'Bayesian': ['brm', 'stan', 'MCMCpack'],
+            'Bayesian': ['brm', 'brms', 'stan', 'rstan', 'MCMCpack'],
             'Time Series': ['arima', 'VAR', 'forecast']
         }
         
         self.python_methods = {
             'OLS': ['OLS', 'sm.OLS', 'LinearRegression'],
             'Panel': ['PanelOLS', 'RandomEffects', 'FixedEffect'],
-            'ML': ['sklearn', 'RandomForest', 'XGBoost', 'tensorflow', 'pytorch'],
-            'Causal': ['DoWhy', 'CausalML', 'EconML'],
+            'ML': ['sklearn', 'RandomForestClassifier', 'RandomForestRegressor', 'xgboost',
+                   'XGBClassifier', 'XGBRegressor', 'tensorflow', 'torch'],
+            'Causal': ['dowhy', 'causalml', 'econml'],
             'Time Series': ['ARIMA', 'VAR', 'statsmodels.tsa']
         }
-    
-    def analyze_all_repos(self):
-        """Analyze all repositories for econometric methods"""
-        print("Analyzing econometric methods across repositories...")
-        
-        stata_methods = Counter()
-        r_methods = Counter()
-        python_methods = Counter()
         
-        repos = list(self.base_path.glob("*/"))
-        
-        for i, repo in enumerate(repos, 1):
-            if i % 20 == 0:
-                print(f"Progress: {i}/{len(repos)} repositories")
-            
-            # Analyze Stata files
-            for do_file in repo.rglob("*.do"):
-                content = self.read_file(do_file)
-                for method, patterns in self.stata_commands.items():
-                    if any(pattern in content.lower() for pattern in patterns):
-                        stata_methods[method] += 1
-                        self.methods_found[method].append(repo.name)
-            
-            # Analyze R files
-            for r_file in repo.rglob("*.R"):
-                content = self.read_file(r_file)
-                for method, patterns in self.r_methods.items():
-                    if any(pattern in content for pattern in patterns):
-                        r_methods[method] += 1
-            
-            # Analyze Python files
-            for py_file in repo.rglob("*.py"):
-                content = self.read_file(py_file)
-                for method, patterns in self.python_methods.items():
-                    if any(pattern in content for pattern in patterns):
-                        python_methods[method] += 1
-        
-        return {
-            'stata': stata_methods,
-            'r': r_methods,
-            'python': python_methods
-        }
-    
-    def read_file(self, filepath):
-        """Read file content safely"""
-        try:
-            with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                return f.read()
-        except:
-            return ""
-    
-    def analyze_robustness_checks(self):
-        """Look for robustness check patterns"""
-        robustness_patterns = {
+        self.robustness_patterns = {
             'alternative_specifications': ['robust', 'alternative', 'specification'],
             'sensitivity_analysis': ['sensitivity', 'sens_'],
             'placebo_tests': ['placebo', 'falsification'],
@@ -115,20 +115,7 @@ class EconometricAnalyzer:
             'winsorize': ['winsor', 'trim', 'outlier']
         }
         
-        robustness_counts = Counter()
-        
-        for repo in self.base_path.glob("*/"):
-            for do_file in repo.rglob("*.do"):
-                content = self.read_file(do_file).lower()
-                for check_type, patterns in robustness_patterns.items():
-                    if any(pattern in content for pattern in patterns):
-                        robustness_counts[check_type] += 1
-        
-        return robustness_counts
-    
-    def analyze_data_cleaning(self):
-        """Analyze data cleaning practices"""
-        cleaning_patterns = {
+        self.cleaning_patterns = {
             'missing_values': ['missing', 'impute', 'drop if', 'keep if'],
             'outliers': ['outlier', 'winsor', 'trim', 'percentile'],
             'duplicates': ['duplicates', 'unique', 'distinct'],
@@ -137,57 +124,247 @@ class EconometricAnalyzer:
             'recoding': ['recode', 'replace', 'generate', 'egen']
         }
         
-        cleaning_counts = Counter()
+        self.advanced_keywords = {
+            'machine_learning': ['lasso', 'ridge', 'elastic', 'random forest', 'xgboost',
+                                 'neural', 'deep learning', 'cross-validation'],
+            'causal_inference': ['rdd', 'regression discontinuity', 'synthetic control',
+                                 'did', 'difference-in-difference', 'instrumental variable',
+                                 'propensity score', 'matching'],
+            'structural_models': ['structural model', 'gmm', 'maximum likelihood',
+                                  'simulated method', 'indirect inference'],
+            'bayesian': ['bayes', 'mcmc', 'prior', 'posterior', 'stan', 'gibbs'],
+            'text_analysis': ['nltk', 'spacy', 'text mining'],
+            'network_analysis': ['networkx', 'igraph', 'network']
+        }
         
-        for repo in self.base_path.glob("*/"):
-            for do_file in repo.rglob("*.do"):
-                content = self.read_file(do_file).lower()
-                for practice, patterns in cleaning_patterns.items():
-                    if any(pattern in content for pattern in patterns):
-                        cleaning_counts[practice] += 1
+        # Robustness, cleaning and advanced tables match lowercased code text
+        self.scanner = KeywordScanner({
+            'robustness': self.robustness_patterns,
+            'cleaning': self.cleaning_patterns,
+            'advanced': self.advanced_keywords
+        })
+        # Method tables are looked up in each file's command tokens; only the
+        # keyword index of this scanner is used, never its regex
+        self.method_index = KeywordScanner({
+            'stata': self.stata_commands,
+            'r': self.r_methods,
+            'python': self.python_methods
+        })
+        self.lexers = {'.do': StataLexer, '.R': RLexer, '.py': PythonLexer}
+        self.method_tables = {'.do': 'stata', '.R': 'r', '.py': 'python'}
+        self.cache_namespace = f'econometric:v2:lexer{LEXER_VERSION}:' + '-'.join(
+            scanner.signature for scanner in (self.scanner, self.method_index))
+        self._results = None
+    
+    def scan_repos(self, workers=1):
+        """Scan every code file once into the feature matrix and compute all four analyses from it
+        
+        With several workers, each repo is walked in a process pool worker
+        and its files scanned in one shard per language, whose partial
+        results add up to the repo's row, which gives the same matrix as a
+        serial scan.
+        """
+        print("Analyzing econometric methods across repositories...")
+        
+        repos = list(self.inventories) or list(self.base_path.glob("*/"))
+        if workers > 1:
+            repo_partials = self.scan_parallel(repos, workers)
+        else:
+            repo_partials = ([self.scan_shard(*shard)] for shard in self.shards(repos))
+        
+        # Columns are added as features are first hit, so they keep first-hit order
+        self.matrix = FeatureMatrix([repo.name for repo in repos])
+        for i, partials in enumerate(repo_partials, 1):
+            if i % 20 == 0:
+                print(f"Progress: {i}/{len(repos)} repositories")
+            for partial in partials:
+                partial.add_to(self.matrix)
         
-        return cleaning_counts
+        return self.results_from_matrix(self.matrix)
     
-    def identify_advanced_techniques(self):
-        """Identify use of advanced/modern techniques"""
-        advanced = {
-            'machine_learning': [],
-            'causal_inference': [],
-            'structural_models': [],
-            'bayesian': [],
-            'text_analysis': [],
-            'network_analysis': []
-        }
+    def results_from_matrix(self, matrix):
+        """Compute the four analyses from a feature matrix, without rescanning
         
-        ml_keywords = ['lasso', 'ridge', 'elastic', 'random forest', 'xgboost', 
-                       'neural', 'deep learning', 'cross-validation']
-        causal_keywords = ['rdd', 'regression discontinuity', 'synthetic control',
-                          'did', 'difference-in-difference', 'instrumental variable',
-                          'propensity score', 'matching']
-        structural_keywords = ['structural model', 'gmm', 'maximum likelihood',
-                             'simulated method', 'indirect inference']
-        bayesian_keywords = ['bayes', 'mcmc', 'prior', 'posterior', 'stan', 'gibbs']
+        Method, check and practice counts are numbers of files, advanced
+        techniques list their repos. Also sets methods_found, the repos
+        using each Stata method.
+        """
+        self.methods_found = {method: matrix.where(f"stata:{method}") for method in matrix.family('stata')}
+        return {
+            'methods': {table: Counter(matrix.totals(table)) for table in ['stata', 'r', 'python']},
+            'robustness': Counter(matrix.totals('robustness')),
+            'cleaning': Counter(matrix.totals('cleaning')),
+            'advanced': {technique: matrix.where(f"advanced:{technique}")
+                         for technique in self.advanced_keywords}
+        }
+    
+    def code_entries(self, repo):
+        """Return the code file entries of a repo, walking it unless its inventory was given"""
+        inventory = self.inventories.get(repo) or RepoInventory(repo)
+        return inventory.entries(*CODE_SUFFIXES)
+    
+    def shards(self, repos):
+        """Yield (repo id, code file entries) work units of a serial scan, one per repo
         
-        for repo in self.base_path.glob("*/"):
-            all_code = ""
-            for ext in ['*.do', '*.R', '*.py', '*.m']:
-                for file in repo.glob(f"**/{ext}"):
-                    all_code += self.read_file(file).lower()
+        Keeping a repo in one unit lets files of its last languages be
+        skipped once earlier ones have flagged every technique.
+        """
+        for repo_id, repo in enumerate(repos):
+            yield repo_id, self.code_entries(repo)
+    
+    def scan_repo_by_language(self, repo_id, repo, entries=None):
+        """Scan the code files of one repo in one shard per language, returning their partials"""
+        if entries is None:
+            entries = self.code_entries(repo)
+        partials = []
+        for suffix in CODE_SUFFIXES:
+            language_entries = [entry for entry in entries if entry.suffix == suffix]
+            if language_entries:
+                partials.append(self.scan_shard(repo_id, language_entries))
+        return partials
+    
+    def scan_shard(self, repo_id, entries):
+        """Scan code files of one repo into a ScanPartial"""
+        partial = ScanPartial(repo_id)
+        # Advanced techniques are flagged per repo, from the union of its files' keywords
+        repo_keywords = set()
+        for entry in entries:
+            flagged = set(self.scanner.categorize(repo_keywords)['advanced'])
+            keywords, commands = self.scan_code_file(entry, flagged)
+            repo_keywords |= keywords
             
-            if any(kw in all_code for kw in ml_keywords):
-                advanced['machine_learning'].append(repo.name)
-            if any(kw in all_code for kw in causal_keywords):
-                advanced['causal_inference'].append(repo.name)
-            if any(kw in all_code for kw in structural_keywords):
-                advanced['structural_models'].append(repo.name)
-            if any(kw in all_code for kw in bayesian_keywords):
-                advanced['bayesian'].append(repo.name)
-            if 'nltk' in all_code or 'spacy' in all_code or 'text mining' in all_code:
-                advanced['text_analysis'].append(repo.name)
-            if 'networkx' in all_code or 'igraph' in all_code or 'network' in all_code:
-                advanced['network_analysis'].append(repo.name)
+            table = self.method_tables.get(entry.suffix)
+            if table:
+                hits = self.method_index.categorize(commands)[table]
+                for method in self.method_index.tables[table]:
+                    if hits[method]:
+                        partial.methods[table][method] += 1
+            if entry.suffix == '.do':
+                hits = self.scanner.categorize(keywords)
+                for check_type in self.robustness_patterns:
+                    if hits['robustness'][check_type]:
+                        partial.robustness[check_type] += 1
+                for practice in self.cleaning_patterns:
+                    if hits['cleaning'][practice]:
+                        partial.cleaning[practice] += 1
+        
+        hits = self.scanner.categorize(repo_keywords)['advanced']
+        for technique in self.advanced_keywords:
+            if hits[technique]:
+                partial.advanced.add(technique)
+        return partial
+    
+    def scan_parallel(self, repos, workers):
+        """Scan repos in a process pool, yielding the partials of each in repository order
+        
+        Workers are sent repo paths and walk the repos themselves, so the
+        walks run in parallel; only repos whose inventory was given come
+        with their already walked code files.
+        """
+        cache_dir = self.cache.cache_dir if self.cache else None
+        chunksize = max(1, len(repos) // (workers * 4))
+        jobs = ((repo_id, repo, self.code_entries(repo) if repo in self.inventories else None)
+                for repo_id, repo in enumerate(repos))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self.base_path, cache_dir)) as executor:
+            yield from executor.map(_scan_repo_worker, jobs, chunksize=chunksize)
+    
+    def results(self, workers=1):
+        """Results of the scan pass, run on first use and shared by the four analyses"""
+        if self._results is None:
+            self._results = self.scan_repos(workers)
+        return self._results
+
+    def analyze_all_repos(self, workers=1):
+        """Analyze all repositories for econometric methods"""
+        return self.results(workers)['methods']
+    
+    def read_chunks(self, filepath, chunk_size=CHUNK_SIZE):
+        """Yield file content in chunks of at most chunk_size characters, safely"""
+        try:
+            with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        return
+                    yield chunk
+        except OSError:
+            return
+    
+    def is_settled(self, suffix, keywords, commands, flagged):
+        """True once more of a file cannot change any result
         
-        return advanced
+        That is when every category counted per file of its kind is hit and
+        every advanced technique is flagged for its repo, counting the
+        techniques already flagged by earlier files. Files count once per
+        category they hit, so a .do, .R or .py file only settles once it has
+        hit every method of its language, which real files practically never
+        do: for those, chunked reading bounds memory but does not stop early.
+        Only .m files, which feed nothing but the advanced techniques, are
+        cut short in practice.
+        """
+        hits = self.scanner.categorize(keywords)
+        if len(flagged | set(hits['advanced'])) < len(self.advanced_keywords):
+            return False
+        table = self.method_tables.get(suffix)
+        if table and len(self.method_index.categorize(commands)[table]) < len(self.method_index.tables[table]):
+            return False
+        if suffix == '.do':
+            return (len(hits['robustness']) == len(self.robustness_patterns)
+                    and len(hits['cleaning']) == len(self.cleaning_patterns))
+        return True
+    
+    def scan_code_file(self, entry, flagged=frozenset()):
+        """Return a code file's keywords from the lowercased tables and the command tokens of its language
+        
+        The file is streamed in chunks, lowercasing each once for the keyword
+        scan and lexing it as it is for the commands, so memory stays bounded
+        however large it is; it is not read at all when the cache has it.
+        Reading stops as soon as the rest of the file cannot change any
+        result, given the advanced techniques already flagged for its repo
+        (see is_settled for when that happens); such partial results are not
+        cached.
+        """
+        if self.cache:
+            cached = self.cache.get(self.cache_namespace, entry)
+            if cached is not None:
+                return set(cached['keywords']), set(cached['commands'])
+        
+        stream = self.scanner.stream()
+        lexer = self.lexers[entry.suffix]() if entry.suffix in self.lexers else None
+        commands = set()
+        
+        settled = self.is_settled(entry.suffix, set(), commands, flagged)
+        if not settled:
+            for chunk in self.read_chunks(entry.path):
+                stream.feed(chunk.lower())
+                if lexer:
+                    commands = lexer.feed(chunk)
+                if self.is_settled(entry.suffix, stream.keywords, commands, flagged):
+                    settled = True
+                    break
+            else:
+                if lexer:
+                    commands = lexer.close()
+        
+        if self.cache and not settled:
+            self.cache.put(self.cache_namespace, entry, {
+                'keywords': sorted(stream.keywords),
+                'commands': sorted(commands)
+            })
+        return stream.keywords, commands
+    
+    def analyze_robustness_checks(self):
+        """Look for robustness check patterns"""
+        return self.results()['robustness']
+    
+    def analyze_data_cleaning(self):
+        """Analyze data cleaning practices"""
+        return self.results()['cleaning']
+    
+    def identify_advanced_techniques(self):
+        """Identify use of advanced/modern techniques"""
+        return self.results()['advanced']
     
     def generate_report(self, methods_data, robustness_data, cleaning_data, advanced_data):
         """Generate comprehensive econometric analysis report"""
@@ -237,12 +414,35 @@ class EconometricAnalyzer:
         
         return "\n".join(report)
 
+_worker_analyzer = None
+
+def _init_worker(base_path, cache_dir):
+    """Create the analyzer used by one pool worker"""
+    global _worker_analyzer
+    cache = ScanCache(cache_dir) if cache_dir else None
+    _worker_analyzer = EconometricAnalyzer(base_path, cache=cache)
+
+def _scan_repo_worker(job):
+    """Walk and scan one repo in a pool worker"""
+    partials = _worker_analyzer.scan_repo_by_language(*job)
+    if _worker_analyzer.cache:
+        _worker_analyzer.cache.commit()
+    return partials
+
 # Run analysis
 if __name__ == "__main__":
-    analyzer = EconometricAnalyzer("AEAREP-103-ssh/aea_packages_complete")
+    parser = argparse.ArgumentParser(description="Analyze econometric methods in AEA replication packages")
+    parser.add_argument("base_path", nargs="?", default="AEAREP-103-ssh/aea_packages_complete")
+    parser.add_argument("--cache-dir", help="reuse per-file scan results cached in this directory")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--matrix", help="save the repo × feature matrix to this file")
+    args = parser.parse_args()
+    
+    cache = ScanCache(args.cache_dir) if args.cache_dir else None
+    analyzer = EconometricAnalyzer(args.base_path, cache=cache)
     
     print("Starting econometric analysis...")
-    methods = analyzer.analyze_all_repos()
+    methods = analyzer.analyze_all_repos(workers=args.workers)
     
     print("\nAnalyzing robustness checks...")
     robustness = analyzer.analyze_robustness_checks()
@@ -254,6 +454,8 @@ if __name__ == "__main__":
     advanced = analyzer.identify_advanced_techniques()
     
     report = analyzer.generate_report(methods, robustness, cleaning, advanced)
+    if cache:
+        cache.close()
     
     print("\n" + report)
     
@@ -261,5 +463,8 @@ if __name__ == "__main__":
     with open("econometric_methods_report.txt", "w") as f:
         f.write(report)
     
+    if args.matrix:
+        analyzer.matrix.save(args.matrix)
+    
     print("\n✅ Econometric analysis complete!")
     print("Report saved to: econometric_methods_report.txt")
\ No newline at end of file
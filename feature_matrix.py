@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Columnar repo × feature matrix shared by the corpus analyzers
+Each analyzer records one count per repo and feature (file counts per language,
+files using a method, keyword hits of a topic, 0/1 flags), from which its report
+sections are recomputed; matrices of different analyzers are joined by repo name
+so that cross-tabs such as RDD packages with a master script need no rescan
+"""
+
+import argparse
+import json
+import sys
+from array import array
+
+# Unsigned 32-bit counts
+TYPECODE = 'I'
+MAGIC = b'FEATURE-MATRIX 1\n'
+
+
+class FeatureMatrix:
+    """Non-negative counts per repo and feature, stored column by column
+
+    Columns are named 'family:feature' ('language:Stata', 'stata:RDD',
+    'topic:labor'), in the order they were first set; a boolean feature is a
+    count of 0 or 1. Each column is an array holding one value per repo, and
+    the repos where a column is nonzero are kept as an int bitmask, so that
+    counting the repos having several features is an AND and a popcount over
+    all repos at once.
+    """
+
+    def __init__(self, rows=()):
+        self.rows = []
+        self.index = {}
+        self.columns = {}
+        self._masks = {}
+        for name in rows:
+            self.row(name)
+
+    def row(self, name):
+        """Index of a repo's row, appending an all-zero row for a new repo"""
+        i = self.index.get(name)
+        if i is None:
+            i = self.index[name] = len(self.rows)
+            self.rows.append(name)
+            for values in self.columns.values():
+                values.append(0)
+        return i
+
+    def column(self, name):
+        """Values of a column in row order, all zero for a column never set"""
+        values = self.columns.get(name)
+        if values is None:
+            return array(TYPECODE, bytes(array(TYPECODE).itemsize * len(self.rows)))
+        return values
+
+    def _writable(self, name):
+        self._masks.pop(name, None)
+        if name not in self.columns:
+            self.columns[name] = self.column(name)
+        return self.columns[name]
+
+    def add(self, repo, column, value=1):
+        """Add to a repo's count of a feature"""
+        i = self.row(repo)
+        self._writable(column)[i] += value
+
+    def set(self, repo, column, value):
+        """Set a repo's count of a feature"""
+        i = self.row(repo)
+        self._writable(column)[i] = value
+
+    def get(self, repo, column):
+        """A repo's count of a feature"""
+        return self.column(column)[self.index[repo]]
+
+    def family(self, family):
+        """Feature names of a column family, in column order"""
+        prefix = family + ':'
+        return [name[len(prefix):] for name in self.columns if name.startswith(prefix)]
+
+    def mask(self, *columns):
+        """Bitmask of the rows where every given column is nonzero (bit i for row i)"""
+        mask = (1 << len(self.rows)) - 1
+        for name in columns:
+            if name not in self._masks:
+                bits = ''.join('1' if value else '0' for value in reversed(self.column(name)))
+                self._masks[name] = int(bits or '0', 2)
+            mask &= self._masks[name]
+        return mask
+
+    def count(self, *columns):
+        """Number of repos where every given column is nonzero"""
+        return bin(self.mask(*columns)).count('1')
+
+    def where(self, *columns):
+        """Names of the repos where every given column is nonzero, in row order"""
+        mask = self.mask(*columns)
+        return [name for i, name in enumerate(self.rows) if mask >> i & 1]
+
+    def total(self, column):
+        """Sum of a column over all repos"""
+        return sum(self.column(column))
+
+    def totals(self, family):
+        """Sum of every column of a family, keeping nonzero ones, in column order"""
+        totals = {feature: self.total(f'{family}:{feature}') for feature in self.family(family)}
+        return {feature: total for feature, total in totals.items() if total}
+
+    def counts(self, family, *given):
+        """Repos having each feature of a family (and all given columns), keeping nonzero ones"""
+        counts = {feature: self.count(f'{family}:{feature}', *given) for feature in self.family(family)}
+        return {feature: count for feature, count in counts.items() if count}
+
+    def crosstab(self, family, other):
+        """Repos having each pair of features of two families"""
+        return {feature: self.counts(other, f'{family}:{feature}') for feature in self.family(family)}
+
+    def features(self, repo, family):
+        """Features of a family that a repo has, in column order"""
+        i = self.index[repo]
+        return [feature for feature in self.family(family) if self.columns[f'{family}:{feature}'][i]]
+
+    def row_counts(self, *families):
+        """Number of features of the given families that each repo has, in row order"""
+        counts = [0] * len(self.rows)
+        for family in families:
+            for feature in self.family(family):
+                for i, value in enumerate(self.columns[f'{family}:{feature}']):
+                    if value:
+                        counts[i] += 1
+        return counts
+
+    def join(self, other):
+        """Matrix with the columns of both, rows matched by repo name (zeros where missing)"""
+        shared = set(self.columns) & set(other.columns)
+        if shared:
+            raise ValueError(f"Columns in both matrices: {', '.join(sorted(shared))}")
+        joined = FeatureMatrix(self.rows)
+        for name in other.rows:
+            joined.row(name)
+        for matrix in (self, other):
+            rows = [joined.index[name] for name in matrix.rows]
+            for column, values in matrix.columns.items():
+                target = joined._writable(column)
+                for i, value in zip(rows, values):
+                    target[i] = value
+        return joined
+
+    def save(self, path):
+        """Write the matrix as a JSON header line followed by the raw column arrays"""
+        header = {'rows': self.rows, 'columns': list(self.columns), 'typecode': TYPECODE,
+                  'byteorder': sys.byteorder}
+        with open(path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(json.dumps(header).encode('utf-8') + b'\n')
+            for values in self.columns.values():
+                values.tofile(f)
+
+    @classmethod
+    def load(cls, path):
+        """Read a matrix written by save"""
+        with open(path, 'rb') as f:
+            if f.readline() != MAGIC:
+                raise ValueError(f"Not a feature matrix: {path}")
+            header = json.loads(f.readline())
+            matrix = cls(header['rows'])
+            for name in header['columns']:
+                values = array(header['typecode'])
+                values.fromfile(f, len(matrix.rows))
+                if header['byteorder'] != sys.byteorder:
+                    values.byteswap()
+                matrix.columns[name] = values
+        return matrix
+
+    def to_numpy(self):
+        """The matrix as a (repos × columns) NumPy array; needs numpy installed"""
+        import numpy as np
+        data = np.zeros((len(self.rows), len(self.columns)), dtype=np.uint32)
+        for j, values in enumerate(self.columns.values()):
+            data[:, j] = np.frombuffer(values, dtype=np.uint32)
+        return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query repo × feature matrices written by the analyzers")
+    parser.add_argument("matrices", nargs="+", help="matrix files, joined by repo name")
+    parser.add_argument("--count", nargs="+", metavar="COLUMN",
+                        help="count and list the repos having all these columns")
+    parser.add_argument("--crosstab", nargs=2, metavar="FAMILY",
+                        help="repos having each pair of features of two families")
+    args = parser.parse_args()
+
+    matrix = FeatureMatrix.load(args.matrices[0])
+    for path in args.matrices[1:]:
+        matrix = matrix.join(FeatureMatrix.load(path))
+    print(f"{len(matrix.rows)} repos, {len(matrix.columns)} columns")
+
+    if args.count:
+        repos = matrix.where(*args.count)
+        print(f"{' & '.join(args.count)}: {len(repos)} repos")
+        for name in repos:
+            print(f"  {name}")
+    if args.crosstab:
+        for feature, counts in matrix.crosstab(*args.crosstab).items():
+            print(f"{feature}: " + ', '.join(f"{other} {count}" for other, count in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Gunicorn settings of the chatbot web app, read by `gunicorn app:app`
+PRELOAD_APP=1 loads the app once in the master before forking the workers, so
+they share its knowledge base and memory-mapped corpus index instead of each
+building a copy. The garbage collector is kept off the shared objects:
+disabled in the master while the app loads, then its heap is frozen and it is
+enabled again, and the heap is frozen once more before each fork.
+"""
+
+import gc
+import os
+
+preload_app = os.environ.get('PRELOAD_APP', '0').lower() in ('1', 'true', 'yes')
+
+if preload_app:
+    # Load the index and compile the matcher before forking, not in every worker
+    os.environ.setdefault('STARTUP_MODE', 'eager')
+    # Collections while the app loads would free objects and leave holes that workers copy
+    gc.disable()
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        # The app is loaded: freeze its heap so collections skip it, and collect
+        # again the cycles the master creates while supervising workers
+        gc.freeze()
+        gc.enable()
+
+
+def pre_fork(server, worker):
+    if server.cfg.preload_app:
+        # Frozen objects are never traversed, so collections in workers leave their pages shared
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        gc.enable()
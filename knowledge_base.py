@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Shared knowledge base of the Lars Vilhuber chatbots
+Loads knowledge_base.json once per process into immutable mappings and tuples,
+with the keyword indexes each bot matches messages against, so every bot
+instance shares one copy and the knowledge can be edited without code changes.
+`python knowledge_base.py snapshot` precompiles it for faster startup.
+"""
+
+import functools
+import hashlib
+import json
+import marshal
+from collections import defaultdict
+from pathlib import Path
+from types import MappingProxyType
+
+import pattern_scanner
+from pattern_scanner import KeywordScanner
+
+DEFAULT_KNOWLEDGE_PATH = Path(__file__).resolve().parent / 'knowledge_base.json'
+SNAPSHOT_VERSION = 2
+
+
+def freeze(value):
+    """Recursively turn dicts into read-only mappings and lists into tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def build_keyword_index(topics, weigh=lambda keyword: 1):
+    """Map each keyword to ((topic, weight), ...) over {topic: {'keywords': [...]}}"""
+    index = defaultdict(list)
+    for topic, data in topics.items():
+        for keyword in data["keywords"]:
+            index[keyword].append((topic, weigh(keyword)))
+    return MappingProxyType({keyword: tuple(entries) for keyword, entries in index.items()})
+
+
+class KnowledgeBase:
+    """Read-only knowledge of the web, command-line and advanced bots
+
+    regexes optionally holds the keyword regex sources of a snapshot, keyed
+    'web' and 'cli', so they are not rebuilt from the keywords.
+    """
+
+    def __init__(self, data, regexes=None):
+        self.web = freeze(data["web"])
+        self.cli = freeze(data["cli"])
+        self.advanced = freeze(data["advanced"])
+        self._regexes = regexes or {}
+
+        # Multi-word keywords weigh more in the web bot's topic scores
+        self.web_keyword_topics = build_keyword_index(
+            self.web["expertise"], weigh=lambda keyword: len(keyword.split()))
+        self.web_trigger_words = MappingProxyType({
+            kind: frozenset(words) for kind, words in self.web["trigger_words"].items()
+        })
+        self.web_matcher = KeywordScanner({
+            "topics": {topic: data["keywords"] for topic, data in self.web["expertise"].items()},
+            "triggers": self.web_trigger_words
+        }, regex=self._regexes.get("web"))
+
+    # The web app never matches command-line topics, so their index is built on first use
+    @functools.cached_property
+    def cli_keyword_topics(self):
+        return build_keyword_index(self.cli["expertise_areas"])
+
+    @functools.cached_property
+    def cli_matcher(self):
+        return KeywordScanner({
+            "topics": {topic: data["keywords"] for topic, data in self.cli["expertise_areas"].items()}
+        }, regex=self._regexes.get("cli"))
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_KNOWLEDGE_PATH):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+
+@functools.lru_cache(maxsize=None)
+def code_signature():
+    """SHA-1 of the code that builds a snapshot's regexes and keyword indexes
+
+    A change to build_trie_regex, KeywordScanner or the index construction
+    here makes existing snapshots stale without bumping SNAPSHOT_VERSION.
+    """
+    digest = hashlib.sha1()
+    for module_path in (pattern_scanner.__file__, __file__):
+        with open(module_path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def snapshot_path(path=DEFAULT_KNOWLEDGE_PATH):
+    return Path(path).with_suffix('.snapshot')
+
+
+def write_snapshot(path=DEFAULT_KNOWLEDGE_PATH):
+    """Precompile a knowledge file into a marshal snapshot next to it"""
+    with open(path, 'rb') as f:
+        source = f.read()
+    data = json.loads(source)
+    knowledge = KnowledgeBase(data)
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'source_sha1': hashlib.sha1(source).hexdigest(),
+        'code_sha1': code_signature(),
+        'data': data,
+        'regexes': {'web': knowledge.web_matcher.regex, 'cli': knowledge.cli_matcher.regex}
+    }
+    target = snapshot_path(path)
+    with open(target, 'wb') as f:
+        marshal.dump(snapshot, f)
+    return target
+
+
+def read_snapshot(path=DEFAULT_KNOWLEDGE_PATH):
+    """Return the snapshot of a knowledge file, or None if missing or out of date
+
+    A snapshot is out of date when the JSON or the code building it has changed.
+    """
+    try:
+        with open(path, 'rb') as f:
+            source_sha1 = hashlib.sha1(f.read()).hexdigest()
+        with open(snapshot_path(path), 'rb') as f:
+            snapshot = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if (not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION
+            or snapshot.get('source_sha1') != source_sha1
+            or snapshot.get('code_sha1') != code_signature()):
+        return None
+    return snapshot
+
+
+def load_knowledge_base(path=DEFAULT_KNOWLEDGE_PATH):
+    """Return the knowledge base of a file, loading it only once per process"""
+    return _load_knowledge_base(str(Path(path).resolve()))
+
+
+@functools.lru_cache(maxsize=None)
+def _load_knowledge_base(path):
+    # An up-to-date snapshot skips JSON parsing and regex building
+    snapshot = read_snapshot(path)
+    if snapshot is not None:
+        return KnowledgeBase(snapshot['data'], regexes=snapshot['regexes'])
+    return KnowledgeBase.from_file(path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precompile the chatbot knowledge base")
+    parser.add_argument("command", choices=["snapshot"])
+    parser.add_argument("--path", default=str(DEFAULT_KNOWLEDGE_PATH), help="knowledge base JSON file")
+    args = parser.parse_args()
+    print(f"Snapshot written to {write_snapshot(args.path)}")
@@ -11,6 +11,8 @@ from datetime import datetime
 from typing import List, Dict, Tuple, Optional
 from dataclasses import dataclass, field
 
+from knowledge_base import KnowledgeBase, load_knowledge_base
+
 @dataclass
 class ResearchContext:
     """Context for maintaining conversation state"""
@@ -21,175 +23,29 @@ class ResearchContext:
     advice_given: List[str] = field(default_factory=list)
 
 class LarsVilhuberAdvancedChatbot:
-    def __init__(self):
+    def __init__(self, knowledge: KnowledgeBase = None):
         self.name = "Lars Vilhuber"
-        self.roles = [
-            "Data Editor, American Economic Association",
-            "Executive Director, Labor Dynamics Institute",
-            "Senior Research Associate, Cornell University"
-        ]
+        self.knowledge = knowledge or load_knowledge_base()
+        self.roles = self.knowledge.advanced["roles"]
         self.context = ResearchContext()
         self.initialize_comprehensive_knowledge()
         self.initialize_personality_traits()
         
     def initialize_comprehensive_knowledge(self):
         """Initialize comprehensive knowledge base from repository analysis"""
-        
-        self.core_principles = {
-            "computational_empathy": {
-                "definition": "Thinking about what an unknown person attempting to reproduce results might face",
-                "applications": [
-                    "Consider different operating systems",
-                    "Account for varying software access",
-                    "Think about different skill levels",
-                    "Anticipate missing dependencies"
-                ]
-            },
-            "transparency_spectrum": {
-                "levels": [
-                    "Full open access",
-                    "Restricted access with clear procedures",
-                    "Synthetic data with real structure",
-                    "Detailed documentation without data"
-                ],
-                "principle": "Be as open as possible, as closed as necessary"
-            },
-            "reproducibility_hierarchy": {
-                "levels": [
-                    "Runs on my machine",
-                    "Runs on a clean machine of same OS",
-                    "Runs on different OS",
-                    "Runs with different software versions",
-                    "Runs by someone unfamiliar with the methods"
-                ]
-            }
-        }
-        
-        self.software_expertise = {
-            "stata": {
-                "versions": "Consider version compatibility, especially for commands introduced in recent versions",
-                "packages": "Use 'ssc install' or 'net install' with specific sources",
-                "licensing": "Remember not everyone has access to Stata/MP or all packages",
-                "tips": [
-                    "Set version explicitly with 'version' command",
-                    "Document all ado files needed",
-                    "Consider using creturn list to document system"
-                ]
-            },
-            "r": {
-                "environment": "Use renv for package management",
-                "versions": "Document R version and all package versions",
-                "tips": [
-                    "Use sessionInfo() to capture environment",
-                    "Consider using groundhog for date-based package versions",
-                    "Be careful with compiled packages that may be OS-specific"
-                ]
-            },
-            "python": {
-                "environment": "Use virtual environments or conda",
-                "requirements": "Create requirements.txt with specific versions",
-                "tips": [
-                    "Use pip freeze > requirements.txt",
-                    "Consider poetry or pipenv for dependency management",
-                    "Be explicit about Python version (3.8, 3.9, etc.)"
-                ]
-            },
-            "containers": {
-                "docker": "Provides complete environment reproducibility",
-                "singularity": "Often preferred in HPC environments",
-                "tips": [
-                    "Start with a minimal base image",
-                    "Document the build process",
-                    "Consider size and accessibility"
-                ]
-            }
-        }
-        
-        self.common_issues = {
-            "path_problems": {
-                "issue": "Hard-coded paths that won't work on other systems",
-                "solution": "Use relative paths or configurable path variables"
-            },
-            "missing_data": {
-                "issue": "Data files not included or accessible",
-                "solution": "Provide data or clear instructions for access"
-            },
-            "undocumented_dependencies": {
-                "issue": "Required packages or software not listed",
-                "solution": "Document all requirements explicitly"
-            },
-            "order_dependency": {
-                "issue": "Code must run in specific order not documented",
-                "solution": "Number files or provide a master script"
-            },
-            "random_seeds": {
-                "issue": "Results vary due to randomization",
-                "solution": "Set random seeds explicitly"
-            }
-        }
-        
-        self.repository_guidance = {
-            "zenodo": "Excellent for long-term preservation, provides DOI",
-            "openicpsr": "AEA's preferred repository, good for economics data",
-            "dataverse": "Harvard Dataverse, widely used in social sciences",
-            "osf": "Open Science Framework, good for complete projects",
-            "github": "Good for code, not for data preservation"
-        }
-        
-        self.documentation_standards = {
-            "readme_essential": [
-                "Software requirements with versions",
-                "Data availability statement",
-                "Instructions to run the code",
-                "Expected runtime",
-                "Hardware requirements if substantial",
-                "Description of output"
-            ],
-            "folder_structure": [
-                "Separate raw data from processed data",
-                "Keep code organized by purpose",
-                "Store output separately",
-                "Include documentation folder"
-            ]
-        }
+        knowledge = self.knowledge.advanced
+        self.core_principles = knowledge["core_principles"]
+        self.software_expertise = knowledge["software_expertise"]
+        self.common_issues = knowledge["common_issues"]
+        self.repository_guidance = knowledge["repository_guidance"]
+        self.documentation_standards = knowledge["documentation_standards"]
+        self.discussion_responses = knowledge["discussion_responses"]
         
     def initialize_personality_traits(self):
         """Initialize personality traits based on analysis"""
-        
-        self.communication_style = {
-            "teaching": [
-                "Let me break this down step by step",
-                "Here's how I think about this",
-                "In my experience with thousands of replication packages",
-                "The key insight here is"
-            ],
-            "empathy": [
-                "I understand this can be challenging",
-                "Many researchers face this issue",
-                "You're not alone in finding this difficult",
-                "This is indeed a complex topic"
-            ],
-            "encouragement": [
-                "You're on the right track",
-                "This is a great step forward",
-                "Every improvement matters",
-                "Perfect is the enemy of good"
-            ],
-            "pragmatism": [
-                "Let's focus on what's practical",
-                "Sometimes we need to compromise",
-                "Do what you can with the resources you have",
-                "Start simple and build from there"
-            ]
-        }
-        
-        self.response_patterns = {
-            "acknowledge_then_explain": True,
-            "provide_examples": True,
-            "offer_alternatives": True,
-            "reference_resources": True,
-            "use_we_language": True  # "We can approach this by..."
-        }
+        knowledge = self.knowledge.advanced
+        self.communication_style = knowledge["communication_style"]
+        self.response_patterns = knowledge["response_patterns"]
         
     def assess_user_level(self, message: str) -> str:
         """Assess user's experience level from their message"""
@@ -288,43 +144,13 @@ class LarsVilhuberAdvancedChatbot:
                 "The key is to document everything explicitly and test your code as if you were that person.")
         
     def discuss_reproducibility(self) -> str:
-        responses = [
-            "Reproducibility starts with good habits: clear file organization, documented dependencies, and tested code. "
-            "I recommend the 'run it again' test - delete your output and see if you can recreate everything from scratch.",
-            
-            "A good replication package has three key elements: all the data (or clear access instructions), "
-            "all the code in runnable form, and clear documentation linking the code to the paper results.",
-            
-            "Think of reproducibility as a ladder - each rung makes your work more accessible. "
-            "Start with making it work for you, then a colleague, then someone in your field, then anyone."
-        ]
-        return random.choice(responses)
+        return random.choice(self.discussion_responses["reproducibility"])
         
     def discuss_data_access(self) -> str:
-        responses = [
-            "When data can't be shared, transparency is still possible. Document the data structure, "
-            "provide access instructions, and consider creating synthetic data that demonstrates your code works.",
-            
-            "Data availability statements should be precise: what data exists, where it can be found, "
-            "and what restrictions apply. 'Data available upon request' is not sufficient anymore.",
-            
-            "Even confidential data can be made reproducible. Document the exact data pulls, "
-            "provide code that works with the data structure, and be clear about access procedures."
-        ]
-        return random.choice(responses)
+        return random.choice(self.discussion_responses["data_access"])
         
     def discuss_software_environments(self) -> str:
-        responses = [
-            "Software environments are often the biggest reproducibility challenge. "
-            "Always document versions explicitly - for everything from the language itself to every package used.",
-            
-            "Consider using environment management tools: renv for R, virtual environments for Python, "
-            "or containers like Docker for complex setups. They save headaches later.",
-            
-            "Different journals and archives have different software availability. "
-            "Don't assume everyone has access to proprietary software or the latest versions."
-        ]
-        return random.choice(responses)
+        return random.choice(self.discussion_responses["software_environments"])
         
     def discuss_documentation(self) -> str:
         standards = self.documentation_standards["readme_essential"]
@@ -344,13 +170,7 @@ class LarsVilhuberAdvancedChatbot:
                 "then gradually introduce complications. The 'have an undergrad run it' test is remarkably effective!")
         
     def provide_general_guidance(self) -> str:
-        guidance_options = [
-            "Start with small steps toward reproducibility. Even documenting your software versions is progress.",
-            "Remember, perfect is the enemy of good. Any documentation is better than none.",
-            "Focus on making your future self happy - good reproducibility practices save you time too.",
-            "The reproducibility community is supportive. We're all learning and improving together."
-        ]
-        return random.choice(guidance_options)
+        return random.choice(self.discussion_responses["general_guidance"])
         
     def chat(self):
         """Run the interactive chat session"""
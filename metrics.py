@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Lightweight request metrics for the chatbot web app
+Per-stage latency histograms and per-topic request counts for /api/chat,
+rendered in the Prometheus text exposition format. When disabled, callers skip
+the timing calls entirely, so the hot path only pays for one attribute check.
+"""
+
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+# Upper bounds in seconds, from sub-millisecond matching to slow store writes
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def service_metrics(store_stats, cache_stats, rejected):
+    """(name, help, type, value) samples of the session store, response cache and rate limits
+
+    Shared by the Flask and ASGI apps; cache_stats is None for a responder without a plan cache.
+    """
+    samples = [
+        ('chat_sessions', 'Conversations in the session store', 'gauge', store_stats['sessions']),
+        ('chat_sessions_evicted_lru_total', 'Conversations evicted as least recently used', 'counter',
+         store_stats['evicted_lru']),
+        ('chat_sessions_evicted_ttl_total', 'Conversations evicted after the TTL', 'counter',
+         store_stats['evicted_ttl'])
+    ]
+    if cache_stats is not None:
+        samples += [
+            ('chat_response_cache_hits_total', 'Response plan cache hits', 'counter', cache_stats['hits']),
+            ('chat_response_cache_misses_total', 'Response plan cache misses', 'counter', cache_stats['misses']),
+            ('chat_response_cache_size', 'Response plans in the cache', 'gauge', cache_stats['size'])
+        ]
+    return samples + [
+        (f'chat_rate_limited_{kind}_total', f'Requests rejected by the per-{kind} rate limit', 'counter', count)
+        for kind, count in sorted(rejected.items())
+    ]
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed durations"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # First bucket whose upper bound is >= value, or the +Inf bucket
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            bucket_labels = dict(labels, le=bound if bound == '+Inf' else repr(bound))
+            lines.append(f'{name}_bucket{format_labels(bucket_labels)} {cumulative}')
+        lines.append(f'{name}_sum{format_labels(labels)} {self.sum!r}')
+        lines.append(f'{name}_count{format_labels(labels)} {self.count}')
+        return lines
+
+
+class ChatMetrics:
+    """Stage timings and topic counts of the chat endpoint, for one process"""
+
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self.stage_seconds = defaultdict(lambda: Histogram(self.buckets))
+        self.request_seconds = Histogram(buckets)
+        self.topic_requests = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record_request(self, topic, stage_times, total):
+        """Record one request's matched topic and its {stage: seconds} breakdown"""
+        with self._lock:
+            self.topic_requests[topic or 'none'] += 1
+            for stage, seconds in stage_times.items():
+                self.stage_seconds[stage].observe(seconds)
+            self.request_seconds.observe(total)
+
+    def render(self, extra_metrics=()):
+        """Prometheus text for the recorded metrics plus (name, help, type, value) samples"""
+        lines = []
+        with self._lock:
+            if self.enabled:
+                lines += ['# HELP chat_requests_total Chat requests by matched topic',
+                          '# TYPE chat_requests_total counter']
+                for topic, count in sorted(self.topic_requests.items()):
+                    lines.append(f'chat_requests_total{format_labels({"topic": topic})} {count}')
+
+                lines += ['# HELP chat_request_seconds Time to handle /api/chat',
+                          '# TYPE chat_request_seconds histogram']
+                lines += self.request_seconds.render('chat_request_seconds', {})
+
+                lines += ['# HELP chat_stage_seconds Time spent in each stage of /api/chat',
+                          '# TYPE chat_stage_seconds histogram']
+                for stage, histogram in sorted(self.stage_seconds.items()):
+                    lines += histogram.render('chat_stage_seconds', {'stage': stage})
+
+        for name, help_text, metric_type, value in extra_metrics:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}',
+                      f'{name} {format_value(value)}']
+        return '\n'.join(lines) + '\n'
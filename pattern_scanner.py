@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Single-pass keyword scanning shared by the corpus analyzers
+Compiles every keyword table of an analyzer into one trie-shaped regex, so each
+file is scanned once instead of once per keyword
+"""
+
+import hashlib
+import re
+from collections import Counter, defaultdict
+
+
+def build_trie_regex(keywords):
+    """Build a regex matching the longest keyword that starts at a position"""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        branches = [re.escape(char) + build(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            # Greedy optional: prefer the longer keyword, fall back to this one
+            pattern = '(?:' + pattern + ')?'
+        return pattern
+
+    return build(trie)
+
+
+class KeywordScanner:
+    """Match several keyword tables against a text in one linear pass
+
+    Tables map a table name to {category: [keywords]}. Keywords are matched
+    literally, so callers lowercase the text when the tables are lowercase.
+    """
+
+    def __init__(self, tables, regex=None):
+        self.tables = tables
+        self.keyword_index = defaultdict(list)
+        for table, categories in tables.items():
+            for category, keywords in categories.items():
+                for keyword in keywords:
+                    if (table, category) not in self.keyword_index[keyword]:
+                        self.keyword_index[keyword].append((table, category))
+
+        keywords = sorted(self.keyword_index)
+        # Identifies the keyword set, so cached hits are dropped when tables change
+        self.signature = hashlib.sha1('\n'.join(keywords).encode('utf-8')).hexdigest()[:16]
+        # Keywords starting at the same position are prefixes of the longest one
+        self.prefixes = {kw: [k for k in keywords if kw.startswith(k)] for kw in keywords}
+        # The regex source may come precomputed from a snapshot of the same keywords
+        if regex is None and keywords:
+            regex = '(?=(' + build_trie_regex(keywords) + '))'
+        self.regex = regex
+        self._pattern = None
+
+    @property
+    def pattern(self):
+        """The keyword regex, compiled on first use so startup does not pay for it"""
+        if self._pattern is None and self.regex is not None:
+            self._pattern = re.compile(self.regex)
+        return self._pattern
+
+    def find_keywords(self, text):
+        """Return the set of keywords occurring anywhere in text"""
+        found = set()
+        pattern = self.pattern
+        if pattern is None:
+            return found
+        for longest in set(pattern.findall(text)):
+            found.update(self.prefixes[longest])
+        return found
+
+    def stream(self):
+        """Return a KeywordStream that finds keywords in text fed chunk by chunk"""
+        return KeywordStream(self)
+
+    def find_file_keywords(self, entry, read_text, cache=None, *, transform):
+        """Return the keywords of an inventory entry, reusing cached hits if given a cache
+
+        transform names how read_text prepares the text (e.g. 'lower'), so that
+        callers preparing it differently do not share cached hits.
+        """
+        if cache is None:
+            return self.find_keywords(read_text(entry.path))
+        return cache.find_keywords(self, entry, read_text, transform)
+
+    def categorize(self, keywords):
+        """Group matched keywords into {table: Counter(category -> keyword hits)}"""
+        hits = {table: Counter() for table in self.tables}
+        for keyword in keywords:
+            for table, category in self.keyword_index.get(keyword, ()):
+                hits[table][category] += 1
+        return hits
+
+    def scan(self, text):
+        """Scan text once and return per-table category hit counts"""
+        return self.categorize(self.find_keywords(text))
+
+
+class KeywordStream:
+    """Keywords of a text that arrives in chunks, holding only one chunk at a time
+
+    Each chunk is scanned together with the last (longest keyword - 1)
+    characters of the text before it, so keywords spanning a chunk boundary
+    are found exactly as in one find_keywords call over the whole text.
+    """
+
+    def __init__(self, scanner):
+        self.scanner = scanner
+        self.keywords = set()
+        self.overlap = max(map(len, scanner.keyword_index), default=1) - 1
+        self._tail = ''
+
+    def feed(self, chunk):
+        """Scan the next chunk; returns the keywords found so far"""
+        window = self._tail + chunk
+        self.keywords |= self.scanner.find_keywords(window)
+        self._tail = window[max(0, len(window) - self.overlap):] if self.overlap else ''
+        return self.keywords
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Single-walk file inventory of a replication package
+Records path, suffix, size and mtime of every file from one os.scandir walk,
+so the analyzers can answer their file queries without touching the filesystem again
+"""
+
+import os
+from collections import defaultdict, namedtuple
+from fnmatch import fnmatchcase
+from pathlib import Path
+
+FileEntry = namedtuple('FileEntry', ['path', 'suffix', 'size', 'mtime'])
+
+
+class RepoInventory:
+    """Files of one repository, collected in a single directory walk"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.files = []
+        self.top_level = []
+        self.subdirs = []
+        self._by_suffix = defaultdict(list)
+        self._walk(self.root, top=True)
+
+    def _walk(self, directory, top=False):
+        """Walk directories pre-order, in the same order as Path.rglob"""
+        try:
+            scanner = os.scandir(directory)
+        except OSError:
+            return
+
+        children = []
+        with scanner:
+            for entry in scanner:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                if top:
+                    self.top_level.append(entry.name)
+                    if is_dir:
+                        self.subdirs.append(entry.name)
+
+                if is_dir:
+                    # Like rglob, do not descend into symlinked directories
+                    if not entry.is_symlink():
+                        children.append(entry.path)
+                    continue
+
+                try:
+                    stat = entry.stat()
+                    size, mtime = stat.st_size, stat.st_mtime
+                except OSError:
+                    size, mtime = 0, 0.0
+
+                suffix = os.path.splitext(entry.name)[1]
+                file_entry = FileEntry(Path(entry.path), suffix, size, mtime)
+                self.files.append(file_entry)
+                self._by_suffix[suffix].append(file_entry)
+
+        for child in children:
+            self._walk(child)
+
+    def entries(self, *suffixes):
+        """Return file entries with the given suffixes, grouped in argument order"""
+        if not suffixes:
+            return list(self.files)
+        result = []
+        for suffix in suffixes:
+            result.extend(self._by_suffix.get(suffix, ()))
+        return result
+
+    def paths(self, *suffixes):
+        """Return file paths with the given suffixes, grouped in argument order"""
+        return [entry.path for entry in self.entries(*suffixes)]
+
+    def count(self, suffix):
+        """Number of files with a suffix"""
+        return len(self._by_suffix.get(suffix, ()))
+
+    def top_level_files(self, pattern):
+        """Return entries of top-level files matching a glob pattern"""
+        return [entry for entry in self.files
+                if entry.path.parent == self.root and fnmatchcase(entry.path.name, pattern)]
+
+    def top_level_matches(self, pattern):
+        """Return top-level entry names matching a glob pattern"""
+        return [name for name in self.top_level if fnmatchcase(name, pattern)]
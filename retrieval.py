@@ -0,0 +1,608 @@
+#!/usr/bin/env python3
+"""
+Offline BM25 retrieval over the local research corpus
+Splits the extracted proofs (pdf_text/), paper analyses (paper_analysis/) and
+per-repository reports (reports/per_repo/) into short passages and indexes them
+in compressed-sparse-row posting arrays, persisted to disk and queried in
+milliseconds without any external service.
+
+The index is a set of immutable segments listed in manifest.json. Updates only
+index new or changed documents into a new segment and mark the passages of
+replaced or deleted documents as deleted; compaction merges segments later.
+Readers re-read the manifest to pick up new segments without restarting.
+
+    python retrieval.py update
+    python retrieval.py watch --interval 60
+    python retrieval.py query "how should I document confidential data"
+"""
+
+import array
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from collections import Counter, namedtuple
+from pathlib import Path
+
+DEFAULT_INDEX_DIR = Path('.retrieval_index')
+MANIFEST_NAME = 'manifest.json'
+
+# (directory, glob) of the documents indexed by default, relative to the repo root
+CORPUS_SOURCES = (
+    ('pdf_text', '*.txt'),
+    ('paper_analysis', '*.md'),
+    ('reports/per_repo', '*.md')
+)
+
+STOPWORDS = frozenset("""
+a about after all also an and any are as at be been but by can could did do does
+for from had has have how i if in into is it its me my no not of on or our so
+such than that the their them then there these they this to us was we were what
+when where which while who why will with would you your
+""".split())
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+Passage = namedtuple('Passage', ['source', 'text', 'score'])
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def split_passages(text, size=100):
+    """Split a document into passages of at most size words along paragraph breaks"""
+    current = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        words = paragraph.split()
+        if not words:
+            continue
+        if current and len(current) + len(words) > size:
+            yield ' '.join(current)
+            current = []
+        while len(words) > size:
+            yield ' '.join(words[:size])
+            words = words[size:]
+        current.extend(words)
+    if current:
+        yield ' '.join(current)
+
+
+def iter_corpus_paths(root='.', sources=CORPUS_SOURCES):
+    """Yield (relative path, path) of every corpus document under root"""
+    root = Path(root)
+    for directory, pattern in sources:
+        for path in sorted((root / directory).glob(pattern)):
+            yield path.relative_to(root).as_posix(), path
+
+
+def read_document(path):
+    return path.read_text(encoding='utf-8', errors='ignore')
+
+
+def iter_corpus(root='.', sources=CORPUS_SOURCES):
+    """Yield (relative path, text) of every corpus document under root"""
+    for source, path in iter_corpus_paths(root, sources):
+        try:
+            text = read_document(path)
+        except OSError:
+            continue
+        yield source, text
+
+
+class PackedPassages:
+    """Read-only (source, text) passages over UTF-8 texts packed in one buffer
+
+    Texts are decoded only when a passage is read, so a memory-mapped buffer
+    stays in the page cache shared by every process instead of becoming
+    per-process string objects.
+    """
+
+    def __init__(self, sources, buffer, offsets):
+        self.sources = sources    # source of each passage
+        self.buffer = buffer      # concatenated texts
+        self.offsets = offsets    # text i is buffer[offsets[i]:offsets[i + 1]]
+
+    def __len__(self):
+        return len(self.sources)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self.sources[index], str(self.buffer[self.offsets[index]:self.offsets[index + 1]], 'utf-8')
+
+
+def map_file(path):
+    """Memory-map a file read-only; empty files map to an empty buffer"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return memoryview(b'')
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+class Segment:
+    """Passages of some documents with their CSR posting arrays
+
+    Term t's postings are doc_ids[offsets[t]:offsets[t + 1]] with matching
+    term frequencies in tfs, so a query only touches the postings of its terms.
+    The passages of one document are contiguous; ranges maps each document to
+    its (first passage, passage count).
+
+    On disk, postings.bin holds the raw arrays and passages.bin the packed
+    passage texts. Loaded segments map both read-only, so all workers share
+    one copy of them.
+    """
+
+    ARRAYS = ('offsets', 'doc_ids', 'tfs', 'doc_lengths')
+
+    def __init__(self, vocabulary, passages, offsets, doc_ids, tfs, doc_lengths):
+        self.vocabulary = vocabulary  # term -> term id
+        self.passages = passages      # [(source, text)]
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.ranges = {}
+        sources = getattr(passages, 'sources', None) or [source for source, _ in passages]
+        for doc_id, source in enumerate(sources):
+            first, count = self.ranges.get(source, (doc_id, 0))
+            self.ranges[source] = (first, count + 1)
+
+    @classmethod
+    def from_passages(cls, passages):
+        """Index (source, passage text) pairs, grouped by source"""
+        vocabulary = {}
+        kept = []
+        doc_lengths = array.array('I')
+        postings = []  # term id -> [(doc id, tf)]
+        for source, passage in passages:
+            tokens = tokenize(passage)
+            if not tokens:
+                continue
+            doc_id = len(kept)
+            kept.append((source, passage))
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_id = vocabulary.setdefault(term, len(vocabulary))
+                if term_id == len(postings):
+                    postings.append([])
+                postings[term_id].append((doc_id, tf))
+
+        offsets = array.array('I', [0])
+        doc_ids = array.array('I')
+        tfs = array.array('I')
+        for term_postings in postings:
+            for doc_id, tf in term_postings:
+                doc_ids.append(doc_id)
+                tfs.append(tf)
+            offsets.append(len(doc_ids))
+        return cls(vocabulary, kept, offsets, doc_ids, tfs, doc_lengths)
+
+    @classmethod
+    def build(cls, documents, passage_words=100):
+        """Index (source, text) documents, split into passages"""
+        return cls.from_passages((source, passage) for source, text in documents
+                                 for passage in split_passages(text, passage_words))
+
+    def save(self, segment_dir):
+        """Write the segment as meta.json, the raw posting arrays and the packed passage texts"""
+        segment_dir = Path(segment_dir)
+        segment_dir.mkdir(parents=True, exist_ok=True)
+        text_offsets = array.array('Q', [0])
+        documents = []
+        with open(segment_dir / 'passages.bin', 'wb') as f:
+            for source, text in self.passages:
+                text_offsets.append(text_offsets[-1] + f.write(text.encode('utf-8')))
+                if documents and documents[-1][0] == source:
+                    documents[-1][1] += 1
+                else:
+                    documents.append([source, 1])
+        arrays = [(name, getattr(self, name)) for name in self.ARRAYS] + [('text_offsets', text_offsets)]
+        with open(segment_dir / 'postings.bin', 'wb') as f:
+            for _, values in arrays:
+                f.write(values)
+        meta = {
+            'byteorder': sys.byteorder,
+            'arrays': [[name, values.format if isinstance(values, memoryview) else values.typecode, len(values)]
+                       for name, values in arrays],
+            'vocabulary': sorted(self.vocabulary, key=self.vocabulary.get),
+            'documents': documents
+        }
+        with open(segment_dir / 'meta.json', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, segment_dir):
+        segment_dir = Path(segment_dir)
+        with open(segment_dir / 'meta.json', encoding='utf-8') as f:
+            meta = json.load(f)
+        postings = map_file(segment_dir / 'postings.bin')
+        arrays = {}
+        position = 0
+        for name, typecode, length in meta['arrays']:
+            size = array.array(typecode).itemsize * length
+            values = postings[position:position + size].cast(typecode)
+            if meta['byteorder'] != sys.byteorder:
+                # Only arrays in native byte order can be used in place
+                values = array.array(typecode, values)
+                values.byteswap()
+            arrays[name] = values
+            position += size
+        vocabulary = {term: term_id for term_id, term in enumerate(meta['vocabulary'])}
+        if 'passages' in meta:
+            # Segments written before the passage texts were packed
+            passages = [tuple(passage) for passage in meta['passages']]
+        else:
+            sources = [source for source, count in meta['documents'] for _ in range(count)]
+            passages = PackedPassages(sources, map_file(segment_dir / 'passages.bin'), arrays.pop('text_offsets'))
+        return cls(vocabulary, passages, **arrays)
+
+
+def empty_manifest():
+    return {'generation': 0, 'next_segment': 0, 'segments': [], 'deleted': {}, 'documents': {}}
+
+
+def read_manifest(index_dir):
+    """Return the manifest of an index directory, or an empty one if it has none"""
+    try:
+        with open(Path(index_dir) / MANIFEST_NAME, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return empty_manifest()
+
+
+def write_manifest(index_dir, manifest):
+    """Atomically replace the manifest, so readers never see a partial one"""
+    manifest['generation'] += 1
+    path = Path(index_dir) / MANIFEST_NAME
+    tmp_path = path.with_suffix('.json.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+class BM25Index:
+    """BM25 search over index segments, skipping deleted passages
+
+    Term statistics are combined across the live passages of all segments, so
+    results do not depend on how the passages are split into segments. An index opened from a directory
+    re-reads its manifest at most every refresh_interval seconds on refresh().
+    """
+
+    def __init__(self, segments=None, deleted=None, k1=1.5, b=0.75,
+                 index_dir=None, generation=0, refresh_interval=5.0):
+        self.k1 = k1
+        self.b = b
+        self.index_dir = Path(index_dir) if index_dir is not None else None
+        self.refresh_interval = refresh_interval
+        self._next_check = time.monotonic() + refresh_interval
+        self._manifest_mtime = None
+        self._set_segments(segments or {}, deleted or {}, generation)
+
+    def _set_segments(self, segments, deleted, generation):
+        """Swap in a new set of segments in one assignment, for concurrent searches"""
+        deleted = {name: frozenset(ids) for name, ids in deleted.items() if name in segments}
+        live = 0
+        total_length = 0
+        for name, segment in segments.items():
+            removed = deleted.get(name, frozenset())
+            live += len(segment.passages) - len(removed)
+            total_length += sum(segment.doc_lengths) - sum(segment.doc_lengths[i] for i in removed)
+        average = total_length / live if live else 0.0
+
+        # Per-passage length normalization of the BM25 denominator
+        norms = {
+            name: array.array('d', (
+                self.k1 * (1 - self.b + self.b * length / average) if average else self.k1
+                for length in segment.doc_lengths))
+            for name, segment in segments.items()
+        }
+        self._state = (segments, deleted, norms, live)
+        self.generation = generation
+
+    @property
+    def segments(self):
+        return self._state[0]
+
+    def __len__(self):
+        """Number of live passages"""
+        return self._state[3]
+
+    @classmethod
+    def build(cls, documents, passage_words=100, k1=1.5, b=0.75):
+        """Index (source, text) documents in a single segment"""
+        return cls({'seg-000000': Segment.build(documents, passage_words)}, k1=k1, b=b)
+
+    def search(self, query, k=3, min_terms=1):
+        """Return the k best passages for a query, best first
+
+        Passages must contain at least min_terms distinct query terms (or all
+        of them, for shorter queries).
+        """
+        segments, deleted, norms, live = self._state
+        scores = {}
+        matched_terms = Counter()
+        terms = set(tokenize(query))
+        k1_plus_1 = self.k1 + 1
+        for term in terms:
+            # Live postings of the term across segments; their count is its document frequency
+            postings = []
+            for name, segment in segments.items():
+                term_id = segment.vocabulary.get(term)
+                if term_id is None:
+                    continue
+                removed = deleted.get(name, ())
+                length_norms = norms[name]
+                for i in range(segment.offsets[term_id], segment.offsets[term_id + 1]):
+                    doc_id = segment.doc_ids[i]
+                    if doc_id not in removed:
+                        postings.append(((name, doc_id), segment.tfs[i], length_norms[doc_id]))
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (live - df + 0.5) / (df + 0.5))
+            for key, tf, length_norm in postings:
+                scores[key] = scores.get(key, 0.0) + idf * tf * k1_plus_1 / (tf + length_norm)
+                matched_terms[key] += 1
+
+        min_terms = min(min_terms, len(terms))
+        if min_terms > 1:
+            scores = {key: score for key, score in scores.items() if matched_terms[key] >= min_terms}
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [Passage(*segments[name].passages[doc_id], score) for (name, doc_id), score in best]
+
+    def save(self, index_dir=DEFAULT_INDEX_DIR):
+        """Write the segments and a manifest listing them"""
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        manifest = read_manifest(index_dir)
+        segments, deleted, _, _ = self._state
+        for name, segment in segments.items():
+            segment.save(index_dir / name)
+        manifest.update({
+            'k1': self.k1,
+            'b': self.b,
+            'next_segment': len(segments),
+            'segments': list(segments),
+            'deleted': {name: sorted(ids) for name, ids in deleted.items()},
+            'documents': {source: {'segment': name, 'first': first, 'count': count}
+                          for name, segment in segments.items()
+                          for source, (first, count) in segment.ranges.items()}
+        })
+        write_manifest(index_dir, manifest)
+
+    @classmethod
+    def open(cls, index_dir=DEFAULT_INDEX_DIR, refresh_interval=5.0, lazy=False):
+        """Open the index of a directory, empty until its first segments are written
+
+        A lazy index reads its segments on the first refresh() instead of now.
+        """
+        index = cls(index_dir=index_dir, refresh_interval=refresh_interval)
+        if lazy:
+            index._next_check = 0.0
+        else:
+            index.refresh(force=True)
+        return index
+
+    load = open
+
+    def refresh(self, force=False):
+        """Load segments added by an update or compaction; returns True if the index changed"""
+        if self.index_dir is None:
+            return False
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return False
+        self._next_check = now + self.refresh_interval
+        try:
+            mtime = os.stat(self.index_dir / MANIFEST_NAME).st_mtime_ns
+            if mtime == self._manifest_mtime:
+                return False
+            manifest = read_manifest(self.index_dir)
+            if manifest['generation'] == self.generation:
+                self._manifest_mtime = mtime
+                return False
+            # Segments are immutable, so the loaded ones are reused
+            current = self.segments
+            segments = {name: current[name] if name in current else Segment.load(self.index_dir / name)
+                        for name in manifest['segments']}
+        except OSError:
+            # No index yet, or a compaction removed a segment mid-read; retry later
+            return False
+        self.k1 = manifest.get('k1', self.k1)
+        self.b = manifest.get('b', self.b)
+        self._set_segments(segments, manifest['deleted'], manifest['generation'])
+        self._manifest_mtime = mtime
+        return True
+
+
+class IncrementalIndexer:
+    """Keep an index directory in sync with the corpus, one changed document at a time
+
+    Documents are fingerprinted by size and mtime, and by a content hash when
+    those change, so touched but unchanged files are not re-indexed. A single
+    indexer process should write to an index directory.
+    """
+
+    def __init__(self, root='.', index_dir=DEFAULT_INDEX_DIR, sources=CORPUS_SOURCES,
+                 passage_words=100, max_segments=8):
+        self.root = Path(root)
+        self.index_dir = Path(index_dir)
+        self.sources = sources
+        self.passage_words = passage_words
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        self._compaction = None
+
+    def _new_segment_name(self, manifest):
+        name = f"seg-{manifest['next_segment']:06d}"
+        manifest['next_segment'] += 1
+        return name
+
+    def _delete_document(self, manifest, record):
+        first, count = record['first'], record['count']
+        manifest['deleted'].setdefault(record['segment'], []).extend(range(first, first + count))
+
+    def update(self):
+        """Index new and changed documents and drop deleted ones; returns change counts"""
+        with self._lock:
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            manifest = read_manifest(self.index_dir)
+            documents = manifest['documents']
+            summary = Counter()
+            changed = []
+            seen = set()
+            fingerprints_changed = False
+
+            for source, path in iter_corpus_paths(self.root, self.sources):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                seen.add(source)
+                record = documents.get(source)
+                if record and record.get('size') == stat.st_size and record.get('mtime') == stat.st_mtime:
+                    summary['unchanged'] += 1
+                    continue
+                try:
+                    text = read_document(path)
+                except OSError:
+                    continue
+                sha1 = hashlib.sha1(text.encode('utf-8')).hexdigest()
+                if record and record.get('sha1') == sha1:
+                    record.update(size=stat.st_size, mtime=stat.st_mtime)
+                    fingerprints_changed = True
+                    summary['unchanged'] += 1
+                    continue
+                summary['replaced' if record else 'added'] += 1
+                changed.append((source, text, {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha1': sha1}))
+
+            for source in set(documents) - seen:
+                summary['deleted'] += 1
+                self._delete_document(manifest, documents.pop(source))
+            for source, _, _ in changed:
+                if source in documents:
+                    self._delete_document(manifest, documents.pop(source))
+
+            if changed:
+                segment = Segment.build(((source, text) for source, text, _ in changed), self.passage_words)
+                name = self._new_segment_name(manifest)
+                segment.save(self.index_dir / name)
+                manifest['segments'].append(name)
+                for source, _, fingerprint in changed:
+                    first, count = segment.ranges.get(source, (0, 0))
+                    documents[source] = dict(fingerprint, segment=name, first=first, count=count)
+
+            if changed or summary['deleted'] or fingerprints_changed:
+                write_manifest(self.index_dir, manifest)
+            return dict(summary)
+
+    def needs_compaction(self, manifest=None):
+        """True once there are more than max_segments segments or a fifth of the passages are deleted"""
+        manifest = manifest or read_manifest(self.index_dir)
+        deleted = sum(len(ids) for ids in manifest['deleted'].values())
+        indexed = deleted + sum(record['count'] for record in manifest['documents'].values())
+        return len(manifest['segments']) > self.max_segments or (indexed and deleted / indexed > 0.2)
+
+    def compact(self):
+        """Merge all segments into one without their deleted passages; returns True if it ran"""
+        manifest = read_manifest(self.index_dir)
+        names = list(manifest['segments'])
+        if len(names) <= 1 and not any(manifest['deleted'].values()):
+            return False
+
+        # Merging reads only immutable segments, so updates can run meanwhile
+        live = sorted((record['segment'], record['first'], source, record['count'])
+                      for source, record in manifest['documents'].items() if record['segment'] in names)
+        loaded = {name: Segment.load(self.index_dir / name) for name in names}
+        merged = Segment.from_passages(
+            passage for name, first, source, count in live
+            for passage in loaded[name].passages[first:first + count])
+
+        with self._lock:
+            manifest = read_manifest(self.index_dir)
+            name = self._new_segment_name(manifest)
+            merged.save(self.index_dir / name)
+            for source, (first, count) in merged.ranges.items():
+                record = manifest['documents'].get(source)
+                if record and record['segment'] in names:
+                    record.update(segment=name, first=first, count=count)
+                else:
+                    # Replaced or deleted by an update during the merge
+                    manifest['deleted'].setdefault(name, []).extend(range(first, first + count))
+            manifest['segments'] = [name] + [s for s in manifest['segments'] if s not in names]
+            manifest['deleted'] = {s: ids for s, ids in manifest['deleted'].items() if s not in names}
+            write_manifest(self.index_dir, manifest)
+            # Readers keep the segments they mapped; removed files stay readable until unmapped
+            for old in names:
+                shutil.rmtree(self.index_dir / old, ignore_errors=True)
+        return True
+
+    def compact_in_background(self):
+        """Start a compaction thread unless one is running; returns the thread"""
+        if self._compaction is None or not self._compaction.is_alive():
+            self._compaction = threading.Thread(target=self.compact, daemon=True)
+            self._compaction.start()
+        return self._compaction
+
+    def rebuild(self):
+        """Index the whole corpus from scratch"""
+        with self._lock:
+            shutil.rmtree(self.index_dir, ignore_errors=True)
+        return self.update()
+
+    def watch(self, interval=60.0):
+        """Update every interval seconds, compacting in the background when needed"""
+        while True:
+            summary = self.update()
+            if any(summary.get(key) for key in ('added', 'replaced', 'deleted')):
+                print(f"Index updated: {summary}")
+            if self.needs_compaction():
+                self.compact_in_background()
+            time.sleep(interval)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build, update or query the BM25 index of the research corpus")
+    parser.add_argument("--root", default=".", help="repository root holding the corpus")
+    parser.add_argument("--index", default=str(DEFAULT_INDEX_DIR))
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('build', help="index the whole corpus from scratch")
+    subparsers.add_parser('update', help="index new and changed documents only")
+    subparsers.add_parser('compact', help="merge the index segments")
+    watch_parser = subparsers.add_parser('watch', help="keep updating the index")
+    watch_parser.add_argument("--interval", type=float, default=60.0, help="seconds between updates")
+    query_parser = subparsers.add_parser('query', help="print the best passages for a query")
+    query_parser.add_argument("query")
+    query_parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+
+    indexer = IncrementalIndexer(args.root, args.index)
+    if args.command == 'query':
+        index = BM25Index.open(args.index)
+        for passage in index.search(args.query, args.k):
+            print(f"[{passage.score:.2f}] {passage.source}\n  {passage.text[:300]}\n")
+    elif args.command == 'watch':
+        indexer.watch(args.interval)
+    elif args.command == 'compact':
+        print("Compacted" if indexer.compact() else "Nothing to compact")
+    else:
+        summary = indexer.rebuild() if args.command == 'build' else indexer.update()
+        if args.command == 'update' and indexer.needs_compaction():
+            indexer.compact()
+        index = BM25Index.open(args.index)
+        print(f"{summary}; {len(index)} passages in {len(index.segments)} segments at {args.index}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,20 +3,20 @@
 Simple runner script for the Lars Vilhuber Chatbot
 """
 
+import importlib.util
 import os
 import sys
 
 def check_dependencies():
-    """Check if required dependencies are installed"""
-    try:
-        import flask
-        import flask_cors
-        print("✓ All dependencies found")
-        return True
-    except ImportError as e:
-        print(f"✗ Missing dependency: {e}")
+    """Check if required dependencies are installed, without importing them"""
+    # The app imports them once when it starts; importing them here too only slows startup
+    missing = [name for name in ('flask', 'flask_cors') if importlib.util.find_spec(name) is None]
+    if missing:
+        print(f"✗ Missing dependency: {', '.join(missing)}")
         print("Please run: pip install -r requirements.txt")
         return False
+    print("✓ All dependencies found")
+    return True
 
 def main():
     print("Lars Vilhuber Chatbot - Web Interface")
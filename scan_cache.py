@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Persistent cache of per-file analysis results
+Stores each file's keyword hits (and any other per-file results) in SQLite,
+keyed by (path, size, mtime), so re-runs only re-scan new or changed files
+"""
+
+import json
+import os
+import sqlite3
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = Path('.scan_cache')
+
+
+class ScanCache:
+    """SQLite-backed cache of per-file results, invalidated by size or mtime"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, commit_every=500):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Several analyzer processes may share the cache; wait for their writes
+        self.conn = sqlite3.connect(str(self.cache_dir / 'file_results.sqlite3'), timeout=60)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS file_results ('
+            ' namespace TEXT NOT NULL,'
+            ' path TEXT NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' mtime REAL NOT NULL,'
+            ' value TEXT NOT NULL,'
+            ' PRIMARY KEY (namespace, path))'
+        )
+        self.commit_every = commit_every
+        self.pending = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, namespace, entry):
+        """Return the cached value for an inventory entry, or None if stale or missing"""
+        row = self.conn.execute(
+            'SELECT size, mtime, value FROM file_results WHERE namespace = ? AND path = ?',
+            (namespace, os.path.abspath(entry.path))
+        ).fetchone()
+        if row is not None and row[0] == entry.size and row[1] == entry.mtime:
+            self.hits += 1
+            return json.loads(row[2])
+        self.misses += 1
+        return None
+
+    def put(self, namespace, entry, value):
+        """Store a JSON-serializable value for an inventory entry"""
+        self.conn.execute(
+            'INSERT OR REPLACE INTO file_results (namespace, path, size, mtime, value) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (namespace, os.path.abspath(entry.path), entry.size, entry.mtime, json.dumps(value))
+        )
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.commit()
+
+    def find_keywords(self, scanner, entry, read_text, transform):
+        """Return a file's keyword hits, scanning it only if it changed
+
+        Hits are keyed by the keyword set and by transform, the name of how
+        read_text prepares the text, as both change what is found.
+        """
+        namespace = f'keywords:v2:{transform}:' + scanner.signature
+        cached = self.get(namespace, entry)
+        if cached is not None:
+            return set(cached)
+        keywords = scanner.find_keywords(read_text(entry.path))
+        self.put(namespace, entry, sorted(keywords))
+        return keywords
+
+    def commit(self):
+        self.conn.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
@@ -5,14 +5,23 @@ Comprehensive analysis of economic research content in AEA replication packages
 
 import os
 import re
+import sys
+import argparse
 import json
 from pathlib import Path
 from collections import defaultdict, Counter
 import pandas as pd
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from feature_matrix import FeatureMatrix
+from pattern_scanner import KeywordScanner
+from repo_inventory import RepoInventory
+from scan_cache import ScanCache
+
 class EconomicContentAnalyzer:
-    def __init__(self, base_dir):
+    def __init__(self, base_dir, cache=None):
         self.base_dir = Path(base_dir)
+        self.cache = cache
         self.results = {
             'economic_topics': defaultdict(int),
             'policy_areas': defaultdict(int),
@@ -80,10 +89,43 @@ class EconomicContentAnalyzer:
             'satellite': ['satellite', 'night lights', 'remote sensing', 'imagery'],
             'text': ['text', 'news', 'speech', 'document', 'narrative', 'sentiment']
         }
+        
+        # Geographic focus
+        self.countries = ['usa', 'united states', 'china', 'india', 'brazil', 'mexico', 'germany', 
+                          'france', 'uk', 'japan', 'korea', 'canada', 'australia', 'africa', 'europe', 
+                          'asia', 'latin america', 'developing', 'developed']
+        
+        # Methodological approaches
+        self.methods = ['ols', 'iv', '2sls', 'did', 'rdd', 'matching', 'bootstrap', 'bayesian', 
+                        'machine learning', 'ml', 'random forest', 'neural network', 'panel', 
+                        'fixed effects', 'random effects', 'gmm', 'structural', 'calibration']
+        
+        self.scanner = KeywordScanner({
+            'economic_topics': self.economic_topics,
+            'policy_areas': self.policy_areas,
+            'data_sources': self.data_sources,
+            'geographic_focus': {country: [country] for country in self.countries},
+            'methods': {method: [method] for method in self.methods}
+        })
+        # Bump the version when the time period or sample size patterns change
+        self.cache_namespace = 'economic_content:v1:' + self.scanner.signature
+        
+        # Repo × feature matrix of keyword hits and file counts, from which the
+        # corpus totals and the report are computed; columns are added as
+        # features are first hit, so the totals keep first-hit order
+        self.families = {
+            'economic_topics': 'topic',
+            'policy_areas': 'policy',
+            'data_sources': 'data_source',
+            'geographic_focus': 'geography',
+            'methodological_approaches': 'approach'
+        }
+        self.matrix = FeatureMatrix()
 
     def analyze_repo(self, repo_path):
         """Analyze a single repository for economic content"""
         repo_name = repo_path.name
+        self.matrix.row(repo_name)
         repo_info = {
             'name': repo_name,
             'economic_topics': set(),
@@ -97,48 +139,28 @@ class EconomicContentAnalyzer:
         }
         
         # Search through all files in the repository
-        for file_path in repo_path.rglob('*'):
-            if file_path.is_file() and file_path.suffix in ['.do', '.py', '.R', '.md', '.txt', '.pdf']:
+        for entry in RepoInventory(repo_path).files:
+            if entry.suffix in ['.do', '.py', '.R', '.md', '.txt', '.pdf']:
                 try:
-                    content = file_path.read_text(encoding='utf-8', errors='ignore').lower()
-                    self._analyze_content(content, repo_info, file_path)
+                    features = self.cache.get(self.cache_namespace, entry) if self.cache else None
+                    if features is None:
+                        content = entry.path.read_text(encoding='utf-8', errors='ignore').lower()
+                        features = self._extract_features(content)
+                        if self.cache:
+                            self.cache.put(self.cache_namespace, entry, features)
+                    self._apply_features(features, repo_info)
                 except:
                     continue
         
         return repo_info
 
-    def _analyze_content(self, content, repo_info, file_path):
-        """Analyze content for economic indicators"""
-        
-        # Economic topics
-        for topic, keywords in self.economic_topics.items():
-            for keyword in keywords:
-                if keyword in content:
-                    repo_info['economic_topics'].add(topic)
-                    self.results['economic_topics'][topic] += 1
-        
-        # Policy areas
-        for policy, keywords in self.policy_areas.items():
-            for keyword in keywords:
-                if keyword in content:
-                    repo_info['policy_areas'].add(policy)
-                    self.results['policy_areas'][policy] += 1
-        
-        # Data sources
-        for source, keywords in self.data_sources.items():
-            for keyword in keywords:
-                if keyword in content:
-                    repo_info['data_sources'].add(source)
-                    self.results['data_sources'][source] += 1
-        
-        # Geographic focus
-        countries = ['usa', 'united states', 'china', 'india', 'brazil', 'mexico', 'germany', 
-                    'france', 'uk', 'japan', 'korea', 'canada', 'australia', 'africa', 'europe', 
-                    'asia', 'latin america', 'developing', 'developed']
-        for country in countries:
-            if country in content:
-                repo_info['geographic_focus'].add(country)
-                self.results['geographic_focus'][country] += 1
+    def _extract_features(self, content):
+        """Extract the per-file indicators that are cached between runs"""
+        features = {
+            'keywords': sorted(self.scanner.find_keywords(content)),
+            'time_period': None,
+            'sample_size': None
+        }
         
         # Time periods
         time_patterns = [
@@ -150,7 +172,7 @@ class EconomicContentAnalyzer:
         for pattern in time_patterns:
             matches = re.findall(pattern, content)
             if matches:
-                repo_info['time_period'] = matches[0] if isinstance(matches[0], str) else matches[0][0]
+                features['time_period'] = matches[0] if isinstance(matches[0], str) else matches[0][0]
                 break
         
         # Sample sizes
@@ -166,19 +188,47 @@ class EconomicContentAnalyzer:
                 try:
                     size = int(matches[0].replace(',', ''))
                     if 100 <= size <= 10000000:  # Reasonable sample size range
-                        repo_info['sample_size'] = size
+                        features['sample_size'] = size
                         break
                 except:
                     continue
         
+        return features
+
+    def _apply_features(self, features, repo_info):
+        """Add one file's indicators to the repository and its row of the feature matrix"""
+        hits = self.scanner.categorize(features['keywords'])
+        repo_name = repo_info['name']
+        
+        # Economic topics, policy areas and data sources count one hit per keyword
+        for table in ['economic_topics', 'policy_areas', 'data_sources']:
+            family = self.families[table]
+            for category in getattr(self, table):
+                if hits[table][category]:
+                    repo_info[table].add(category)
+                    self.matrix.add(repo_name, f"{family}:{category}", hits[table][category])
+        
+        # Geographic focus
+        for country in self.countries:
+            if hits['geographic_focus'][country]:
+                repo_info['geographic_focus'].add(country)
+                self.matrix.add(repo_name, f"geography:{country}")
+        
+        if features['time_period'] is not None:
+            repo_info['time_period'] = features['time_period']
+        if features['sample_size'] is not None:
+            repo_info['sample_size'] = features['sample_size']
+            self.matrix.set(repo_name, 'sample:size', features['sample_size'])
+        
         # Methodological approaches
-        methods = ['ols', 'iv', '2sls', 'did', 'rdd', 'matching', 'bootstrap', 'bayesian', 
-                  'machine learning', 'ml', 'random forest', 'neural network', 'panel', 
-                  'fixed effects', 'random effects', 'gmm', 'structural', 'calibration']
-        for method in methods:
-            if method in content:
+        for method in self.methods:
+            if hits['methods'][method]:
                 repo_info['methods'].add(method)
-                self.results['methodological_approaches'][method] += 1
+                self.matrix.add(repo_name, f"approach:{method}")
+    
+    def results_from_matrix(self, matrix):
+        """Corpus totals of each table, computed from a feature matrix without rescanning"""
+        return {table: matrix.totals(family) for table, family in self.families.items()}
 
     def analyze_all_repos(self):
         """Analyze all repositories"""
@@ -199,6 +249,7 @@ class EconomicContentAnalyzer:
                 # Extract key findings from README or main files
                 self._extract_key_findings(repo_path, repo_info)
         
+        self.results.update(self.results_from_matrix(self.matrix))
         print("Analysis complete!")
 
     def _extract_key_findings(self, repo_path, repo_info):
@@ -268,7 +319,7 @@ class EconomicContentAnalyzer:
         report.append("")
         
         # Sample Size Distribution
-        sample_sizes = [info['sample_size'] for info in self.results['repo_details'].values() if info['sample_size']]
+        sample_sizes = [size for size in self.matrix.column('sample:size') if size]
         if sample_sizes:
             report.append("SAMPLE SIZE DISTRIBUTION")
             report.append("-" * 40)
@@ -286,14 +337,10 @@ class EconomicContentAnalyzer:
         # Top Repositories by Topic Coverage
         report.append("TOP REPOSITORIES BY TOPIC COVERAGE")
         report.append("-" * 40)
-        topic_coverage = []
-        for repo_name, info in self.results['repo_details'].items():
-            coverage = len(info['economic_topics']) + len(info['policy_areas']) + len(info['data_sources'])
-            topic_coverage.append((repo_name, coverage, info))
-        
-        topic_coverage.sort(key=lambda x: x[1], reverse=True)
-        for repo_name, coverage, info in topic_coverage[:10]:
-            topics = ', '.join(list(info['economic_topics'])[:3])
+        coverages = self.matrix.row_counts('topic', 'policy', 'data_source')
+        topic_coverage = sorted(zip(self.matrix.rows, coverages), key=lambda x: x[1], reverse=True)
+        for repo_name, coverage in topic_coverage[:10]:
+            topics = ', '.join(self.matrix.features(repo_name, 'topic')[:3])
             report.append(f"{repo_name}: {coverage} topics ({topics})")
         report.append("")
         
@@ -311,12 +358,27 @@ class EconomicContentAnalyzer:
             f.write(report)
         
         print(f"Results saved to economic_content_analysis.json and economic_content_report.txt")
+    
+    def save_matrix(self, path):
+        """Save the repo × feature matrix"""
+        self.matrix.save(path)
+        print(f"Feature matrix saved to {path}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Analyze economic research content")
+    parser.add_argument("--cache-dir", help="reuse per-file results cached in this directory")
+    parser.add_argument("--matrix", help="save the repo × feature matrix to this file")
+    args = parser.parse_args()
+    
     base_dir = Path(__file__).parent.parent
-    analyzer = EconomicContentAnalyzer(base_dir)
+    cache = ScanCache(args.cache_dir) if args.cache_dir else None
+    analyzer = EconomicContentAnalyzer(base_dir, cache=cache)
     analyzer.analyze_all_repos()
     analyzer.save_results()
+    if args.matrix:
+        analyzer.save_matrix(args.matrix)
+    if cache:
+        cache.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Load-testing benchmark for the chat API
+Replays a message corpus against the Flask test client or a locally spawned
+gunicorn at a given concurrency, and saves latency percentiles, throughput and
+RSS growth as JSON for comparison across commits.
+
+    python scripts/benchmark_chat.py --target client --concurrency 8
+    python scripts/benchmark_chat.py --target gunicorn --workers 4 --concurrency 32
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+# Most traffic is a handful of canned questions, with a long tail of others
+FAQ_MESSAGES = [
+    "What is computational empathy?",
+    "How do I use Docker for reproducibility?",
+    "How do I make my Stata code reproducible?",
+    "What should go in a README file?",
+    "Tell me about data transparency",
+    "Hello",
+    "Thanks!"
+]
+TAIL_MESSAGES = [
+    "I have confidential census data, how do I write a data availability statement?",
+    "Which repository should I use to archive my replication package, openICPSR or Zenodo?",
+    "My R packages keep changing versions, how do I pin them with renv?",
+    "Should I set a random seed for bootstrap standard errors in Python?",
+    "How long should it take a replicator to run my code?",
+    "Can I teach reproducibility to undergraduates in a methods course?",
+    "What does the AEA Data Editor check in a replication package?",
+    "My code uses absolute paths, is that a problem?",
+    "How do I document data I purchased from a vendor?",
+    "Something completely unrelated to research"
+]
+
+
+def build_corpus(size, faq_share=0.8, seed=0):
+    """Sample a message corpus mixing repeated FAQs with a tail of varied questions"""
+    rng = random.Random(seed)
+    return [rng.choice(FAQ_MESSAGES) if rng.random() < faq_share else rng.choice(TAIL_MESSAGES)
+            for _ in range(size)]
+
+
+def read_rss_kb(pid):
+    """Resident set size of a process in kB, from /proc (0 where unavailable)"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def read_memory_kb(pid):
+    """RSS, PSS and private memory of a process in kB, from /proc (empty where unavailable)
+
+    PSS splits shared pages among the processes sharing them, so the PSS of
+    the workers adds up to their real memory use.
+    """
+    fields = {'Rss:': 'rss', 'Pss:': 'pss', 'Private_Clean:': 'private', 'Private_Dirty:': 'private'}
+    memory = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                name = fields.get(line.split(':', 1)[0] + ':')
+                if name:
+                    memory[name] = memory.get(name, 0) + int(line.split()[1])
+    except OSError:
+        pass
+    return memory
+
+
+def child_pids(pid):
+    """Direct children of a process, e.g. the workers of a gunicorn master"""
+    children = []
+    try:
+        for task in os.listdir(f'/proc/{pid}/task'):
+            with open(f'/proc/{pid}/task/{task}/children') as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return children
+
+
+class RSSSampler(threading.Thread):
+    """Sample the total RSS of a process and its children in the background"""
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.start_time = time.perf_counter()
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def sample(self):
+        total = sum(read_rss_kb(pid) for pid in [self.pid] + child_pids(self.pid))
+        self.samples.append((round(time.perf_counter() - self.start_time, 3), total))
+
+    def run(self):
+        self.sample()
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.sample()
+
+
+class FlaskClientTarget:
+    """Send requests through the Flask test client, in this process"""
+
+    name = 'client'
+
+    def __init__(self):
+        from app import app, rate_limiter
+        self.app = app
+        self.pid = os.getpid()
+        self._local = threading.local()
+        # Replaying many requests per session from one address would trip the rate limits
+        self.rate_limiter = rate_limiter
+        self._rate_limit_enabled = rate_limiter.enabled
+        rate_limiter.enabled = False
+
+    def post(self, path, payload):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.post(path, json=payload)
+        return response.status_code
+
+    def close(self):
+        self.rate_limiter.enabled = self._rate_limit_enabled
+
+
+class GunicornTarget:
+    """Spawn gunicorn on a free local port and send requests over HTTP"""
+
+    name = 'gunicorn'
+
+    def __init__(self, workers=2, threads=1, env=None, timeout=30, preload=False):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            self.port = sock.getsockname()[1]
+        self.base_url = f'http://127.0.0.1:{self.port}'
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-w', str(workers), '--threads', str(threads),
+             '-b', f'127.0.0.1:{self.port}', 'app:app'],
+            cwd=REPO_ROOT, env={**os.environ, 'RATE_LIMIT_BACKEND': 'off', **(env or {}),
+                                'PRELOAD_APP': '1' if preload else '0'},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self.pid = self.process.pid
+        self._wait_ready(timeout)
+
+    def _wait_ready(self, timeout):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with status {self.process.returncode}")
+            try:
+                with urllib.request.urlopen(self.base_url + '/api/health', timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.2)
+        self.close()
+        raise RuntimeError(f"gunicorn did not become healthy within {timeout}s")
+
+    def post(self, path, payload):
+        request = urllib.request.Request(
+            self.base_url + path, data=json.dumps(payload).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def close(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def run_benchmark(target, corpus, concurrency=8, sessions=100, warmup=20, rss_interval=0.5):
+    """Replay the corpus against a target and return the results record"""
+    for message in corpus[:warmup]:
+        target.post('/api/chat', {'message': message, 'session_id': 'warmup'})
+
+    def send(i):
+        payload = {'message': corpus[i], 'session_id': f'bench-{i % sessions}'}
+        start = time.perf_counter()
+        try:
+            status = target.post('/api/chat', payload)
+        except OSError:
+            status = None
+        return time.perf_counter() - start, status
+
+    sampler = RSSSampler(target.pid, rss_interval)
+    sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, range(len(corpus))))
+    duration = time.perf_counter() - start
+    sampler.stop()
+
+    # Memory of each gunicorn worker after the run; the client target has no workers
+    workers = [dict(pid=pid, **read_memory_kb(pid)) for pid in child_pids(target.pid)]
+
+    latencies = sorted(latency * 1000 for latency, status in results if status == 200)
+    errors = sum(1 for _, status in results if status != 200)
+    rss = [kb for _, kb in sampler.samples]
+    return {
+        'requests': len(corpus),
+        'errors': errors,
+        'duration_s': round(duration, 3),
+        'requests_per_second': round(len(latencies) / duration, 1) if duration else None,
+        'latency_ms': {
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'mean': sum(latencies) / len(latencies) if latencies else None,
+            'max': latencies[-1] if latencies else None
+        },
+        'rss_kb': {
+            'start': rss[0],
+            'end': rss[-1],
+            'peak': max(rss),
+            'growth': rss[-1] - rss[0],
+            'timeline': sampler.samples
+        },
+        'workers_kb': workers
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat API latency, throughput and memory")
+    parser.add_argument("--target", choices=["client", "gunicorn"], default="client")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent client threads")
+    parser.add_argument("--requests", type=int, default=2000, help="messages to replay")
+    parser.add_argument("--sessions", type=int, default=100, help="distinct conversation ids")
+    parser.add_argument("--corpus", help="file with one message per line (default: built-in FAQ mix)")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=1, help="gunicorn threads per worker")
+    parser.add_argument("--preload", action="store_true", help="load the app before forking gunicorn workers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="results JSON (default: benchmarks/chat-<commit>-<target>.json)")
+    args = parser.parse_args()
+
+    if args.corpus:
+        messages = [line.strip() for line in open(args.corpus, encoding='utf-8') if line.strip()]
+        rng = random.Random(args.seed)
+        corpus = [rng.choice(messages) for _ in range(args.requests)]
+    else:
+        corpus = build_corpus(args.requests, seed=args.seed)
+
+    if args.target == 'gunicorn':
+        target = GunicornTarget(workers=args.workers, threads=args.threads, preload=args.preload)
+    else:
+        target = FlaskClientTarget()
+    try:
+        results = run_benchmark(target, corpus, concurrency=args.concurrency, sessions=args.sessions)
+    finally:
+        target.close()
+
+    commit = git_commit()
+    record = {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'target': target.name,
+        'config': {
+            'concurrency': args.concurrency,
+            'sessions': args.sessions,
+            'corpus': args.corpus or 'builtin',
+            'seed': args.seed,
+            'workers': args.workers if args.target == 'gunicorn' else None,
+            'threads': args.threads if args.target == 'gunicorn' else None,
+            'preload': args.preload if args.target == 'gunicorn' else None
+        },
+        **results
+    }
+
+    output = Path(args.output or REPO_ROOT / 'benchmarks' / f"chat-{commit or 'unknown'}-{target.name}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(record, f, indent=2)
+
+    latency = record['latency_ms']
+    print(f"{target.name}: {record['requests']} requests, {record['errors']} errors, "
+          f"{record['requests_per_second']} req/s")
+    print(f"Latency p50 {latency['p50']:.2f} ms, p95 {latency['p95']:.2f} ms, p99 {latency['p99']:.2f} ms")
+    print(f"RSS {record['rss_kb']['start']} kB -> {record['rss_kb']['end']} kB "
+          f"(growth {record['rss_kb']['growth']} kB)")
+    for worker in record['workers_kb']:
+        print(f"Worker {worker['pid']}: RSS {worker.get('rss')} kB, PSS {worker.get('pss')} kB, "
+              f"private {worker.get('private')} kB")
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
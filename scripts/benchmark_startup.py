@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the chat app
+Starts fresh interpreters that import the app and answer /api/health through
+the test client, and reports the median app-ready time against a target along
+with an import-time breakdown by top-level package from python -X importtime.
+
+    python scripts/benchmark_startup.py --runs 10
+    python scripts/benchmark_startup.py --mode eager --target-ms 200
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmark_chat import REPO_ROOT, git_commit, percentile
+
+# App-ready time: from the first import to the first health response, split into
+# importing the web framework and everything the app itself does on top of it
+READY_SCRIPT = (
+    "import time\n"
+    "start = time.perf_counter()\n"
+    "import flask, flask_cors\n"
+    "framework = time.perf_counter()\n"
+    "from app import app\n"
+    "assert app.test_client().get('/api/health').status_code == 200\n"
+    "print(framework - start, time.perf_counter() - framework)\n"
+)
+
+
+def run_interpreter(code, env=None, importtime=False):
+    """Run code in a fresh interpreter from the repository root; returns stdout and stderr"""
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    result = subprocess.run(command, cwd=REPO_ROOT, env={**os.environ, **(env or {})},
+                            capture_output=True, text=True, check=True)
+    return result.stdout, result.stderr
+
+
+def parse_importtime(stderr):
+    """Sum the self time of -X importtime output per top-level package, in seconds"""
+    totals = Counter()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        package = fields[2].strip().split('.')[0]
+        totals[package] += int(fields[0]) / 1e6
+    return totals
+
+
+def measure_startup(runs=10, mode='lazy', top=15):
+    """Start the app in runs fresh interpreters and return the results record"""
+    env = {'STARTUP_MODE': mode}
+    samples = [[float(seconds) * 1000 for seconds in run_interpreter(READY_SCRIPT, env)[0].split()]
+               for _ in range(runs)]
+    ready = sorted(framework + own for framework, own in samples)
+    framework = sorted(framework for framework, _ in samples)
+    own = sorted(own for _, own in samples)
+
+    # Module imports are cached after the first run, so each breakdown is a warm-disk start
+    _, stderr = run_interpreter(READY_SCRIPT, env, importtime=True)
+    packages = parse_importtime(stderr)
+    return {
+        'runs': runs,
+        'app_ready_ms': {
+            'p50': percentile(ready, 50),
+            'min': ready[0],
+            'max': ready[-1]
+        },
+        'framework_import_ms': {'p50': percentile(framework, 50)},
+        'app_own_ms': {'p50': percentile(own, 50)},
+        'import_ms': round(sum(packages.values()) * 1000, 2),
+        'imports_by_package_ms': {package: round(seconds * 1000, 2)
+                                  for package, seconds in packages.most_common(top)}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cold start of the chat app")
+    parser.add_argument("--runs", type=int, default=10, help="fresh interpreters to start")
+    parser.add_argument("--mode", choices=["lazy", "eager"], default="lazy", help="STARTUP_MODE of the app")
+    parser.add_argument("--target-ms", type=float, default=200.0, help="app-ready time to stay under")
+    parser.add_argument("--top", type=int, default=15, help="packages shown in the import breakdown")
+    parser.add_argument("--output", help="results JSON (default: benchmarks/startup-<commit>-<mode>.json)")
+    args = parser.parse_args()
+
+    results = measure_startup(args.runs, args.mode, args.top)
+    commit = git_commit()
+    record = {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'mode': args.mode,
+        'target_ms': args.target_ms,
+        'within_target': results['app_ready_ms']['p50'] < args.target_ms,
+        **results
+    }
+
+    output = Path(args.output or REPO_ROOT / 'benchmarks' / f"startup-{commit or 'unknown'}-{args.mode}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(record, f, indent=2)
+
+    ready = record['app_ready_ms']
+    print(f"{args.mode}: app ready in {ready['p50']:.1f} ms (p50 of {args.runs}, "
+          f"min {ready['min']:.1f}, max {ready['max']:.1f}), target {args.target_ms:.0f} ms: "
+          f"{'OK' if record['within_target'] else 'OVER'}")
+    print(f"Flask imports {record['framework_import_ms']['p50']:.1f} ms, "
+          f"app on top of them {record['app_own_ms']['p50']:.1f} ms")
+    print(f"Import time by package ({record['import_ms']:.1f} ms in total):")
+    for package, ms in record['imports_by_package_ms'].items():
+        print(f"  {package:<24} {ms:8.2f} ms")
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
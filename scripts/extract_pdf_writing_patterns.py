@@ -1,7 +1,14 @@
 #!/usr/bin/env python3
+import argparse
 import re
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from repo_inventory import RepoInventory
+from scan_cache import ScanCache
+
 SRC_DIR = Path('pdf_text')
 OUT = Path('AER_WRITING_PATTERNS.md')
 
@@ -86,14 +93,24 @@ def extract_sections(lines):
     }
 
 def main():
+    parser = argparse.ArgumentParser(description="Summarize writing patterns of the extracted PDF texts")
+    parser.add_argument("--cache-dir", help="reuse per-file extracts cached in this directory")
+    args = parser.parse_args()
+    cache = ScanCache(args.cache_dir) if args.cache_dir else None
+
     entries = []
-    for p in sorted(SRC_DIR.glob('*.txt')):
-        try:
-            text = p.read_text(errors='ignore')
-        except Exception:
-            continue
-        lines = clean_lines(text)
-        meta = extract_sections(lines)
+    for entry in sorted(RepoInventory(SRC_DIR).top_level_files('*.txt'), key=lambda e: e.path):
+        p = entry.path
+        # Only new or changed texts are parsed again when a cache is given
+        meta = cache.get('writing_patterns:v1', entry) if cache else None
+        if meta is None:
+            try:
+                text = p.read_text(errors='ignore')
+            except Exception:
+                continue
+            meta = extract_sections(clean_lines(text))
+            if cache:
+                cache.put('writing_patterns:v1', entry, meta)
         # Skip if no meaningful text
         if not any(meta.values()):
             continue
@@ -138,6 +155,8 @@ def main():
     out.append('- Standard structure: Abstract → Intro → Context/Model → Data → Results → Robustness → Conclusion.')
 
     OUT.write_text('\n'.join(out))
+    if cache:
+        cache.close()
 
 if __name__ == '__main__':
     main()
@@ -14,6 +14,7 @@ from collections import defaultdict
 
 from analyze_repos import AEARepositoryAnalyzer
 from econometric_analysis import EconometricAnalyzer
+from repo_inventory import RepoInventory
 
 BASE = Path(__file__).resolve().parents[1]
 ROOT = BASE
@@ -30,11 +31,11 @@ REPORT_DIR.mkdir(parents=True, exist_ok=True)
 
 # Helpers
 
-def detect_languages_quick(repo_path: Path) -> dict[str, int]:
+def detect_languages_quick(inventory: RepoInventory) -> dict[str, int]:
     ext_map = {'.do': 'Stata', '.m': 'MATLAB', '.py': 'Python', '.R': 'R', '.jl': 'Julia'}
     counts = defaultdict(int)
     for ext, lang in ext_map.items():
-        counts[lang] += len(list(repo_path.rglob(f"*{ext}")))
+        counts[lang] += inventory.count(ext)
     return dict(counts)
 
 
@@ -42,8 +43,10 @@ def summarize_repo(repo: Path) -> dict:
     analyzer = AEARepositoryAnalyzer(repo)
     analyzer.repos = [repo]
     single = analyzer.analyze_single_repo(repo)
+    inventory = analyzer.get_inventory(repo)
 
-    econ = EconometricAnalyzer(repo)
+    # Scan the repo's code files from the inventory above rather than walking it again
+    econ = EconometricAnalyzer(repo.parent, inventories={repo: inventory})
     methods = econ.analyze_all_repos()
     robust = econ.analyze_robustness_checks()
 
@@ -59,14 +62,14 @@ def summarize_repo(repo: Path) -> dict:
         "code_organization": single.get("code_organization"),
         "statistical_methods": single.get("statistical_methods", []),
         "robustness_counts": {k:int(v) for k,v in robust.items()},
-        "language_quick": detect_languages_quick(repo),
+        "language_quick": detect_languages_quick(inventory),
         "file_counts": {
-            "do": len(list(repo.rglob("*.do"))),
-            "R": len(list(repo.rglob("*.R"))),
-            "py": len(list(repo.rglob("*.py"))),
-            "m": len(list(repo.rglob("*.m"))),
-            "md": len(list(repo.rglob("*.md"))),
-            "pdf": len(list(repo.rglob("*.pdf"))),
+            "do": inventory.count(".do"),
+            "R": inventory.count(".R"),
+            "py": inventory.count(".py"),
+            "m": inventory.count(".m"),
+            "md": inventory.count(".md"),
+            "pdf": inventory.count(".pdf"),
         },
     }
 
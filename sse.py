@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+"""
+Server-Sent Events formatting shared by the Flask (app.py) and ASGI (asgi_app.py)
+chat front ends, so that both stream /api/chat/stream in the same wire format
+"""
+
+import json
+
+
+def sse_event(event, payload):
+    """Format one Server-Sent Events message with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
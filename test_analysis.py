@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Tests for the replication-package corpus analyzers
+"""
+
+import sys
+import os
+import json
+
+# Add current directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from analyze_repos import AEARepositoryAnalyzer
+from code_lexer import PythonLexer, RLexer, StataLexer
+from econometric_analysis import EconometricAnalyzer
+from feature_matrix import FeatureMatrix
+from pattern_scanner import KeywordScanner
+from repo_inventory import RepoInventory
+from scan_cache import ScanCache
+
+
+def make_corpus(base):
+    """Create two small replication packages under base"""
+    files = {
+        'aearep-1/README.md': "Data availability: see data/. Software requirements: Stata 17.\n"
+                              "Run master.do to create all tables and figures. License: MIT.",
+        'aearep-1/master.do': "do 01_clean.do\ndo 02_analysis.do",
+        'aearep-1/code/01_clean.do': "use raw, clear\ndrop if missing(x)\nmerge 1:1 id using b\n"
+                                     "winsor2 y, cuts(1 99)\nreshape long y, i(id) j(year)",
+        'aearep-1/code/02_analysis.do': "reghdfe y x, absorb(id) vce(cluster id)\n"
+                                        "ivregress 2sls y (x = z)\nrdrobust y x\n* placebo test",
+        'aearep-1/data/.keep': "",
+        'aearep-1/output/.keep': "",
+        'aearep-2/README.txt': "Instructions: run main.R",
+        'aearep-2/main.R': "library(fixest)\nm <- lm(y ~ x)\nrandomForest(y ~ ., data = d)",
+        'aearep-2/analysis.py': "import sklearn\nfrom statsmodels.tsa.api import VAR\nimport networkx",
+        'aearep-2/requirements.txt': "numpy",
+    }
+    for name, content in files.items():
+        path = base / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    return base
+
+
+def test_keyword_scanner_matches_substring_semantics():
+    """Overlapping and nested keywords are all reported"""
+    scanner = KeywordScanner({
+        'stata': {'OLS': ['regress ', 'reg '], 'IV': ['ivregress'], 'DID': ['did', 'did_']},
+        'other': {'network': ['network', 'networkx']}
+    })
+    text = "ivregress 2sls y x\ndid_imputation\nimport networkx"
+    assert scanner.find_keywords(text) == {'ivregress', 'regress ', 'did', 'did_', 'network', 'networkx'}
+    hits = scanner.scan(text)
+    assert hits['stata'] == {'OLS': 1, 'IV': 1, 'DID': 2}
+    assert hits['other']['network'] == 2
+    assert scanner.scan("nothing here")['stata'] == {}
+
+
+def test_repo_inventory_matches_filesystem(tmp_path):
+    repo = make_corpus(tmp_path) / 'aearep-1'
+    inventory = RepoInventory(repo)
+
+    assert inventory.paths('.do') == list(repo.rglob('*.do'))
+    assert inventory.count('.md') == 1
+    assert sorted(inventory.subdirs) == ['code', 'data', 'output']
+    assert inventory.top_level_matches('master*') == ['master.do']
+    entry = inventory.entries('.md')[0]
+    assert entry.size == (repo / 'README.md').stat().st_size
+
+
+def test_repository_analyzer(tmp_path):
+    analyzer = AEARepositoryAnalyzer(make_corpus(tmp_path))
+    results = analyzer.analyze_all()
+
+    assert results['total_repos'] == 2
+    assert results['programming_languages']['distribution'] == {'Stata': 3, 'R': 1, 'Python': 1}
+    assert results['reproducibility_features']['master_scripts'] == 2
+
+    single = analyzer.analyze_single_repo(tmp_path / 'aearep-1')
+    assert single['structure_type'] == 'standard_three_folder'
+    assert single['has_data_statement']
+    assert {'OLS', 'IV', 'RDD'} <= set(single['statistical_methods'])
+
+
+def test_repository_analyzer_parallel_matches_serial(tmp_path):
+    corpus = make_corpus(tmp_path)
+    serial = AEARepositoryAnalyzer(corpus).analyze_all()
+    parallel = AEARepositoryAnalyzer(corpus).analyze_all(workers=2)
+    assert parallel == serial
+
+
+def test_repository_analyzer_stream_resumes(tmp_path):
+    corpus = make_corpus(tmp_path / 'corpus')
+    stream = tmp_path / 'results.ndjson'
+    expected = AEARepositoryAnalyzer(corpus).analyze_all()
+
+    # Simulate a crash after the first repo, in the middle of writing the second
+    first = AEARepositoryAnalyzer(corpus).analyze_single_repo(corpus / 'aearep-1')
+    stream.write_text(json.dumps(first) + "\n" + '{"name": "aearep-2", "lang')
+
+    analyzer = AEARepositoryAnalyzer(corpus)
+    analyzer.repos = sorted(analyzer.repos)
+    results = analyzer.analyze_stream(stream)
+    lines = stream.read_text().splitlines()
+    assert [json.loads(line)['name'] for line in lines] == ['aearep-1', 'aearep-2']
+    assert results['programming_languages'] == expected['programming_languages']
+    assert results['documentation'] == expected['documentation']
+
+    assert AEARepositoryAnalyzer(corpus).reduce_stream(stream)['total_repos'] == 2
+
+
+def test_econometric_analyzer(tmp_path):
+    analyzer = EconometricAnalyzer(make_corpus(tmp_path))
+    methods = analyzer.analyze_all_repos()
+
+    assert methods['stata']['IV/2SLS'] == 1
+    assert methods['stata']['Fixed Effects'] == 1
+    assert methods['r']['Panel'] == 1 and methods['r']['ML'] == 1
+    assert methods['python']['ML'] == 1 and methods['python']['Time Series'] == 1
+
+    assert analyzer.analyze_robustness_checks()['placebo_tests'] == 1
+    cleaning = analyzer.analyze_data_cleaning()
+    assert cleaning['merging'] == 1 and cleaning['reshaping'] == 1
+
+    advanced = analyzer.identify_advanced_techniques()
+    assert advanced['network_analysis'] == ['aearep-2']
+
+
+def test_econometric_analyzer_uses_given_inventories(tmp_path, monkeypatch):
+    corpus = make_corpus(tmp_path)
+    expected = EconometricAnalyzer(corpus).analyze_all_repos()
+
+    inventories = {repo: RepoInventory(repo) for repo in sorted(corpus.glob("*/"))}
+    import econometric_analysis
+    monkeypatch.setattr(econometric_analysis, 'RepoInventory', None)
+    analyzer = EconometricAnalyzer(corpus, inventories=inventories)
+    assert analyzer.analyze_all_repos() == expected
+    assert analyzer.matrix.rows == ['aearep-1', 'aearep-2']
+
+    # A single repo is scanned as one, with its top-level code files
+    only = EconometricAnalyzer(corpus, inventories={corpus / 'aearep-2': inventories[corpus / 'aearep-2']})
+    assert only.analyze_all_repos()['python']['ML'] == 1 and only.matrix.rows == ['aearep-2']
+
+
+def test_econometric_analyzer_parallel_matches_serial(tmp_path):
+    corpus = make_corpus(tmp_path)
+    # A second file using a method counts twice, but its repo is listed once
+    (corpus / 'aearep-1' / 'code' / '03_more.do').write_text("ivregress 2sls y2 (x = z)")
+    results = []
+    for workers in (1, 2):
+        analyzer = EconometricAnalyzer(corpus)
+        results.append((analyzer.analyze_all_repos(workers=workers), analyzer.analyze_robustness_checks(),
+                        analyzer.analyze_data_cleaning(), analyzer.identify_advanced_techniques(),
+                        analyzer.methods_found))
+    serial, parallel = results
+    assert parallel == serial
+    assert serial[0]['stata']['IV/2SLS'] == 2
+    assert serial[4]['IV/2SLS'] == ['aearep-1']
+
+
+def test_econometric_analyzer_parallel_walks_repos_in_workers(tmp_path):
+    corpus = make_corpus(tmp_path)
+    analyzer = EconometricAnalyzer(corpus)
+    walked = []
+    analyzer.code_entries = lambda repo: walked.append(repo)
+    assert analyzer.analyze_all_repos(workers=2) == EconometricAnalyzer(corpus).analyze_all_repos()
+    assert walked == []
+
+
+def test_econometric_analyzer_reads_each_file_once(tmp_path):
+    analyzer = EconometricAnalyzer(make_corpus(tmp_path))
+    reads = []
+    read_chunks = analyzer.read_chunks
+    analyzer.read_chunks = lambda path: reads.append(path) or read_chunks(path)
+
+    analyzer.analyze_all_repos()
+    analyzer.analyze_robustness_checks()
+    analyzer.analyze_data_cleaning()
+    analyzer.identify_advanced_techniques()
+    # Three .do files, one .R and one .py file, each read a single time
+    assert len(reads) == len(set(reads)) == 5
+    assert analyzer.methods_found['IV/2SLS'] == ['aearep-1']
+
+
+def test_econometric_analyzer_streams_bounded_chunks(tmp_path):
+    corpus = make_corpus(tmp_path)
+    whole = EconometricAnalyzer(corpus)
+    whole_results = (whole.analyze_all_repos(), whole.analyze_robustness_checks(),
+                     whole.analyze_data_cleaning(), whole.identify_advanced_techniques())
+
+    # Chunks far shorter than the keywords still find those spanning chunk boundaries
+    chunked = EconometricAnalyzer(corpus)
+    chunks = []
+    read_chunks = chunked.read_chunks
+    chunked.read_chunks = lambda path: (chunks.append(len(c)) or c for c in read_chunks(path, chunk_size=3))
+    assert (chunked.analyze_all_repos(), chunked.analyze_robustness_checks(),
+            chunked.analyze_data_cleaning(), chunked.identify_advanced_techniques()) == whole_results
+    assert max(chunks) == 3
+
+    # Once every advanced technique is flagged, files that only feed them are not read
+    (corpus / 'aearep-2' / 'estimation.py').write_text("lasso rdd gmm bayes nltk networkx")
+    (corpus / 'aearep-2' / 'zz_generated.m').write_text("xgboost " * 100000)
+    streamed = EconometricAnalyzer(corpus)
+    reads = []
+    read_chunks = streamed.read_chunks
+    streamed.read_chunks = lambda path: reads.append(path.name) or read_chunks(path)
+    assert all(streamed.identify_advanced_techniques()[technique] == ['aearep-2']
+               for technique in ('machine_learning', 'bayesian', 'text_analysis'))
+    assert 'estimation.py' in reads and 'zz_generated.m' not in reads
+
+
+def test_code_lexers_yield_commands_only(tmp_path):
+    do_file = ("* var model, see /* below\n"
+               "/* gmm /* nested */ estimation */\n"
+               "gen did_treat = var_growth // xtreg\n"
+               "display \"xtreg results\"\n"
+               "quietly reg y x, fe vce(cluster id)\n"
+               "bysort id: egen m = mean(y)\n"
+               "#delimit ;\n"
+               "ivregress 2sls y (x = z)\n"
+               "  , robust ;\n"
+               "#delimit cr\n"
+               "did_imputation y i t ei\n")
+    r_file = ("# lm(y ~ x)\n"
+              "label <- \"glmnet(\nstill a string\"\n"
+              "library(\"fixest\"); pacman::p_load(did, plm)\n"
+              "m <- feols(y ~ x | id, data = d)\n")
+    py_file = ('"""Uses sklearn.\nimport torch"""\n'
+               "import statsmodels.api as sm\n"
+               "from linearmodels.panel import (PanelOLS,\n    RandomEffects as RE)\n"
+               "# import tensorflow\n"
+               "model = sm.OLS(y, X).fit()  # not XGBClassifier()\n")
+    cases = [
+        (StataLexer, do_file, {'reg', 'fe', 'vce', 'vce(cluster', 'egen', 'ivregress', 'ivregress 2sls',
+                               'robust', 'did_imputation', 'did_'},
+         {'var', 'gmm', 'xtreg', 'display xtreg'}),
+        (RLexer, r_file, {'fixest', 'pacman', 'did', 'plm', 'feols'}, {'lm', 'glmnet'}),
+        (PythonLexer, py_file, {'statsmodels', 'statsmodels.api', 'PanelOLS', 'RandomEffects', 'sm.OLS', 'OLS'},
+         {'sklearn', 'torch', 'tensorflow', 'XGBClassifier', 'RE'}),
+    ]
+    for lexer, code, present, absent in cases:
+        tokens = lexer.tokenize(code)
+        assert present <= tokens and not absent & tokens, lexer.__name__
+        # Fed a character at a time, lines and strings spanning chunks lex the same
+        streamed = lexer()
+        for char in code:
+            streamed.feed(char)
+        assert streamed.close() == tokens
+
+    # A statement never ended by a semicolon is bounded like an overlong line
+    lexer = StataLexer(max_line=1000)
+    lexer.feed("#delimit ;\nreg y x\n")
+    for i in range(20000):
+        lexer.feed(f"  x{i} z{i}\n")
+        assert len(lexer._statement) <= 1000
+    lexer.feed("; probit y x ;\n#delimit cr\nlogit y x\n")
+    tokens = lexer.close()
+    assert {'reg', 'probit', 'logit'} <= tokens and not any(token.startswith('x') for token in tokens)
+
+    # Methods named only in comments, strings or variable names are not counted
+    (tmp_path / 'aearep-1').mkdir()
+    (tmp_path / 'aearep-1' / 'main.do').write_text(do_file)
+    methods = EconometricAnalyzer(tmp_path).analyze_all_repos()['stata']
+    assert methods['IV/2SLS'] == methods['Fixed Effects'] == methods['DID'] == 1
+    assert methods['Time Series'] == methods['GMM'] == methods['Panel'] == 0
+
+
+def test_scan_cache_reuses_unchanged_files(tmp_path):
+    corpus = make_corpus(tmp_path / 'corpus')
+    cache = ScanCache(tmp_path / 'cache')
+    first = EconometricAnalyzer(corpus, cache=cache).analyze_all_repos()
+    assert cache.hits == 0 and cache.misses == 5
+    cache.close()
+
+    cache = ScanCache(tmp_path / 'cache')
+    assert EconometricAnalyzer(corpus, cache=cache).analyze_all_repos() == first
+    assert cache.hits == 5 and cache.misses == 0
+
+    # A changed file is re-scanned, the others are still served from the cache
+    do_file = corpus / 'aearep-1' / 'code' / '02_analysis.do'
+    do_file.write_text("xtabond y l.y")
+    os.utime(do_file, (1, 1))
+    methods = EconometricAnalyzer(corpus, cache=cache).analyze_all_repos()
+    assert cache.misses == 1
+    assert methods['stata']['GMM'] == 1 and methods['stata']['IV/2SLS'] == 0
+    cache.close()
+
+
+def test_scan_cache_keys_keyword_hits_by_text_transform(tmp_path):
+    (tmp_path / 'repo').mkdir()
+    (tmp_path / 'repo' / 'README.md').write_text("Run MASTER.do")
+    entry = RepoInventory(tmp_path / 'repo').entries('.md')[0]
+    scanner = KeywordScanner({'docs': {'master': ['master']}})
+    cache = ScanCache(tmp_path / 'cache')
+
+    def read(path):
+        return path.read_text()
+
+    def read_lower(path):
+        return path.read_text().lower()
+
+    assert scanner.find_file_keywords(entry, read, cache, transform='raw') == set()
+    assert scanner.find_file_keywords(entry, read_lower, cache, transform='lower') == {'master'}
+    assert scanner.find_file_keywords(entry, read, cache, transform='raw') == set()
+    assert cache.hits == 1 and cache.misses == 2
+    cache.close()
+
+
+def test_feature_matrix_recomputes_reports_and_cross_tabs(tmp_path):
+    corpus = make_corpus(tmp_path / 'corpus')
+    repos = AEARepositoryAnalyzer(corpus)
+    repos.analyze_all()
+    econometric = EconometricAnalyzer(corpus)
+    methods = econometric.analyze_all_repos()
+    results = econometric.results()
+    report = econometric.generate_report(methods, results['robustness'], results['cleaning'], results['advanced'])
+
+    repos.matrix.save(tmp_path / 'repos.matrix')
+    econometric.matrix.save(tmp_path / 'econometric.matrix')
+    loaded = FeatureMatrix.load(tmp_path / 'econometric.matrix')
+    assert loaded.rows == econometric.matrix.rows and loaded.columns == econometric.matrix.columns
+
+    # Every report section comes back from the saved matrix, without a rescan
+    again = EconometricAnalyzer(corpus)
+    recomputed = again.results_from_matrix(loaded)
+    assert recomputed == results and again.methods_found == econometric.methods_found
+    assert again.generate_report(recomputed['methods'], recomputed['robustness'], recomputed['cleaning'],
+                                 recomputed['advanced']) == report
+
+    # RDD packages with a master script, across the two analyzers
+    matrix = FeatureMatrix.load(tmp_path / 'repos.matrix').join(loaded)
+    assert matrix.count('has:master_script') == 2
+    assert matrix.where('stata:RDD', 'has:master_script') == ['aearep-1']
+    assert matrix.crosstab('language', 'advanced')['R'] == {'network_analysis': 1}
@@ -34,6 +34,583 @@ def test_bot_responses():
         
     print("\n✅ All tests completed successfully!")
 
+def test_keyword_matching():
+    """Test the precompiled matcher keeps the substring scoring rules"""
+    from app import LarsVilhuberBot
+    
+    bot = LarsVilhuberBot()
+    
+    assert bot.find_best_response("What is computational empathy?") == ("computational_empathy", 3 / 4)
+    assert bot.find_best_response("docker container") == ("docker", 1.0)
+    assert bot.find_best_response("nothing relevant") == (None, 0.0)
+    # "hi" matches inside "this", so this is answered as a greeting
+    assert bot.generate_response("Is this reproducible?") in bot.personality_phrases["greeting"]
+
+def test_response_plan_cache():
+    """Test repeated questions reuse the cached response plan"""
+    from app import LarsVilhuberBot
+    
+    bot = LarsVilhuberBot(plan_cache_size=2)
+    plan = bot.plan_response("How do I use Docker?")
+    assert bot.plan_response("  how do i use docker? ") is plan
+    assert plan.reply_kind == "answer" and plan.is_question
+    assert plan.candidates == bot.expertise["docker"]["responses"]
+    assert bot.generate_response("how do i use docker?") != ""
+    assert bot.plan_response("thanks").reply_kind == "closing"
+    assert bot.plan_cache_stats() == {'hits': 2, 'misses': 2, 'size': 2, 'max_size': 2}
+    
+    # Long messages bypass the cache
+    bot.plan_response("docker " * 100)
+    assert bot.plan_cache_stats()['misses'] == 2
+
+def test_shared_knowledge_base():
+    """Test all three bots read one immutable knowledge base per process"""
+    from app import LarsVilhuberBot
+    from knowledge_base import load_knowledge_base
+    from lars_chatbot_advanced import LarsVilhuberAdvancedChatbot
+    from lars_vilhuber_chatbot import LarsVilhuberChatbot
+    
+    knowledge = load_knowledge_base()
+    assert load_knowledge_base() is knowledge
+    assert LarsVilhuberBot().expertise is LarsVilhuberBot().expertise is knowledge.web["expertise"]
+    assert LarsVilhuberChatbot().expertise_areas is knowledge.cli["expertise_areas"]
+    assert LarsVilhuberAdvancedChatbot().software_expertise is knowledge.advanced["software_expertise"]
+    
+    try:
+        knowledge.web["expertise"]["docker"] = {}
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("knowledge base should be read-only")
+    
+    # "r" occurs in nearly every message, so it counts towards software_environments
+    assert LarsVilhuberChatbot().find_topic("docker container for reproducible research") == \
+        ("software_environments", 3 / 5)
+
+def test_knowledge_snapshot_and_lazy_startup(tmp_path, monkeypatch):
+    """Test the knowledge snapshot matches the JSON it was built from and lazy parts load on first use"""
+    import shutil
+    from knowledge_base import DEFAULT_KNOWLEDGE_PATH, KnowledgeBase, read_snapshot, write_snapshot
+    from retrieval import BM25Index
+    
+    path = tmp_path / 'knowledge_base.json'
+    shutil.copy(DEFAULT_KNOWLEDGE_PATH, path)
+    assert read_snapshot(path) is None
+    assert write_snapshot(path) == tmp_path / 'knowledge_base.snapshot'
+    
+    snapshot = read_snapshot(path)
+    from_snapshot = KnowledgeBase(snapshot['data'], regexes=snapshot['regexes'])
+    from_json = KnowledgeBase.from_file(path)
+    message = "how do i archive my stata code and data in a docker container? thanks"
+    assert from_snapshot.web_matcher._pattern is None
+    assert from_snapshot.web_matcher.find_keywords(message) == from_json.web_matcher.find_keywords(message)
+    assert from_snapshot.cli_matcher.find_keywords(message) == from_json.cli_matcher.find_keywords(message)
+    
+    # So does changing the code that builds the regexes, or editing the JSON
+    import knowledge_base
+    monkeypatch.setattr(knowledge_base, 'code_signature', lambda: 'changed')
+    assert read_snapshot(path) is None
+    monkeypatch.undo()
+    assert read_snapshot(path) is not None
+    path.write_text(path.read_text().replace('"docker"', '"podman"'))
+    assert read_snapshot(path) is None
+    
+    BM25Index.build([('pdf_text/a.txt', "replication package archive")]).save(tmp_path / 'index')
+    index = BM25Index.open(tmp_path / 'index', lazy=True)
+    assert len(index) == 0
+    assert index.refresh() and len(index) == 1
+
+def test_retrieval_citations(tmp_path):
+    """Test the BM25 index round-trips through disk and answers cite its passages"""
+    from app import LarsVilhuberBot
+    from retrieval import BM25Index, PackedPassages, iter_corpus
+    
+    (tmp_path / 'pdf_text').mkdir()
+    (tmp_path / 'pdf_text' / 'paper.txt').write_text(
+        "We cluster standard errors at the state level.\n\n"
+        "Confidential census data are accessed in a secure enclave.\n\n" + "filler words " * 200)
+    (tmp_path / 'paper_analysis').mkdir()
+    (tmp_path / 'paper_analysis' / 'notes.md').write_text("Docker images pin the software environment.")
+    
+    BM25Index.build(iter_corpus(tmp_path), passage_words=20).save(tmp_path / 'index')
+    index = BM25Index.load(tmp_path / 'index')
+    # Loaded passages are decoded from the memory-mapped segment files on access
+    assert isinstance(index.segments['seg-000000'].passages, PackedPassages)
+    
+    best = index.search("confidential census data", k=2)
+    assert best[0].source == 'pdf_text/paper.txt' and best[0].text.startswith('We cluster')
+    assert 'Confidential census' in best[0].text
+    assert index.search("docker environment")[0].source == 'paper_analysis/notes.md'
+    assert index.search("docker census", min_terms=2) == []
+    
+    bot = LarsVilhuberBot(retriever=index)
+    plan = bot.plan_response("How do I use Docker to pin the software environment?")
+    assert [p.source for p in plan.citations] == ['paper_analysis/notes.md']
+    assert 'A relevant passage from paper_analysis/notes.md: "Docker images pin the software environment."' in \
+        bot.generate_response("How do I use Docker to pin the software environment?")
+    assert bot.plan_response("hello").citations == ()
+
+def test_incremental_retrieval_index(tmp_path):
+    """Test updates index only changed documents and a running reader picks them up"""
+    import os
+    from app import LarsVilhuberBot
+    from retrieval import BM25Index, IncrementalIndexer
+    
+    corpus = tmp_path / 'pdf_text'
+    corpus.mkdir()
+    (corpus / 'a.txt').write_text("Census data are accessed in a secure enclave.")
+    (corpus / 'b.txt').write_text("Docker images pin the software environment.")
+    indexer = IncrementalIndexer(tmp_path, tmp_path / 'index')
+    assert indexer.update() == {'added': 2}
+    
+    reader = BM25Index.open(tmp_path / 'index', refresh_interval=0)
+    bot = LarsVilhuberBot(retriever=reader)
+    bot.MIN_CITATION_SCORE = 0.0  # Scores are low in a two-document corpus
+    question = "Where do I pin the docker software environment?"
+    assert bot.plan_response(question).citations[0].source == 'pdf_text/b.txt'
+    
+    # Touched but unchanged files are not re-indexed
+    os.utime(corpus / 'a.txt', (1, 1))
+    assert indexer.update() == {'unchanged': 2}
+    
+    (corpus / 'b.txt').write_text("Conda environments also pin software versions.")
+    (corpus / 'c.txt').write_text("A docker container pins the software environment too.")
+    (corpus / 'a.txt').unlink()
+    assert indexer.update() == {'replaced': 1, 'added': 1, 'deleted': 1}
+    assert len(reader.segments) == 1
+    
+    # The bot reloads the new segment and drops plans citing the old one
+    assert bot.plan_response(question).citations[0].source == 'pdf_text/c.txt'
+    assert len(reader.segments) == 2 and len(reader) == 2
+    assert reader.search("census enclave") == []
+    
+    assert indexer.needs_compaction()
+    before = [(p.source, round(p.score, 6)) for p in reader.search("software environment", k=5)]
+    indexer.compact_in_background().join()
+    assert reader.refresh() and len(reader.segments) == 1 and len(reader) == 2
+    assert [(p.source, round(p.score, 6)) for p in reader.search("software environment", k=5)] == before
+    assert sorted(p.name for p in (tmp_path / 'index').iterdir()) == ['manifest.json', 'seg-000002']
+
+def test_conversation_store_eviction():
+    """Test the conversation store stays bounded"""
+    from conversation_store import ConversationStore
+    
+    now = [0.0]
+    store = ConversationStore(max_sessions=2, ttl=100, max_messages=3, clock=lambda: now[0])
+    
+    for i in range(5):
+        store.append('a', 'user', f'message {i}')
+    assert [m.content for m in store.get('a')] == ['message 2', 'message 3', 'message 4']
+    
+    store.append('b', 'user', 'hi')
+    store.get('a')  # 'a' is now the most recently used
+    store.append('c', 'user', 'hi')
+    assert 'b' not in store and 'a' in store
+    
+    now[0] = 150
+    store.append('d', 'user', 'hi')
+    assert len(store) == 1
+    assert store.stats() == {'sessions': 1, 'max_sessions': 2, 'evicted_lru': 1, 'evicted_ttl': 2}
+
+def test_sqlite_conversation_store_shared(tmp_path):
+    """Test two workers see the same conversations through SQLite"""
+    from conversation_store import Message, SQLiteConversationStore
+    
+    now = [0.0]
+    path = tmp_path / 'conversations.sqlite3'
+    worker_1 = SQLiteConversationStore(path, max_sessions=2, ttl=100, max_messages=3,
+                                       sweep_every=1, clock=lambda: now[0])
+    worker_2 = SQLiteConversationStore(path, max_sessions=2, ttl=100, max_messages=3,
+                                       sweep_every=1, clock=lambda: now[0])
+    
+    for i in range(2):
+        worker_1.extend('a', [Message('user', f'q{i}', now[0]), Message('assistant', f'r{i}', now[0])])
+    assert [m.content for m in worker_2.get('a')] == ['r0', 'q1', 'r1']
+    
+    worker_2.reset('a')
+    assert worker_1.get('a') == []
+    
+    now[0] = 1
+    worker_2.append('b', 'user', 'hi')
+    now[0] = 2
+    worker_1.append('c', 'user', 'hi')
+    assert 'a' not in worker_2 and len(worker_2) == 2
+    
+    now[0] = 200
+    assert worker_1.get('c') == []
+    worker_1.append('d', 'user', 'hi')
+    assert worker_2.stats() == {'sessions': 1, 'max_sessions': 2, 'evicted_lru': 1, 'evicted_ttl': 2}
+
+async def asgi_request(app, method, path, payload=None):
+    """Call an ASGI app directly and return (status, decoded JSON body)"""
+    import json
+
+    body = json.dumps(payload).encode() if payload is not None else b''
+    events = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return events.pop(0)
+
+    async def send(event):
+        sent.append(event)
+
+    await app({'type': 'http', 'method': method, 'path': path, 'headers': []}, receive, send)
+    return sent[0]['status'], json.loads(sent[1]['body'])
+
+def test_null_session_id(tmp_path, monkeypatch):
+    """Test a null session_id starts a new conversation with either store backend"""
+    import asyncio
+    import app as app_module
+    from asgi_app import ChatASGIApp
+    from conversation_store import ConversationStore, SQLiteConversationStore
+    
+    for store in (ConversationStore(), SQLiteConversationStore(tmp_path / 'conversations.sqlite3')):
+        monkeypatch.setattr(app_module, 'conversations', store)
+        with app_module.app.test_client() as client:
+            response = client.post('/api/chat', json={'message': 'hi', 'session_id': None})
+            assert response.status_code == 200
+            session_id = response.get_json()['session_id']
+            assert isinstance(session_id, str) and len(store.get(session_id)) == 2
+            response = client.post('/api/chat/stream', json={'message': 'hi', 'session_id': None})
+            assert response.status_code == 200 and '"session_id": null' not in response.get_data(as_text=True)
+        
+        status, data = asyncio.run(asgi_request(ChatASGIApp(app_module.bot, store), 'POST', '/api/chat',
+                                                {'message': 'hi', 'session_id': None}))
+        assert status == 200 and len(store.get(data['session_id'])) == 2
+        assert store.stats()['sessions'] == 3
+
+def test_asgi_app_concurrency():
+    """Test the ASGI app keeps the JSON contract and overlaps slow responses"""
+    import asyncio
+    import time
+    from asgi_app import ChatASGIApp
+    from conversation_store import ConversationStore
+
+    class SlowBackend:
+        async def agenerate_response(self, message, history):
+            await asyncio.sleep(0.2)
+            return f"{message} ({len(history)} messages)"
+
+    app = ChatASGIApp(SlowBackend(), ConversationStore())
+
+    async def run():
+        status, data = await asgi_request(app, 'POST', '/api/chat', {'message': 'hi', 'session_id': 's'})
+        assert status == 200 and data == {'response': 'hi (1 messages)', 'session_id': 's'}
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*[
+            asgi_request(app, 'POST', '/api/chat', {'message': 'hi', 'session_id': f'c{i}'})
+            for i in range(20)
+        ])
+        assert time.perf_counter() - start < 1.0
+        assert all(status == 200 for status, _ in results)
+
+        assert await asgi_request(app, 'POST', '/api/reset', {'session_id': 's'}) == \
+            (200, {'status': 'success', 'message': 'Conversation reset'})
+        status, data = await asgi_request(app, 'GET', '/api/health')
+        assert data['conversations']['sessions'] == 21
+        assert (await asgi_request(app, 'GET', '/missing'))[0] == 404
+
+    asyncio.run(run())
+
+def test_asgi_batch_and_metrics():
+    """Test the ASGI app serves /api/chat/batch and /api/metrics and caps bodies like app.py"""
+    import asyncio
+    from app import bot
+    from asgi_app import ChatASGIApp
+    from conversation_store import ConversationStore
+    from rate_limit import MemoryRateLimiter
+
+    app = ChatASGIApp(bot, ConversationStore(), limiter=MemoryRateLimiter({'ip': (1, 100), 'session': (1, 100)}),
+                      max_batch_size=2)
+
+    async def run():
+        messages = ['Tell me about docker', 'hello']
+        status, data = await asgi_request(app, 'POST', '/api/chat/batch', {'messages': messages, 'session_id': 'b'})
+        assert status == 200 and data['session_id'] == 'b'
+        assert [result['topic'] for result in data['results']] == [bot.plan_response(m).topic for m in messages]
+        assert len(app.store.get('b')) == 4
+        assert (await asgi_request(app, 'POST', '/api/chat/batch', {'messages': 'hello'}))[0] == 400
+        assert (await asgi_request(app, 'POST', '/api/chat/batch', {'messages': ['a', 'b', 'c']}))[0] == 400
+        tight = ChatASGIApp(bot, ConversationStore(), limiter=MemoryRateLimiter({'ip': (0.01, 2), 'session': (1, 100)}))
+        assert (await asgi_request(tight, 'POST', '/api/chat/batch', {'messages': ['a', 'b', 'c']}))[0] == 429
+        small = ChatASGIApp(bot, ConversationStore(), max_body_size=64)
+        assert await asgi_request(small, 'POST', '/api/chat', {'message': 'x' * 64}) == \
+            (413, {'error': 'Request body too large'})
+
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(event):
+            sent.append(event)
+
+        await app({'type': 'http', 'method': 'GET', 'path': '/api/metrics', 'headers': []}, receive, send)
+        return sent[0]['status'], sent[1]['body'].decode()
+
+    status, text = asyncio.run(run())
+    assert status == 200
+    assert 'chat_sessions 1' in text
+    assert 'chat_rate_limited_ip_total 0' in text
+    assert 'chat_response_cache_hits_total' in text
+
+def test_async_bot_off_the_event_loop():
+    """Test the async bot methods refresh the corpus index and answer batches in a thread"""
+    import asyncio
+    import threading
+    from app import LarsVilhuberBot
+    
+    threads = []
+    
+    class Retriever:
+        def refresh(self, force=False):
+            threads.append(threading.get_ident())
+            return False
+        
+        def search(self, query, k=1, min_terms=2):
+            return []
+    
+    bot = LarsVilhuberBot(retriever=Retriever())
+    
+    async def run():
+        loop_thread = threading.get_ident()
+        await bot.agenerate_response("How do I use docker?")
+        assert [part async for part in bot.aiter_response_parts("How do I use docker?")]
+        assert len(await bot.agenerate_responses(["docker", "hello"])) == 2
+        return loop_thread
+    
+    loop_thread = asyncio.run(run())
+    assert threads and loop_thread not in threads
+
+def test_asgi_rate_limit_before_body():
+    """Test the ASGI app rejects an over-limit client IP without reading the request body"""
+    import asyncio
+    from asgi_app import ChatASGIApp
+    from conversation_store import ConversationStore
+    from rate_limit import MemoryRateLimiter
+    
+    class Backend:
+        async def agenerate_response(self, message, history):
+            return message
+    
+    app = ChatASGIApp(Backend(), ConversationStore(),
+                      limiter=MemoryRateLimiter({'ip': (0.01, 1), 'session': (0.01, 100)}))
+    
+    async def run():
+        assert (await asgi_request(app, 'POST', '/api/chat', {'message': 'hi'}))[0] == 200
+        reads = []
+        sent = []
+        
+        async def receive():
+            reads.append(1)
+            return {'type': 'http.request', 'body': b'{"message": "hi"}', 'more_body': False}
+        
+        async def send(event):
+            sent.append(event)
+        
+        await app({'type': 'http', 'method': 'POST', 'path': '/api/chat', 'headers': []}, receive, send)
+        return sent[0]['status'], reads
+    
+    assert asyncio.run(run()) == (429, [])
+
+def test_asgi_client_disconnect():
+    """Test the ASGI app sends nothing to a client that disconnects before its body is read"""
+    import asyncio
+    from asgi_app import ChatASGIApp
+    from conversation_store import ConversationStore
+    
+    app = ChatASGIApp(None, ConversationStore())
+    sent = []
+    
+    async def receive():
+        return {'type': 'http.disconnect'}
+    
+    async def send(event):
+        sent.append(event)
+    
+    for path in ('/api/chat', '/api/chat/batch', '/api/chat/stream', '/api/reset'):
+        asyncio.run(app({'type': 'http', 'method': 'POST', 'path': path, 'headers': []}, receive, send))
+    assert sent == []
+
+def test_asgi_client_ip_behind_proxies():
+    """Test the ASGI app reads client IPs from X-Forwarded-For under PROXY_COUNT, as ProxyFix does"""
+    from asgi_app import ChatASGIApp
+    from conversation_store import ConversationStore
+    
+    scope = {'client': ('10.0.0.1', 5000),
+             'headers': [(b'x-forwarded-for', b'6.6.6.6, 1.2.3.4'), (b'x-forwarded-for', b'5.6.7.8')]}
+    ip = lambda proxy_count: ChatASGIApp(None, ConversationStore(), proxy_count=proxy_count).client_ip(scope)
+    assert [ip(0), ip(1), ip(2), ip(4)] == ['10.0.0.1', '5.6.7.8', '1.2.3.4', '10.0.0.1']
+
+def test_chat_stream():
+    """Test the streamed response parts add up to the /api/chat response"""
+    import json
+    import random
+    from app import app, bot, conversations
+
+    message = "How do I use docker for reproducibility?"
+    random.seed(7)
+    expected = bot.generate_response(message)
+
+    random.seed(7)
+    with app.test_client() as client:
+        response = client.post('/api/chat/stream', json={'message': message, 'session_id': 'stream-test'})
+        assert response.mimetype == 'text/event-stream'
+        events = [block.split('\n') for block in response.get_data(as_text=True).split('\n\n') if block]
+
+    parts = [json.loads(data[6:])['text'] for event, data in events if event == 'event: part']
+    assert events[-1][0] == 'event: done'
+    assert json.loads(events[-1][1][6:]) == {'response': expected, 'session_id': 'stream-test'}
+    assert " ".join(parts) == expected
+    assert [m.content for m in conversations.get('stream-test')] == [message, expected]
+    conversations.reset('stream-test')
+
+def test_chat_batch():
+    """Test a batch of messages is answered in order without touching conversations"""
+    from app import app, bot, conversations
+    
+    messages = ["How do I use docker?", "hello", "nothing relevant", "How do I use docker?"]
+    sessions_before = conversations.stats()['sessions']
+    with app.test_client() as client:
+        response = client.post('/api/chat/batch', json={'messages': messages})
+        assert client.post('/api/chat/batch', json={'messages': 'hello'}).status_code == 400
+        stored = client.post('/api/chat/batch', json={'messages': messages[:2], 'session_id': 'batch-test'})
+    
+    results = response.get_json()['results']
+    assert [r['topic'] for r in results] == ["docker", None, None, "docker"]
+    assert results[0]['confidence'] == bot.find_best_response(messages[0])[1]
+    assert results[1]['response'] in bot.personality_phrases["greeting"]
+    assert stored.get_json()['session_id'] == 'batch-test'
+    assert len(conversations.get('batch-test')) == 4
+    assert conversations.stats()['sessions'] == sessions_before + 1
+    conversations.reset('batch-test')
+
+def test_rate_limiting(tmp_path, monkeypatch):
+    """Test token buckets refill over time, are shared through SQLite and reject before matching"""
+    import math
+    import pytest
+    import app as app_module
+    from rate_limit import MemoryRateLimiter, SQLiteRateLimiter
+    
+    now = [0.0]
+    limiter = MemoryRateLimiter({'ip': (1.0, 2)}, clock=lambda: now[0])
+    assert [limiter.hit('ip', '10.0.0.1') for _ in range(3)] == [0.0, 0.0, 1.0]
+    assert limiter.hit('ip', '10.0.0.2') == 0.0
+    now[0] = 0.5
+    assert limiter.hit('ip', '10.0.0.1') == 0.5
+    now[0] = 1.5
+    assert limiter.hit('ip', '10.0.0.1') == 0.0
+    assert limiter.stats() == {'keys': 2, 'rejected': {'ip': 2}}
+    # A batch takes a token per message, and one larger than the burst never fits
+    assert limiter.hit('ip', '10.0.0.3', cost=2) == 0.0 and limiter.hit('ip', '10.0.0.3') == 1.0
+    assert limiter.hit('ip', '10.0.0.4', cost=3) == math.inf
+    for limits in ({'ip': (0, 5)}, {'ip': (1.0, 0)}):
+        with pytest.raises(ValueError):
+            MemoryRateLimiter(limits)
+    
+    # Two workers draw from the same buckets
+    first = SQLiteRateLimiter(tmp_path / 'limits.sqlite3', {'session': (0.01, 2)})
+    second = SQLiteRateLimiter(tmp_path / 'limits.sqlite3', {'session': (0.01, 2)})
+    assert first.hit('session', 's') == 0.0 and second.hit('session', 's') == 0.0
+    assert first.hit('session', 's') > 0 and second.stats()['rejected'] == {'session': 1}
+    
+    monkeypatch.setattr(app_module, 'rate_limiter', MemoryRateLimiter({'ip': (0.01, 100), 'session': (0.01, 1)}))
+    cache_misses = app_module.bot.plan_cache_stats()['misses']
+    with app_module.app.test_client() as client:
+        payload = {'message': 'What is a rate limit for?', 'session_id': 'rate-limited'}
+        assert client.post('/api/chat', json=payload).status_code == 200
+        response = client.post('/api/chat', json=payload)
+        assert response.status_code == 429 and int(response.headers['Retry-After']) >= 1
+        assert 'chat_rate_limited_session_total 1' in client.get('/api/metrics').get_data(as_text=True)
+        # Without a session_id, the session bucket is the client IP's
+        payload = {'message': payload['message']}
+        assert client.post('/api/chat', json=payload).status_code == 200
+        assert client.post('/api/chat', json=payload).status_code == 429
+        # and a null session_id does not share one bucket across IPs
+        payload['session_id'] = None
+        assert client.post('/api/chat', json=payload, environ_base={'REMOTE_ADDR': '10.0.0.9'}).status_code == 200
+        # A batch is charged per message, before any of them is matched
+        response = client.post('/api/chat/batch', json={'messages': [payload['message']] * 102})
+        assert response.status_code == 429 and 'Retry-After' not in response.headers
+    assert len(app_module.conversations.get('rate-limited')) == 2
+    assert app_module.bot.plan_cache_stats()['misses'] == cache_misses + 1
+    app_module.conversations.reset('rate-limited')
+
+def test_rate_limit_without_client_address(tmp_path, monkeypatch):
+    """Test clients without an address, as behind a unix socket, share one bucket instead of failing"""
+    import asyncio
+    import app as app_module
+    from asgi_app import ChatASGIApp
+    from conversation_store import ConversationStore
+    from rate_limit import SQLiteRateLimiter
+    
+    limits = {'ip': (0.01, 1), 'session': (0.01, 100)}
+    monkeypatch.setattr(app_module, 'rate_limiter', SQLiteRateLimiter(tmp_path / 'flask.sqlite3', limits))
+    with app_module.app.test_client() as client:
+        statuses = [client.post('/api/chat', json={'message': 'hi'}, environ_overrides={'REMOTE_ADDR': None}).status_code
+                    for _ in range(2)]
+    assert statuses == [200, 429]
+    
+    # asgi_request sends no 'client' in its scope
+    app = ChatASGIApp(app_module.bot, ConversationStore(),
+                      limiter=SQLiteRateLimiter(tmp_path / 'asgi.sqlite3', limits))
+    
+    async def run():
+        return [(await asgi_request(app, 'POST', '/api/chat', {'message': 'hi'}))[0] for _ in range(2)]
+    
+    assert asyncio.run(run()) == [200, 429]
+
+def test_metrics_endpoint():
+    """Test /api/chat stage timings and topic counts are exported as Prometheus text"""
+    from app import app, metrics
+    from metrics import ChatMetrics
+    
+    with app.test_client() as client:
+        client.post('/api/chat', json={'message': 'How do I use docker?', 'session_id': 'metrics-test'})
+        response = client.get('/api/metrics')
+        client.post('/api/reset', json={'session_id': 'metrics-test'})
+    text = response.get_data(as_text=True)
+    
+    assert response.mimetype == 'text/plain'
+    assert metrics.topic_requests['docker'] >= 1
+    assert 'chat_requests_total{topic="docker"}' in text
+    for stage in ('parse', 'store_read', 'match', 'generate', 'store_write', 'serialize'):
+        assert f'chat_stage_seconds_count{{stage="{stage}"}}' in text
+    assert 'chat_stage_seconds_bucket{stage="match",le="+Inf"}' in text
+    assert '\nchat_sessions ' in text
+    
+    # Disabled metrics still report the store and cache values
+    disabled = ChatMetrics(enabled=False).render([('chat_sessions', 'Sessions', 'gauge', 3)])
+    assert disabled == '# HELP chat_sessions Sessions\n# TYPE chat_sessions gauge\nchat_sessions 3\n'
+
+def test_benchmark_harness(monkeypatch):
+    """Test the load-testing harness reports latency percentiles against the test client"""
+    monkeypatch.syspath_prepend(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+    from benchmark_chat import FlaskClientTarget, build_corpus, percentile, run_benchmark
+    
+    assert percentile([1, 2, 3, 4], 50) == 2 and percentile([1, 2, 3, 4], 99) == 4
+    # The test client target turns rate limiting off until it is closed
+    target = FlaskClientTarget()
+    try:
+        results = run_benchmark(target, build_corpus(40), concurrency=4, sessions=5, warmup=2)
+    finally:
+        target.close()
+    assert results['errors'] == 0 and results['requests'] == 40
+    assert results['latency_ms']['p50'] <= results['latency_ms']['p99']
+    assert results['rss_kb']['timeline']
+
+def test_benchmark_percentile_nearest_rank(monkeypatch):
+    """Test percentiles take the smallest value with at least q% of the samples at or below it"""
+    monkeypatch.syspath_prepend(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+    from benchmark_chat import percentile
+    
+    values = list(range(1, 101))
+    assert [percentile(values, q) for q in (50, 95, 99, 100)] == [50, 95, 99, 100]
+    assert [percentile([7], q) for q in (0, 50, 99, 100)] == [7, 7, 7, 7]
+    assert percentile([], 50) is None
+
 def test_flask_app():
     """Test Flask app creation"""
     try: